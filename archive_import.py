@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+Перенос сейвов прямо из архивов (.zip, .tar*, .7z) без распаковки на диск:
+члены .prison и .png потоково пишутся в папку сохранений, для zip —
+параллельно по членам. По желанию каждый сейв исправляется на лету.
+Как и при массовом переносе, файлы с тем же содержимым пропускаются,
+а заменяемый сейв сначала сохраняется резервной копией
+"""
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path, PureWindowsPath
+from typing import Dict, List, Optional, Tuple
+
+import metrics
+from bulk_import import place_file
+from core import stream_fix_construction
+from ui import Color
+
+ARCHIVE_SUFFIXES = ('.zip', '.7z', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+MEMBER_SUFFIXES = ('.prison', '.png')
+COPY_BUFFER = 1024 * 1024
+DEFAULT_WORKERS = 4
+
+
+def is_archive(path: Path) -> bool:
+    name = path.name.lower()
+    return path.is_file() and name.endswith(ARCHIVE_SUFFIXES)
+
+
+def _member_target(name: str) -> Optional[str]:
+    """Имя файла в папке сохранений для члена архива (пути внутри архива отбрасываются).
+       Имена с диском или двоеточием (C:evil.prison — путь от текущей папки
+       диска C в Windows, file:stream — поток NTFS) отклоняются
+    """
+    base = name.replace('\\', '/').rsplit('/', 1)[-1]
+    if not base or base.startswith('.') or not base.lower().endswith(MEMBER_SUFFIXES):
+        return None
+    if ':' in base or PureWindowsPath(base).drive:
+        return None
+    return base
+
+
+class _TargetNames:
+    """Имена в папке сохранений для членов архива. Одноимённые файлы из разных
+       папок архива получают суффикс « (2)», « (3)»…; сейв и скриншот из одной
+       папки переименовываются одинаково. Повтор того же члена — None
+    """
+
+    def __init__(self):
+        self._stems: Dict[Tuple[str, str], str] = {}     # (папка, основа) → выбранная основа
+        self._owners: Dict[str, Tuple[str, str]] = {}    # выбранная основа → (папка, основа)
+        self._taken = set()
+
+    def __call__(self, name: str) -> Optional[str]:
+        base = _member_target(name)
+        if not base:
+            return None
+        folder = name.replace('\\', '/').rpartition('/')[0].lower()
+        stem, _, suffix = base.rpartition('.')
+        key = (folder, stem.lower())
+        chosen = self._stems.get(key)
+        if chosen is None:
+            chosen, number = stem, 2
+            while self._owners.get(chosen.lower(), key) != key:
+                chosen = f"{stem} ({number})"
+                number += 1
+            self._stems[key] = chosen
+            self._owners[chosen.lower()] = key
+        target = f"{chosen}.{suffix}"
+        if target.lower() in self._taken:
+            return None
+        self._taken.add(target.lower())
+        return target
+
+
+def _write_member(open_member, target: Path, fix: bool) -> str:
+    """Пишет член архива в target через временный файл с уникальным именем.
+       open_member() должен каждый раз открывать член заново (для повтора без исправления).
+       Возвращает 'fixed', 'copied', 'copied-unfixed' или 'skipped' (такой файл уже есть)
+    """
+    fd, tmp_name = tempfile.mkstemp(prefix=f".{target.name}-", suffix='.part', dir=target.parent)
+    os.close(fd)
+    tmp = Path(tmp_name)
+    try:
+        is_save = fix and target.suffix.lower() == '.prison'
+        if is_save:
+            with open_member() as src, open(tmp, 'wb') as dst:
+                fixed = stream_fix_construction(src, dst)
+            if fixed:
+                return 'fixed' if place_file(tmp, target) else 'skipped'
+
+        with open_member() as src, open(tmp, 'wb') as dst:
+            shutil.copyfileobj(src, dst, COPY_BUFFER)
+        if not place_file(tmp, target):
+            return 'skipped'
+        return 'copied-unfixed' if is_save else 'copied'
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def _import_zip(archive: Path, dest_dir: Path, fix: bool, workers: int) -> List[tuple]:
+    import zipfile
+
+    # Имена выбираются до запуска потоков: два члена не пишут в один файл
+    targets = _TargetNames()
+    with zipfile.ZipFile(archive) as zf:
+        members = [(info.filename, targets(info.filename), info.file_size)
+                   for info in zf.infolist() if not info.is_dir()]
+    members = [m for m in members if m[1]]
+
+    def extract(member):
+        name, target, size = member
+
+        @contextmanager
+        def open_member():
+            # У каждого потока свой дескриптор архива: чтение членов не мешает друг другу
+            with zipfile.ZipFile(archive) as zf, zf.open(name) as src:
+                yield src
+
+        return target, size, _write_member(open_member, dest_dir / target, fix)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(extract, members))
+
+
+def _import_tar(archive: Path, dest_dir: Path, fix: bool) -> List[tuple]:
+    import tarfile
+
+    results = []
+    targets = _TargetNames()
+    # Сжатый tar читается только последовательно, поэтому без пула
+    with tarfile.open(archive, 'r:*') as tf:
+        for info in tf:
+            target = targets(info.name) if info.isfile() else None
+            if not target:
+                continue
+
+            def open_member(info=info):
+                return tf.extractfile(info)
+
+            results.append((target, info.size,
+                            _write_member(open_member, dest_dir / target, fix)))
+    return results
+
+
+def _import_7z(archive: Path, dest_dir: Path, fix: bool) -> List[tuple]:
+    try:
+        import py7zr
+    except ImportError:
+        print(f"{Color.RED}✗ Для .7z нужен py7zr:{Color.END} pip install py7zr")
+        return []
+
+    results = []
+    with py7zr.SevenZipFile(archive, 'r') as zf:
+        targets = _TargetNames()
+        names = {name: targets(name) for name in zf.getnames()}
+        names = {name: target for name, target in names.items() if target}
+        # py7zr отдаёт члены как BytesIO: 7z не поддерживает потоковое чтение по одному
+        for name, data in zf.read(list(names)).items():
+            target = names[name]
+            size = data.getbuffer().nbytes
+
+            @contextmanager
+            def open_member(data=data):
+                data.seek(0)
+                yield data
+
+            results.append((target, size, _write_member(open_member, dest_dir / target, fix)))
+    return results
+
+
+def import_archive(archive: Path, dest_dir: Path, fix: bool = False,
+                   workers: int = DEFAULT_WORKERS) -> dict:
+    """Переносит .prison и .png из архива в dest_dir.
+       Возвращает сводку: files, fixed, skipped, unfixed, bytes, seconds, saves (список путей)
+    """
+    started = time.perf_counter()
+    name = archive.name.lower()
+    if name.endswith('.zip'):
+        results = _import_zip(archive, dest_dir, fix, workers)
+    elif name.endswith('.7z'):
+        results = _import_7z(archive, dest_dir, fix)
+    else:
+        results = _import_tar(archive, dest_dir, fix)
+
+    summary = {
+        'files': len(results),
+        'fixed': sum(1 for _, _, status in results if status == 'fixed'),
+        'skipped': sum(1 for _, _, status in results if status == 'skipped'),
+        'unfixed': [target for target, _, status in results if status == 'copied-unfixed'],
+        'bytes': sum(size for _, size, _ in results),
+        'seconds': time.perf_counter() - started,
+        'saves': [dest_dir / target for target, _, _ in results
+                  if target.lower().endswith('.prison')],
+    }
+
+    sink = metrics.get_sink()
+    if sink is not None:
+        sink.record('transfer', archive, 'ok' if results else 'failed',
+                    summary['seconds'], summary['bytes'])
+    return summary
+
+
+def print_summary(archive: Path, summary: dict, fix: bool) -> None:
+    seconds = max(summary['seconds'], 1e-9)
+    print(f"{Color.GREEN}Из архива {archive.name} перенесено файлов:{Color.END} {summary['files']} "
+          f"({summary['bytes'] / 1024 / 1024:.1f} МБ, "
+          f"{summary['bytes'] / 1024 / 1024 / seconds:.1f} МБ/с)")
+    for save in summary['saves']:
+        print(f"  • {save.name}")
+    if summary['skipped']:
+        print(f"{Color.YELLOW}Пропущено (уже есть с тем же содержимым):{Color.END} {summary['skipped']}")
+    if fix:
+        print(f"{Color.GREEN}Исправлено на лету:{Color.END} {summary['fixed']}")
+        for target in summary['unfixed']:
+            print(f"  {Color.YELLOW}Блок 'Construction' не найден, скопирован как есть:{Color.END} {target}")
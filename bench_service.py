@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Нагрузочный тест локального сервиса (main.py serve): N запросов с заданной
+параллельностью, итог — запросов в секунду и задержки p50 / p99.
+
+    python bench_service.py 1 2 3 --requests 500 --concurrency 16
+    python bench_service.py 1 --type fix --dry-run --spawn
+
+По умолчанию задания — analyze (только чтение). С --spawn сервис
+запускается отдельным процессом на время теста
+"""
+import argparse
+import http.client
+import json
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+ROOT = Path(__file__).parent.resolve()
+sys.path.insert(0, str(ROOT))
+
+from ui import Color  # noqa: E402
+
+
+def send_job(conn: http.client.HTTPConnection, job: dict):
+    """Отправляет задание и читает поток событий до конца.
+       Возвращает (HTTP-код, последнее событие или тело ответа)
+    """
+    body = json.dumps(job).encode('utf-8')
+    conn.request('POST', '/jobs', body, {'Content-Type': 'application/json'})
+    response = conn.getresponse()
+    data = response.read()
+    lines = data.splitlines()
+    return response.status, json.loads(lines[-1]) if lines else None
+
+
+def wait_ready(host: str, port: int, timeout: float = 30.0) -> bool:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=1)
+            conn.request('GET', '/status')
+            if conn.getresponse().status == 200:
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def run_load(host: str, port: int, jobs: list, total: int, concurrency: int) -> dict:
+    """Рассылает total заданий по кругу из jobs в concurrency потоков (keep-alive)"""
+    latencies = []
+    codes = {}
+    failed = 0
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def client():
+        nonlocal failed
+        conn = http.client.HTTPConnection(host, port, timeout=300)
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                status, last = send_job(conn, jobs[i % len(jobs)])
+            except (OSError, http.client.HTTPException, ValueError):
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=300)
+                status, last = 0, None
+            elapsed = time.perf_counter() - started
+            with lock:
+                codes[status] = codes.get(status, 0) + 1
+                if status == 200:
+                    latencies.append(elapsed)
+                    if not (last and last.get('ok')):
+                        failed += 1
+        conn.close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    return {'wall': wall, 'latencies': latencies, 'codes': codes, 'failed': failed}
+
+
+def percentile(values: list, pct: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method='inclusive')[pct - 1]
+
+
+def print_result(result: dict, total: int, concurrency: int) -> None:
+    latencies = result['latencies']
+    print(f"\n{Color.BOLD}{Color.BLUE}Нагрузка: {total} запросов, параллельно {concurrency}{Color.END}")
+    print(f"  Время: {result['wall']:.2f} с, "
+          f"{Color.GREEN}{total / result['wall']:.1f} запросов/с{Color.END}")
+    if latencies:
+        print(f"  Задержка, мс: p50 {percentile(latencies, 50) * 1000:.1f}, "
+              f"p95 {percentile(latencies, 95) * 1000:.1f}, "
+              f"{Color.CYAN}p99 {percentile(latencies, 99) * 1000:.1f}{Color.END}, "
+              f"макс {max(latencies) * 1000:.1f}")
+    codes = ", ".join(f"{code or 'ошибка'}: {n}" for code, n in sorted(result['codes'].items()))
+    print(f"  Ответы: {codes}")
+    if result['codes'].get(503):
+        print(f"  {Color.YELLOW}503 — очередь сервиса заполнена (увеличьте --queue){Color.END}")
+    if result['failed']:
+        print(f"  {Color.RED}Задания с ошибкой: {result['failed']}{Color.END}")
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Нагрузочный тест main.py serve")
+    parser.add_argument('files', nargs='+', help="сейвы для заданий (имена в папке игры или пути)")
+    parser.add_argument('--type', choices=('analyze', 'fix'), default='analyze')
+    parser.add_argument('--dry-run', action='store_true', help="для fix: только план, сейвы не меняются")
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--spawn', action='store_true', help="запустить сервис на время теста")
+    parser.add_argument('--workers', type=int, default=4, help="для --spawn: потоков сервиса")
+    parser.add_argument('--queue', type=int, default=64, help="для --spawn: размер очереди")
+    args = parser.parse_args(argv)
+
+    jobs = [{'type': args.type, 'file': name, 'dry_run': args.dry_run} for name in args.files]
+
+    server = None
+    if args.spawn:
+        server = subprocess.Popen(
+            [sys.executable, str(ROOT / "main.py"), "serve", "--host", args.host,
+             "--port", str(args.port), "--workers", str(args.workers), "--queue", str(args.queue)],
+            cwd=ROOT, stdout=subprocess.DEVNULL)
+    try:
+        if not wait_ready(args.host, args.port):
+            print(f"{Color.RED}✗ Сервис не отвечает на {args.host}:{args.port}{Color.END}")
+            return 1
+        # Прогрев: первый проход заполняет кэши сервиса
+        run_load(args.host, args.port, jobs, len(jobs), 1)
+        result = run_load(args.host, args.port, jobs, args.requests, args.concurrency)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    print_result(result, args.requests, args.concurrency)
+    return 1 if result['failed'] or len(result['latencies']) < args.requests else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Замер холодного старта: время импорта модулей (-X importtime)
+и время от запуска интерпретатора до готового меню с плагинами
+"""
+import subprocess
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.resolve()
+
+# То же, что делает main() до первого вывода меню
+STARTUP_CODE = (
+    "import main; from core import PrisonSaveFixer; "
+    "f = PrisonSaveFixer(); f.load_plugins()"
+)
+
+
+def import_times(top: int = 15):
+    """Запускает интерпретатор с -X importtime и возвращает самые тяжёлые импорты"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", STARTUP_CODE],
+        cwd=ROOT, capture_output=True, text=True)
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, self_us, cumulative_us, name = (part.strip()
+                                           for part in line.replace("import time:", "|").split("|"))
+        rows.append((int(cumulative_us), int(self_us), name))
+
+    total = sum(self_us for _, self_us, _ in rows)
+    rows.sort(reverse=True)
+    return total, rows[:top]
+
+
+def wall_times(runs: int = 10):
+    """Полное время запуска процесса до загруженных плагинов, в мс"""
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", STARTUP_CODE],
+                       cwd=ROOT, capture_output=True)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    total, heaviest = import_times()
+    print(f"Импорт модулей: {total / 1000:.1f} мс (сумма self)")
+    print(f"{'cumulative, мс':>15} {'self, мс':>10}  модуль")
+    for cumulative_us, self_us, name in heaviest:
+        print(f"{cumulative_us / 1000:15.2f} {self_us / 1000:10.2f}  {name}")
+
+    samples = wall_times(runs)
+    print(f"\nСтарт до меню ({runs} запусков): "
+          f"мин {min(samples):.1f} мс, медиана {statistics.median(samples):.1f} мс, "
+          f"макс {max(samples):.1f} мс")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+Массовый перенос сейвов в папку игры: все .prison из папки или по маске
+копируются параллельно (asyncio + ограниченный пул потоков для файлового I/O)
+вместе со скриншотами .png. Уже перенесённые файлы с тем же содержимым
+пропускаются, по желанию каждый сейв сразу исправляется
+"""
+import asyncio
+import glob
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional
+
+import metrics
+from ui import Color
+
+DEFAULT_WORKERS = 4
+HASH_CHUNK = 1024 * 1024
+
+
+def collect_sources(spec: str) -> List[Path]:
+    """Что переносить: папка (все .prison и архивы в ней), файл или маска (*.prison)"""
+    from archive_import import is_archive
+
+    if glob.has_magic(spec):
+        paths = [Path(p) for p in glob.glob(spec)]
+    else:
+        path = Path(spec)
+        if path.is_dir():
+            paths = list(path.iterdir())
+        else:
+            paths = [path]
+    return sorted(p for p in paths
+                  if (p.is_file() and p.suffix.lower() == '.prison') or is_archive(p))
+
+
+def file_digest(path: Path) -> bytes:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def same_content(source: Path, dest: Path) -> bool:
+    """Совпадает ли содержимое: сначала размер, затем SHA-256"""
+    if not dest.exists() or source.stat().st_size != dest.stat().st_size:
+        return False
+    return file_digest(source) == file_digest(dest)
+
+
+def backup_path(target: Path) -> Path:
+    """Имя резервной копии, как у PrisonSaveFixer.create_backup"""
+    return target.with_stem(f"{target.stem}copy")
+
+
+def place_file(tmp: Path, target: Path) -> bool:
+    """Ставит готовый файл tmp на место target. False — в папке уже есть файл
+       с тем же содержимым (same_content). Прежний target с другим
+       содержимым сохраняется резервной копией
+    """
+    if same_content(tmp, target):
+        return False
+    if target.exists():
+        shutil.copy2(target, backup_path(target))
+    os.replace(tmp, target)
+    return True
+
+
+def copy_file(source: Path, dest: Path) -> str:
+    """Копирует source в dest через временный файл рядом с dest (place_file).
+       Возвращает 'copied' или 'skipped', если такой же файл уже есть
+    """
+    if same_content(source, dest):
+        return 'skipped'
+    fd, tmp_name = tempfile.mkstemp(prefix=f".{dest.name}-", suffix='.part', dir=dest.parent)
+    os.close(fd)
+    tmp = Path(tmp_name)
+    try:
+        shutil.copy2(source, tmp)
+        return 'copied' if place_file(tmp, dest) else 'skipped'
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+class _Progress:
+    """Общий прогресс переноса: файлы, мегабайты и скорость одной строкой"""
+
+    def __init__(self, total_files: int, total_bytes: int):
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        self.files = 0
+        self.bytes = 0
+        self.started = time.perf_counter()
+
+    def advance(self, nbytes: int) -> None:
+        self.files += 1
+        self.bytes += nbytes
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        print(f"\r  [{self.files}/{self.total_files}] "
+              f"{self.bytes / 1024 / 1024:.1f}/{self.total_bytes / 1024 / 1024:.1f} МБ, "
+              f"{self.bytes / 1024 / 1024 / elapsed:.1f} МБ/с", end='', flush=True)
+
+    @property
+    def speed(self) -> float:
+        return self.bytes / 1024 / 1024 / max(time.perf_counter() - self.started, 1e-9)
+
+
+async def _copy_file(loop, pool, source: Path, dest: Path) -> str:
+    """copy_file в пуле потоков"""
+    return await loop.run_in_executor(pool, copy_file, source, dest)
+
+
+async def import_saves(sources: List[Path], dest_dir: Path, fixer=None,
+                       fix: bool = False, workers: int = DEFAULT_WORKERS) -> dict:
+    """Переносит сейвы и скриншоты параллельно.
+       fix=True — после копирования сейв исправляется через fixer
+       (исправления идут по одному, копирование остальных файлов не ждёт).
+       Возвращает сводку: copied, skipped, failed, fixed, screenshots_failed,
+       bytes, seconds. Ошибка скриншота не делает сейв неудачным
+    """
+    loop = asyncio.get_running_loop()
+    pool = ThreadPoolExecutor(max_workers=workers)
+    fix_lock = asyncio.Lock()
+
+    pairs = []
+    for source in sources:
+        screenshot = source.with_suffix('.png')
+        pairs.append((source, screenshot if screenshot.exists() else None))
+    total = sum(source.stat().st_size + (shot.stat().st_size if shot else 0)
+                for source, shot in pairs)
+    progress = _Progress(len(pairs), total)
+    summary = {'copied': 0, 'skipped': 0, 'failed': 0, 'fixed': 0,
+               'screenshots_failed': 0, 'errors': []}
+
+    async def transfer(source: Path, screenshot: Optional[Path]):
+        started = time.perf_counter()
+        dest = dest_dir / source.name
+        size = source.stat().st_size
+        try:
+            status = await _copy_file(loop, pool, source, dest)
+            summary[status] += 1
+        except OSError as e:
+            summary['failed'] += 1
+            summary['errors'].append(f"{source.name}: {e}")
+            status = 'failed'
+
+        if screenshot is not None and status != 'failed':
+            try:
+                await _copy_file(loop, pool, screenshot, dest_dir / screenshot.name)
+                size += screenshot.stat().st_size
+            except OSError as e:
+                summary['screenshots_failed'] += 1
+                summary['errors'].append(f"{screenshot.name} (скриншот): {e}")
+
+        progress.advance(size)
+
+        if status == 'copied' and fix and fixer is not None:
+            # Исправления по одному: их вывод не перемешивается в консоли
+            async with fix_lock:
+                print()
+                if await loop.run_in_executor(pool, fixer.fix_construction_block, dest):
+                    summary['fixed'] += 1
+
+        sink = metrics.get_sink()
+        if sink is not None:
+            sink.record('transfer', source, 'ok' if status != 'failed' else 'failed',
+                        time.perf_counter() - started, size)
+
+    try:
+        await asyncio.gather(*(transfer(source, shot) for source, shot in pairs))
+    finally:
+        pool.shutdown(wait=True)
+
+    print()
+    summary['bytes'] = progress.bytes
+    summary['seconds'] = time.perf_counter() - progress.started
+    summary['speed'] = progress.speed
+    return summary
+
+
+def bulk_import(fixer, spec: str, fix: bool = False, workers: int = DEFAULT_WORKERS) -> Optional[dict]:
+    """Синхронная обёртка для меню и командной строки: перенос и печать итогов"""
+    if not fixer.saves_path:
+        print(f"{Color.RED}✗ Не найдена папка сохранений игры{Color.END}")
+        return None
+
+    from archive_import import import_archive, is_archive, print_summary
+
+    sources = collect_sources(spec)
+    archives = [p for p in sources if is_archive(p)]
+    sources = [p for p in sources if not is_archive(p)]
+    if not sources and not archives:
+        print(f"{Color.RED}✗ Не найдено файлов .prison: {spec}{Color.END}")
+        return None
+
+    failed = 0
+    for archive in archives:
+        print(f"\n{Color.BLUE}Перенос из архива:{Color.END} {archive.name}")
+        try:
+            archive_summary = import_archive(archive, fixer.saves_path, fix, workers)
+        except Exception as e:
+            print(f"{Color.RED}✗ Ошибка чтения архива {archive.name}: {e}{Color.END}")
+            failed += 1
+            continue
+        print_summary(archive, archive_summary, fix)
+    fixer.context.invalidate()
+    if not sources:
+        return {'copied': 0, 'skipped': 0, 'failed': failed, 'fixed': 0,
+                'screenshots_failed': 0, 'errors': []}
+
+    print(f"\n{Color.BLUE}Перенос {len(sources)} сейвов в:{Color.END} {fixer.saves_path}")
+    summary = asyncio.run(import_saves(
+        sources, fixer.saves_path, fixer, fix, workers))
+    summary['failed'] += failed
+    fixer.context.invalidate()
+
+    print(f"{Color.GREEN}Скопировано:{Color.END} {summary['copied']}, "
+          f"{Color.YELLOW}пропущено (уже есть):{Color.END} {summary['skipped']}, "
+          f"{Color.RED}ошибок:{Color.END} {summary['failed']}")
+    if summary['screenshots_failed']:
+        print(f"{Color.RED}Не скопировано скриншотов:{Color.END} {summary['screenshots_failed']}")
+    if fix:
+        print(f"{Color.GREEN}Исправлено:{Color.END} {summary['fixed']}")
+    print(f"Всего {summary['bytes'] / 1024 / 1024:.1f} МБ за {summary['seconds']:.2f} с "
+          f"({summary['speed']:.1f} МБ/с)")
+    for error in summary['errors']:
+        print(f"  {Color.RED}✗ {error}{Color.END}")
+    return summary
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Проверка совместимости: исправление сейвов через общее ядро (core.py) и через
+обе точки входа fix_prison.py должно давать байт в байт один и тот же результат —
+блок Construction, найденный построчным эталоном из check_scanners.py, заменён
+пустым, всё остальное не тронуто. Прогоняется на наборе сейвов:
+
+    python check_compat.py                 # все сейвы из папки игры
+    python check_compat.py saves/ 1.prison # свои файлы и папки
+
+Кроме переданных сейвов проверяются встроенные крайние случаи (cp1251, CRLF,
+нет блока Construction, повторное исправление). Код выхода 1 — есть расхождения
+"""
+import contextlib
+import importlib.util
+import io
+import sys
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+ROOT = Path(__file__).parent.resolve()
+sys.path.insert(0, str(ROOT))
+
+from ui import Color  # noqa: E402
+
+
+def expected_fix(raw_data: bytes) -> Optional[bytes]:
+    """Ожидаемый результат исправления или None, если исправлять нечего.
+       Блок ищется построчным эталоном из check_scanners.py; пустой блок
+       пишется с переводами строк заголовка (\\n или \\r\\n) обоими движками
+    """
+    from check_scanners import reference_construction
+    from core import fixed_construction
+
+    block = reference_construction(raw_data)
+    if block is None:
+        return None
+    fixed_block = fixed_construction(block['newline'].decode('ascii')).encode('ascii')
+    return raw_data[:block['start']] + fixed_block + raw_data[block['end']:]
+
+
+# ВСТРОЕННЫЕ КРАЙНИЕ СЛУЧАИ
+
+SAMPLE = (
+    "Version 5\nNumCellsX 10\nNumCellsY 10\n"
+    "BEGIN Objects\n    Size 1\n    BEGIN \"[i 0]\" Id.i 0 Type Guard END\nEND\n"
+    "BEGIN Construction\n    BEGIN Jobs\n        Size 2\n"
+    "        BEGIN \"[i 0]\" Id 1 Type Build X 1 Y 1 END\n"
+    "        BEGIN \"[i 1]\" Id 2 Type Build X 2 Y 2 END\n    END\n"
+    "    BEGIN PlanningJobs Size 16000 END\n    BEGIN BlockedAreas END\nEND\n"
+    "BEGIN Zones\n    BEGIN \"[i 0]\" Zone StaffOnly END\nEND\n"
+)
+
+BUILTIN_CASES = {
+    'utf8.prison': SAMPLE.encode('utf-8'),
+    'cp1251.prison': SAMPLE.replace('Guard', 'Охранник').encode('cp1251'),
+    'crlf.prison': SAMPLE.replace('\n', '\r\n').encode('utf-8'),
+    'no-construction.prison': SAMPLE.split('BEGIN Construction')[0].encode('utf-8'),
+    # Повторное исправление: однострочные секции пустого блока стоят в начале строки
+    'already-fixed.prison': expected_fix(SAMPLE.encode('utf-8')),
+}
+
+
+def _load_old_entry_point():
+    path = ROOT / "Старая версия" / "fix_prison.py"
+    spec = importlib.util.spec_from_file_location('old_fix_prison', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def entry_points():
+    """Имя → функция исправления файла для каждой точки входа"""
+    import fix_prison
+    from core import PrisonSaveFixer
+
+    return {
+        'core': PrisonSaveFixer().fix_construction_block,
+        'fix_prison.py': fix_prison.PrisonSaveFixer().fix_construction_block,
+        'Старая версия/fix_prison.py': _load_old_entry_point().fix_construction_block,
+    }
+
+
+def _first_difference(a: bytes, b: bytes) -> int:
+    for i, (x, y) in enumerate(zip(a, b)):
+        if x != y:
+            return i
+    return min(len(a), len(b))
+
+
+def check_save(name: str, raw: bytes, fixers: dict, workdir: Path) -> list:
+    """Прогоняет сейв через все точки входа; возвращает список расхождений"""
+    expected = expected_fix(raw)
+    problems = []
+    for label, fix in fixers.items():
+        target = workdir / name
+        target.write_bytes(raw)
+        with contextlib.redirect_stdout(io.StringIO()):
+            fixed = fix(target)
+
+        if expected is None:
+            if fixed or target.read_bytes() != raw:
+                problems.append(f"{label}: файл без блока Construction изменён")
+        elif not fixed:
+            problems.append(f"{label}: исправление не выполнено")
+        else:
+            actual = target.read_bytes()
+            if actual != expected:
+                problems.append(f"{label}: расхождение с эталоном с байта "
+                                f"{_first_difference(actual, expected)}")
+            backup = target.with_stem(f"{target.stem}copy")
+            if not backup.exists() or backup.read_bytes() != raw:
+                problems.append(f"{label}: резервная копия не совпадает с исходным файлом")
+
+        for leftover in workdir.iterdir():
+            leftover.unlink()
+    return problems
+
+
+def collect_corpus(specs) -> dict:
+    corpus = dict(BUILTIN_CASES)
+    paths = []
+    for spec in specs:
+        path = Path(spec)
+        paths += sorted(path.glob("*.prison")) if path.is_dir() else [path]
+    if not specs:
+        from core import PrisonSaveFixer
+        paths = PrisonSaveFixer().find_save_files()
+    for path in paths:
+        corpus[path.name] = path.read_bytes()
+    return corpus
+
+
+def main():
+    corpus = collect_corpus(sys.argv[1:])
+    fixers = entry_points()
+    failed = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, raw in corpus.items():
+            problems = check_save(name, raw, fixers, Path(tmp))
+            if problems:
+                failed += 1
+                print(f"{Color.RED}✗ {name}{Color.END}")
+                for problem in problems:
+                    print(f"    {problem}")
+            else:
+                print(f"{Color.GREEN}✓{Color.END} {name}")
+
+    print(f"\nСейвов: {len(corpus)}, точек входа: {len(fixers)}, расхождений: {failed}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
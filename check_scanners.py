@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Проверка быстрых сканеров формата на случайных сейвах: индекс секций
+(save_format.index_sections), поиск блока (PrisonSaveFixer.find_construction_block),
+исправление построчно (core.stream_fix_construction) и в памяти, диагностика очереди
+(construction_health.check_construction) сравниваются с простой построчной
+эталонной реализацией — тем же подсчётом вложенности
+BEGIN/END, что и в find_construction_block, только по всем словам строки.
+
+Генерируются корректные и испорченные деревья секций: однострочные секции
+(BEGIN Jobs Size 0 END), CRLF, ключевые слова в нижнем регистре, BEGIN в конце
+файла, лишний или потерянный END, файл без перевода строки в конце, значения
+в кавычках со словами begin/end внутри (Forname "Dead End Jim").
+
+    python check_scanners.py                  # 500 случайных сейвов
+    python check_scanners.py --runs 5000 --seed 42
+    python check_scanners.py --hypothesis     # через Hypothesis (pip install hypothesis)
+
+Код выхода 1 — найдено расхождение; проблемный сейв сохраняется в файл
+"""
+import argparse
+import contextlib
+import io
+import random
+import re
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).parent.resolve()
+sys.path.insert(0, str(ROOT))
+
+from ui import Color  # noqa: E402
+
+# Слово или строка в кавычках ("[i 0]")
+WORD_RE = re.compile(rb'"[^"\n]*"|\S+')
+SECTION_NAMES = ('Objects', 'Rooms', 'Zones', 'Patrols', 'Cells', 'Finance', 'Research')
+FIELD_KEYS = ('Id', 'Type', 'Size', 'Pos.x', 'Zone', 'RoomType', 'Value')
+JOB_TYPES = ('Build', 'Demolish', 'Remove')
+# Значения в кавычках из нескольких слов: BEGIN/END внутри них — не ключевые слова
+QUOTED_KEYS = ('Forname', 'Surname', 'Name')
+QUOTED_VALUES = ('"Dead End Jim"', '"end"', '"Begin Again"', '"The END of BEGIN"',
+                 '"Jim Smith"', '""', '"BEGIN Construction"')
+MALFORMATIONS = ('truncate', 'extra_end', 'drop_end', 'no_final_newline')
+
+
+# ГЕНЕРАТОР
+
+class _Node:
+    __slots__ = ('name', 'fields', 'children', 'inline')
+
+    def __init__(self, name, fields, children, inline):
+        self.name = name
+        self.fields = fields
+        self.children = children
+        self.inline = inline
+
+
+def _random_field(r) -> Tuple[str, str]:
+    if r.randint(0, 3) == 0:
+        return r.choice(QUOTED_KEYS), r.choice(QUOTED_VALUES)
+    return r.choice(FIELD_KEYS), str(r.randint(0, 99))
+
+
+def _random_node(r, name: str, depth: int) -> _Node:
+    fields = [_random_field(r) for _ in range(r.randint(0, 3))]
+    children = []
+    if depth < 3:
+        children = [_random_node(r, f'"[i {i}]"', depth + 1) for i in range(r.randint(0, 3))]
+    inline = all(child.inline for child in children) and r.randint(0, 2) == 0
+    return _Node(name, fields, children, inline)
+
+
+def _job(r, index: int) -> _Node:
+    fields = [('Id', str(index)), ('Type', r.choice(JOB_TYPES)),
+              ('X', str(r.randint(0, 25))), ('Y', str(r.randint(0, 25)))]
+    if r.randint(0, 3) == 0:
+        fields.append(_random_field(r))
+    return _Node(f'"[i {index}]"', fields, [], r.randint(0, 3) > 0)
+
+
+def _construction(r) -> _Node:
+    jobs = [_job(r, i) for i in range(r.randint(0, 6))]
+    planning = [_job(r, i) for i in range(r.randint(0, 2))]
+    return _Node('Construction', [], [
+        _Node('Jobs', [('Size', str(len(jobs)))], jobs,
+              not jobs or (all(j.inline for j in jobs) and r.randint(0, 2) == 0)),
+        _Node('PlanningJobs', [('Size', '16000')], planning,
+              not planning or all(j.inline for j in planning) and r.randint(0, 1) == 0),
+        _Node('BlockedAreas', [], [], True),
+    ], False)
+
+
+def _render(r, node: _Node, depth: int, lines: List[Tuple[int, str]], keyword) -> None:
+    if node.inline:
+        parts = []
+
+        def flat(n):
+            parts.extend((keyword('BEGIN'), n.name))
+            for key, value in n.fields:
+                parts.extend((key, value))
+            for child in n.children:
+                flat(child)
+            parts.append(keyword('END'))
+
+        flat(node)
+        lines.append((depth, ' '.join(parts)))
+        return
+
+    lines.append((depth, f"{keyword('BEGIN')} {node.name}"))
+    for key, value in node.fields:
+        lines.append((depth + 1, f"{key} {value}"))
+    for child in node.children:
+        _render(r, child, depth + 1, lines, keyword)
+    lines.append((depth, keyword('END')))
+
+
+def generate_save(r) -> bytes:
+    """Случайный сейв; r — random.Random или совместимый объект (randint, choice)"""
+    mixed_case = r.randint(0, 3) == 0
+
+    def keyword(word):
+        return r.choice((word, word.lower(), word.capitalize())) if mixed_case else word
+
+    newline = r.choice(('\n', '\r\n'))
+    sections = [_random_node(r, r.choice(SECTION_NAMES), 1) for _ in range(r.randint(0, 4))]
+    if r.randint(0, 9) > 0:
+        sections.insert(r.randint(0, len(sections)), _construction(r))
+    for section in sections:
+        # Заголовок Construction всегда на своей строке, остальные секции иногда однострочные
+        if section.name != 'Construction' and r.randint(0, 4) == 0:
+            section.inline = all(child.inline for child in section.children)
+
+    lines = [(0, 'Version 5'), (0, 'NumCellsX 26'), (0, 'NumCellsY 26')]
+    for section in sections:
+        _render(r, section, 0, lines, keyword)
+    # Заголовок Construction с отступом оба движка исправления обязаны найти
+    for i, (depth, text) in enumerate(lines):
+        if text.lower() == 'begin construction' and r.randint(0, 3) == 0:
+            lines[i] = (depth + 1, text)
+
+    malformation = r.choice(MALFORMATIONS) if r.randint(0, 2) == 0 else None
+    if malformation == 'truncate':
+        opening = [i for i, (_, text) in enumerate(lines)
+                   if text.upper().startswith('BEGIN') and not text.upper().endswith('END')]
+        if opening:
+            del lines[r.choice(opening) + 1:]
+    elif malformation == 'extra_end':
+        lines.insert(r.randint(3, len(lines)), (0, keyword('END')))
+    elif malformation == 'drop_end':
+        closing = [i for i, (_, text) in enumerate(lines) if text.upper() == 'END']
+        if closing:
+            del lines[r.choice(closing)]
+
+    data = ''.join('    ' * depth + text + newline for depth, text in lines)
+    if malformation == 'no_final_newline':
+        data = data[:-len(newline)]
+    return data.encode('utf-8')
+
+
+# ЭТАЛОН: построчный подсчёт вложенности по словам
+
+def _words(data: bytes):
+    """Все слова файла: (смещение строки, строка, смещение слова, слово)"""
+    offset = 0
+    for line in data.splitlines(keepends=True):
+        for match in WORD_RE.finditer(line):
+            yield offset, line, offset + match.start(), match.group()
+        offset += len(line)
+
+
+def reference_sections(data: bytes) -> Dict[str, List[Tuple[int, int]]]:
+    sections: Dict[str, List[Tuple[int, int]]] = {}
+    words = list(_words(data))
+    depth = 0
+    open_pos = 0
+    open_index = 0
+    for index, (_, _, pos, word) in enumerate(words):
+        keyword = word.upper()
+        if keyword == b'BEGIN':
+            if depth == 0:
+                open_pos, open_index = pos, index
+            depth += 1
+        elif keyword == b'END' and depth > 0:
+            depth -= 1
+            if depth == 0:
+                name = words[open_index + 1][3].strip(b'"') if open_index + 1 < len(words) else b''
+                sections.setdefault(name.decode('ascii', 'replace'), []).append((open_pos, pos + 3))
+    return sections
+
+
+def reference_construction(data: bytes) -> Optional[dict]:
+    """Блок Construction, как его ищет find_construction_block: строка-заголовок
+       и все строки до той, где вложенность возвращается к нулю
+    """
+    offset = 0
+    lines = data.splitlines(keepends=True)
+    for number, line in enumerate(lines):
+        words = WORD_RE.findall(line)
+        if len(words) == 2 and words[0].upper() == b'BEGIN' and words[1].lower() == b'construction':
+            break
+        offset += len(line)
+    else:
+        return None
+
+    header = lines[number]
+    result = {
+        'start': offset,
+        'newline': b'\r\n' if header.endswith(b'\r\n') else b'\n',
+        'jobs': 0,
+        'planning_jobs': 0,
+    }
+    offset += len(header)
+    depth = 1
+    child = None
+    expect_name = False
+    for line in lines[number + 1:]:
+        offset += len(line)
+        for word in WORD_RE.findall(line):
+            keyword = word.upper()
+            if expect_name:
+                expect_name = False
+                if depth == 2:
+                    child = word
+                elif depth == 3 and child == b'Jobs':
+                    result['jobs'] += 1
+                elif depth == 3 and child == b'PlanningJobs':
+                    result['planning_jobs'] += 1
+                continue
+            if keyword == b'BEGIN':
+                depth += 1
+                expect_name = True
+            elif keyword == b'END':
+                if depth == 2:
+                    child = None
+                depth -= 1
+                if depth == 0:
+                    break
+        if depth == 0:
+            result['end'] = offset
+            return result
+    return None
+
+
+# ПРОВЕРКИ
+
+def check_save(data: bytes, workdir: Path) -> List[str]:
+    from construction_health import check_construction
+    from core import FIXED_CONSTRUCTION_LINES, PrisonSaveFixer, stream_fix_construction
+    from save_format import index_sections
+
+    problems = []
+
+    expected_sections = reference_sections(data)
+    actual_sections = index_sections(data)
+    if actual_sections != expected_sections:
+        problems.append(f"index_sections: {actual_sections} != эталон {expected_sections}")
+
+    block = reference_construction(data)
+
+    span = PrisonSaveFixer().find_construction_block(data.decode('utf-8'))
+    expected_span = (block['start'], block['end']) if block else None
+    if span != expected_span:
+        problems.append(f"find_construction_block: {span} != эталон {expected_span}")
+
+    out = io.BytesIO()
+    fixed = stream_fix_construction(io.BytesIO(data), out)
+    if block is None:
+        if fixed:
+            problems.append("stream_fix_construction: исправлен файл без закрытого блока")
+    else:
+        newline = block['newline']
+        expected = (data[:block['start']]
+                    + newline.join(text.encode('ascii') for text in FIXED_CONSTRUCTION_LINES)
+                    + newline + data[block['end']:])
+        if not fixed:
+            problems.append("stream_fix_construction: блок не найден")
+        elif out.getvalue() != expected:
+            problems.append("stream_fix_construction: результат отличается от эталона")
+
+    path = workdir / "case.prison"
+    if block is not None:
+        # Исправление в памяти должно давать те же байты, что и построчное
+        path.write_bytes(data)
+        with contextlib.redirect_stdout(io.StringIO()):
+            memory_fixed = PrisonSaveFixer()._fix_construction_block(path)
+        if not memory_fixed:
+            problems.append("_fix_construction_block: блок не найден")
+        elif path.read_bytes() != expected:
+            problems.append("_fix_construction_block: результат отличается от эталона")
+    path.write_bytes(data)
+    report = check_construction(path)
+    if block is None:
+        if report is not None:
+            problems.append("check_construction: отчёт для файла без закрытого блока")
+    elif report is None:
+        problems.append("check_construction: блок не найден")
+    else:
+        actual = (report['jobs'], report['planning_jobs'], report['block_bytes'])
+        wanted = (block['jobs'], block['planning_jobs'], block['end'] - block['start'])
+        if actual != wanted:
+            problems.append(f"check_construction: (jobs, planning_jobs, block_bytes) "
+                            f"{actual} != эталон {wanted}")
+    return problems
+
+
+def _report_failure(data: bytes, problems: List[str], label: str) -> None:
+    out = Path(tempfile.gettempdir()) / "scanner_failure.prison"
+    out.write_bytes(data)
+    print(f"{Color.RED}✗ Расхождение ({label}){Color.END}")
+    for problem in problems:
+        print(f"    {problem}")
+    print(f"  Сейв сохранён: {out}")
+
+
+def run_random(runs: int, seed: int) -> int:
+    with tempfile.TemporaryDirectory() as tmp:
+        for run in range(runs):
+            case_seed = seed + run
+            data = generate_save(random.Random(case_seed))
+            problems = check_save(data, Path(tmp))
+            if problems:
+                _report_failure(data, problems, f"--seed {case_seed} --runs 1")
+                return 1
+    print(f"{Color.GREEN}✓ {runs} случайных сейвов: быстрые сканеры совпадают с эталоном{Color.END}")
+    return 0
+
+
+class _DrawRandom:
+    """random.Random поверх Hypothesis: каждое решение генератора — отдельный draw,
+       поэтому Hypothesis может уменьшать найденный пример"""
+
+    def __init__(self, data, st):
+        self._data = data
+        self._st = st
+
+    def randint(self, a: int, b: int) -> int:
+        return self._data.draw(self._st.integers(a, b))
+
+    def choice(self, seq):
+        return self._data.draw(self._st.sampled_from(seq))
+
+
+def run_hypothesis(runs: int) -> int:
+    try:
+        from hypothesis import given, settings, strategies as st, HealthCheck
+    except ImportError:
+        print(f"{Color.RED}Hypothesis не установлен:{Color.END} pip install hypothesis")
+        return 1
+
+    tmp = tempfile.TemporaryDirectory()
+
+    @settings(max_examples=runs, deadline=None,
+              suppress_health_check=[HealthCheck.too_slow, HealthCheck.data_too_large])
+    @given(st.data())
+    def scanners_agree(data):
+        save = generate_save(_DrawRandom(data, st))
+        problems = check_save(save, Path(tmp.name))
+        if problems:
+            _report_failure(save, problems, "Hypothesis")
+        assert not problems, problems
+
+    try:
+        scanners_agree()
+    except AssertionError:
+        return 1
+    finally:
+        tmp.cleanup()
+    print(f"{Color.GREEN}✓ Hypothesis: {runs} примеров, быстрые сканеры совпадают с эталоном{Color.END}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение быстрых сканеров с эталоном")
+    parser.add_argument('--runs', type=int, default=500, help="число сейвов (по умолчанию 500)")
+    parser.add_argument('--seed', type=int, default=0, help="начальное зерно генератора")
+    parser.add_argument('--hypothesis', action='store_true',
+                        help="генерировать и уменьшать примеры через Hypothesis")
+    args = parser.parse_args()
+    sys.exit(run_hypothesis(args.runs) if args.hypothesis else run_random(args.runs, args.seed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+# -*- coding: utf-8 -*-
+"""
+Диагностика очереди задач строительства без изменения сейва.
+Блок Construction (тот же, что находит find_construction_block) читается
+потоково по байтам: считаются записи Jobs и PlanningJobs, дубликаты
+(одна и та же задача на одной клетке) и «сироты» (задачи без координат
+или за пределами карты). Память не зависит от длины очереди: для
+дубликатов используется битовая карта клеток на каждый тип задачи
+"""
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+import profiling
+from save_format import HEADER_RE, ITEM_RE
+
+READ_BUFFER = 1024 * 1024
+JOB_SECTIONS = ('Jobs', 'PlanningJobs')
+
+# Пороги решения: сколько записей в очереди уже заметно тормозит игру
+WARN_JOBS = 1000
+FIX_JOBS = 5000
+
+# Скорость записи для плана берётся только из замеров настоящих исправлений:
+# этапы записи в profiling этого запуска или в журнале метрик (--metrics-jsonl)
+WRITE_STAGES = ('write', 'stream_fix')
+# Сколько последних исправлений из журнала учитывается
+JOURNAL_FIXES = 200
+
+# Битовые карты заводятся не больше чем для стольких типов задач —
+# иначе память росла бы вместе с мусорными типами
+MAX_TRACKED_TYPES = 64
+
+
+class _JobBitmaps:
+    """Занятые клетки по типам задач: по биту на клетку карты"""
+
+    def __init__(self, width: Optional[int], height: Optional[int]):
+        self.width = width
+        self.height = height
+        self.cells = width * height if width and height else 0
+        self._maps: Dict[bytes, bytearray] = {}
+
+    def inside(self, x: int, y: int) -> bool:
+        if not self.cells:
+            return x >= 0 and y >= 0
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def seen(self, job_type: bytes, x: int, y: int) -> Optional[bool]:
+        """Отмечает клетку; True — такая задача здесь уже была, None — проверить нельзя"""
+        if not self.cells:
+            return None
+        bitmap = self._maps.get(job_type)
+        if bitmap is None:
+            if len(self._maps) >= MAX_TRACKED_TYPES:
+                return None
+            bitmap = self._maps[job_type] = bytearray((self.cells + 7) // 8)
+        cell = y * self.width + x
+        mask = 1 << (cell & 7)
+        if bitmap[cell >> 3] & mask:
+            return True
+        bitmap[cell >> 3] |= mask
+        return False
+
+
+def _number(value: Optional[bytes]) -> Optional[int]:
+    """Координата клетки: целая часть числа ("12" или "12.5")"""
+    if value is None:
+        return None
+    try:
+        return int(float(value))
+    except ValueError:
+        return None
+
+
+def check_construction(path: Path) -> Optional[dict]:
+    """Проверяет очередь задач строительства в сейве, не изменяя файл.
+       Возвращает отчёт или None, если блок Construction не найден или не закрыт
+    """
+    from core import CONSTRUCTION_HEADER_RE
+
+    path = Path(path)
+    started = time.perf_counter()
+    width = height = None
+    file_size = path.stat().st_size
+    block_start = 0
+    offset = 0
+
+    report = {
+        'file': str(path),
+        'file_bytes': file_size,
+        'block_bytes': 0,
+        'jobs': 0,
+        'planning_jobs': 0,
+        'declared': {},
+        'duplicates': 0,
+        'orphaned': 0,
+        'unchecked': 0,
+        'job_types': {},
+        'newline': '\n',
+    }
+
+    with open(path, 'rb', buffering=READ_BUFFER) as f:
+        for line in f:
+            if CONSTRUCTION_HEADER_RE.match(line):
+                block_start = offset
+                report['newline'] = '\r\n' if line.endswith(b'\r\n') else '\n'
+                offset += len(line)
+                break
+            offset += len(line)
+            if line.lstrip()[:8] == b'NumCells':
+                match = HEADER_RE.match(line)
+                if match:
+                    if match.group(1) == b'NumCellsX':
+                        width = int(match.group(2))
+                    else:
+                        height = int(match.group(2))
+        else:
+            return None
+
+        bitmaps = _JobBitmaps(width, height)
+        depth = 1           # внутри BEGIN Construction
+        expect_name = False
+        child = None        # Jobs / PlanningJobs / BlockedAreas
+        key = None
+        entry = None        # поля текущей задачи: Type, X, Y
+
+        for line in f:
+            offset += len(line)
+            tokens = ITEM_RE.findall(line) if b'"' in line else line.split()
+            for token in tokens:
+                keyword = token.upper()
+                if keyword == b'BEGIN':
+                    depth += 1
+                    expect_name = True
+                    key = None
+                    if depth == 3 and child in JOB_SECTIONS:
+                        entry = {}
+                    continue
+
+                if expect_name:
+                    expect_name = False
+                    if depth == 2:
+                        child = token.decode('ascii', 'replace')
+                    continue
+
+                if keyword == b'END':
+                    if depth == 3 and entry is not None:
+                        _check_job(report, bitmaps, child, entry)
+                        entry = None
+                    elif depth == 2:
+                        child = None
+                    depth -= 1
+                    key = None
+                    if depth == 0:
+                        break
+                    continue
+
+                if key is None:
+                    key = token
+                    continue
+                if depth == 3 and entry is not None and key in (b'Type', b'X', b'Y'):
+                    entry[key] = token
+                elif depth == 2 and key == b'Size' and child:
+                    report['declared'][child] = _number(token)
+                key = None
+
+            if depth == 0:
+                break
+            # Пара «ключ значение» не переносится через строку
+            key = None
+        else:
+            return None
+
+    seconds = time.perf_counter() - started
+    report['block_bytes'] = offset - block_start
+    report['scanned_bytes'] = offset
+    report['seconds'] = seconds
+    profiling.record('construction_check', seconds, offset)
+    report.update(_verdict(report, offset / max(seconds, 1e-9)))
+    return report
+
+
+def _check_job(report: dict, bitmaps: _JobBitmaps, section: str, entry: dict) -> None:
+    report['jobs' if section == 'Jobs' else 'planning_jobs'] += 1
+    job_type = entry.get(b'Type', b'?')
+    types = report['job_types']
+    name = job_type.strip(b'"').decode('utf-8', 'replace')
+    if name in types or len(types) < MAX_TRACKED_TYPES:
+        types[name] = types.get(name, 0) + 1
+
+    x, y = _number(entry.get(b'X')), _number(entry.get(b'Y'))
+    if x is None or y is None or not bitmaps.inside(x, y):
+        report['orphaned'] += 1
+        return
+    seen = bitmaps.seen(job_type, x, y)
+    if seen is None:
+        report['unchecked'] += 1
+    elif seen:
+        report['duplicates'] += 1
+
+
+def _verdict(report: dict, scan_speed: float) -> dict:
+    """Оценка влияния очереди и решение: ok / warn / fix"""
+    queued = report['jobs'] + report['planning_jobs']
+    stale = report['duplicates'] + report['orphaned']
+    if queued >= FIX_JOBS or (queued and stale * 2 >= queued):
+        verdict = 'fix'
+    elif queued >= WARN_JOBS or stale:
+        verdict = 'warn'
+    else:
+        verdict = 'ok'
+    return {
+        'verdict': verdict,
+        'block_share': report['block_bytes'] / report['file_bytes'] if report['file_bytes'] else 0.0,
+        # Нижняя оценка: столько занимает один разбор блока при загрузке и сохранении
+        'parse_ms': report['block_bytes'] / scan_speed * 1000,
+    }
+
+
+def _stage_speed(stages: Iterable[dict]) -> Optional[float]:
+    seconds = nbytes = 0
+    for stage in stages:
+        seconds += stage['seconds']
+        nbytes += stage['bytes']
+    return nbytes / seconds if nbytes and seconds > 0 else None
+
+
+def _journal_write_speed(jsonl_path: Path) -> Optional[float]:
+    """Скорость записи по этапам последних исправлений в журнале метрик"""
+    import json
+    from collections import deque
+
+    stages = deque(maxlen=JOURNAL_FIXES * len(WRITE_STAGES))
+    try:
+        with open(jsonl_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get('operation') != 'fix' or entry.get('result') != 'ok':
+                    continue
+                stages.extend(stage for name, stage in (entry.get('stages') or {}).items()
+                              if name in WRITE_STAGES)
+    except OSError:
+        return None
+    return _stage_speed(stages)
+
+
+def estimate_write_speed() -> Optional[float]:
+    """Скорость записи, байт/с, по замерам настоящих исправлений: этапы записи
+       в этом запуске (profiling), иначе прошлые исправления из журнала метрик.
+       None — замеров нет, оценку времени записи дать нельзя
+    """
+    import metrics
+
+    stages = profiling.snapshot()['stages']
+    speed = _stage_speed(stages[name] for name in WRITE_STAGES if name in stages)
+    if speed is not None:
+        return speed
+    sink = metrics.get_sink()
+    jsonl_path = getattr(sink, 'jsonl_path', None)
+    return _journal_write_speed(Path(jsonl_path)) if jsonl_path else None
+
+
+def plan_fix(path: Path, write_speed: Optional[float] = None) -> Optional[dict]:
+    """План исправления без изменения файла: сколько байт и задач уйдёт,
+       какого размера станет сейв и сколько займёт запись (None, если скорость
+       записи не задана и замеров нет). Возвращает None, если блок Construction
+       не найден или не закрыт
+    """
+    from core import fixed_construction
+
+    report = check_construction(path)
+    if report is None:
+        return None
+
+    # Пустой блок пишется с переводами строк заголовка, как в обоих движках
+    fixed_bytes = len(fixed_construction(report['newline']))
+    removed = report['block_bytes'] - fixed_bytes
+    new_size = report['file_bytes'] - removed
+    if write_speed is None:
+        write_speed = estimate_write_speed()
+    # Исправление пишет резервную копию исходного файла и новый сейв
+    written = report['file_bytes'] + new_size
+
+    return {
+        'file': report['file'],
+        'file_bytes': report['file_bytes'],
+        'block_bytes': report['block_bytes'],
+        'bytes_removed': removed,
+        'jobs': report['jobs'],
+        'planning_jobs': report['planning_jobs'],
+        'jobs_dropped': report['jobs'] + report['planning_jobs'],
+        'new_size': new_size,
+        'bytes_written': written,
+        'write_speed': write_speed,
+        'write_seconds': written / write_speed if write_speed else None,
+    }
+
+
+def print_plan(path: Path, plan: Optional[dict]) -> None:
+    from ui import Color
+
+    print(f"\n{Color.CYAN}План исправления (файл не изменяется): {Path(path).name}{Color.END}")
+    if plan is None:
+        print(f"  {Color.YELLOW}Блок 'Construction' не найден или не закрыт{Color.END}")
+        return
+
+    megabyte = 1024 * 1024
+    print(f"  • Удаляемые задачи: {plan['jobs_dropped']} "
+          f"(Jobs {plan['jobs']}, PlanningJobs {plan['planning_jobs']})")
+    print(f"  • Освобождается: {plan['bytes_removed'] / megabyte:.2f} МБ")
+    print(f"  • Размер сейва: {plan['file_bytes'] / megabyte:.2f} МБ → "
+          f"{plan['new_size'] / megabyte:.2f} МБ")
+    if plan['write_seconds'] is None:
+        print(f"  • Запись (копия + новый сейв): {plan['bytes_written'] / megabyte:.1f} МБ, "
+              f"время не оценить: нет замеров записи (--write-speed или --metrics-jsonl "
+              f"с прошлыми исправлениями)")
+        return
+    print(f"  • Запись (копия + новый сейв): {plan['bytes_written'] / megabyte:.1f} МБ, "
+          f"≈{plan['write_seconds']:.2f} с при {plan['write_speed'] / megabyte:.0f} МБ/с")
+
+
+def print_report(path: Path, report: Optional[dict]) -> None:
+    from ui import Color
+
+    print(f"\n{Color.CYAN}Очередь строительства: {Path(path).name}{Color.END}")
+    if report is None:
+        print(f"  {Color.YELLOW}Блок 'Construction' не найден или не закрыт{Color.END}")
+        return
+
+    print(f"  • Задачи (Jobs): {report['jobs']}")
+    print(f"  • Планируемые задачи (PlanningJobs): {report['planning_jobs']}")
+    if report['duplicates']:
+        print(f"  • {Color.YELLOW}Дубликаты (та же задача на той же клетке):{Color.END} {report['duplicates']}")
+    if report['orphaned']:
+        print(f"  • {Color.YELLOW}Сироты (без координат или за пределами карты):{Color.END} {report['orphaned']}")
+    if report['unchecked']:
+        print(f"  • Не проверены на дубликаты (нет размера карты): {report['unchecked']}")
+    if report['job_types']:
+        types = sorted(report['job_types'].items(), key=lambda item: -item[1])
+        print("  • Типы: " + ", ".join(f"{name} {count}" for name, count in types[:8]))
+    print(f"  • Блок: {report['block_bytes'] / 1024:.1f} КБ "
+          f"({report['block_share'] * 100:.1f}% сейва), "
+          f"≈{report['parse_ms']:.1f} мс на каждый разбор при загрузке и сохранении")
+
+    verdict = report['verdict']
+    if verdict == 'fix':
+        print(f"  {Color.RED}Рекомендуется исправление блока Construction{Color.END}")
+    elif verdict == 'warn':
+        print(f"  {Color.YELLOW}Очередь растёт — стоит присмотреться{Color.END}")
+    else:
+        print(f"  {Color.GREEN}✓ Очередь в норме{Color.END}")
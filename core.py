@@ -5,11 +5,67 @@ Prison Architect Save Fixer — ядро приложения
 """
 import os
 import sys
-import shutil
 import re
 from pathlib import Path
 from typing import Optional, List, Tuple
 from ui import Color
+import profiling
+import metrics
+from save_format import TEXT_TOKEN_RE, TOKEN_RE
+
+
+# Пустой блок Construction, которым заменяются зависшие задачи
+FIXED_CONSTRUCTION_LINES = (
+    "BEGIN Construction",
+    "BEGIN Jobs Size 0 END",
+    "BEGIN PlanningJobs Size 16000 END",
+    "BEGIN BlockedAreas END",
+    "END",
+)
+
+# Заголовок блока — отдельная строка BEGIN Construction (отступ допускается).
+# Одно правило для построчного исправления (строка в байтах) и исправления
+# в памяти (декодированный текст), чтобы оба движка находили один и тот же блок
+_CONSTRUCTION_HEADER = r'^[ \t\f\v]*BEGIN[ \t\f\v]+Construction[ \t\f\v\r]*$'
+CONSTRUCTION_HEADER_RE = re.compile(_CONSTRUCTION_HEADER.encode('ascii'), re.IGNORECASE)
+CONSTRUCTION_START_RE = re.compile(_CONSTRUCTION_HEADER, re.IGNORECASE | re.MULTILINE)
+
+
+def fixed_construction(newline: str = '\n') -> str:
+    """Пустой блок Construction. Переводы строк берутся те же, что у строки
+       заголовка в исходном сейве (\n или \r\n), — так пишут оба движка
+    """
+    return newline.join(FIXED_CONSTRUCTION_LINES) + newline
+
+
+def stream_fix_construction(src, dst) -> bool:
+    """Построчно копирует сейв из src в dst (бинарные потоки), заменяя блок
+       Construction пустым. Весь файл в память не читается. Возвращает False,
+       если блок не найден или не закрыт (тогда содержимое dst неполное)
+    """
+    import shutil
+
+    for line in src:
+        if not CONSTRUCTION_HEADER_RE.match(line):
+            dst.write(line)
+            continue
+
+        newline = '\r\n' if line.endswith(b'\r\n') else '\n'
+        depth = 1
+        for inner in src:
+            for token in TOKEN_RE.findall(inner):
+                if token:
+                    depth += 1 if len(token) == 5 else -1
+            if depth <= 0:
+                break
+        if depth > 0:
+            return False
+
+        dst.write(fixed_construction(newline).encode('ascii'))
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+        return True
+
+    return False
 
 
 class PrisonSaveFixer:
@@ -17,8 +73,16 @@ class PrisonSaveFixer:
 
     def __init__(self):
         self.saves_path = self.get_saves_path()
-        self.encoding = 'cp1251'
         self.plugins = []
+        self._context = None
+
+    @property
+    def context(self):
+        """Общий SaveContext для плагинов (создаётся при первом обращении)"""
+        if self._context is None:
+            from save_context import SaveContext
+            self._context = SaveContext(self.saves_path)
+        return self._context
 
     def get_saves_path(self) -> Optional[Path]:
         """Автоматически определяет путь к папке сохранений в зависимости от ОС"""
@@ -50,15 +114,8 @@ class PrisonSaveFixer:
         return None
 
     def find_save_files(self) -> List[Path]:
-        """Находит все файлы .prison в папке сохранений"""
-        if not self.saves_path or not self.saves_path.exists():
-            return []
-
-        return sorted(
-            [f for f in self.saves_path.glob("*.prison") if f.is_file()],
-            key=lambda x: x.stat().st_mtime,
-            reverse=True
-        )
+        """Находит все файлы .prison в папке сохранений (список общий с плагинами)"""
+        return self.context.list_saves()
 
     def normalize_filename(self, filename: str) -> str:
         """Добавляет расширение .prison если его нет"""
@@ -119,9 +176,12 @@ class PrisonSaveFixer:
 
     def create_backup(self, filepath: Path) -> Optional[Path]:
         """Создаёт резервную копию файла с суффиксом 'copy' перед расширением"""
+        import shutil
+
         try:
             backup_path = filepath.with_stem(f"{filepath.stem}copy")
-            shutil.copy2(filepath, backup_path)
+            with profiling.stage('backup', filepath.stat().st_size):
+                shutil.copy2(filepath, backup_path)
             print(
                 f"{Color.GREEN}✓ Создана резервная копия:{Color.END} {backup_path.name}")
             return backup_path
@@ -133,84 +193,93 @@ class PrisonSaveFixer:
         """
         Находит блок BEGIN Construction ... END с учётом вложенности.
         Возвращает (start_pos, end_pos) или None если не найден.
+        start_pos — начало строки заголовка, end_pos — конец строки с закрывающим END.
+        Однострочные секции (BEGIN Jobs Size 0 END) сбалансированы сами по себе,
+        поэтому проход по словам BEGIN/END заканчивается сразу на конце блока
         """
-        start_match = re.search(
-            r'\nBEGIN\s+Construction\s*\n', content, re.IGNORECASE)
+        start_match = CONSTRUCTION_START_RE.search(content)
         if not start_match:
             return None
 
-        start_pos = start_match.end()
         depth = 1
-        i = start_pos
-        content_len = len(content)
-
-        while i < content_len and depth > 0:
-            begin_match = re.search(
-                r'\nBEGIN\s+[^\n]*\n', content[i:], re.IGNORECASE)
-            end_match = re.search(r'\nEND\s*\n', content[i:], re.IGNORECASE)
-
-            next_begin = i + begin_match.start() if begin_match else None
-            next_end = i + end_match.start() if end_match else None
-
-            if next_begin is not None and (next_end is None or next_begin < next_end):
-                depth += 1
-                i = next_begin + 1
-            elif next_end is not None:
-                depth -= 1
-                i = next_end + 1
-            else:
-                break
-
-        if depth == 0:
-            end_pos = i
-            return (start_match.start(), end_pos)
+        for token in TEXT_TOKEN_RE.finditer(content, start_match.end()):
+            keyword = token.group(1)
+            if not keyword:
+                continue
+            depth += 1 if len(keyword) == 5 else -1
+            if depth == 0:
+                end_pos = content.find('\n', token.end()) + 1
+                return (start_match.start(), end_pos or len(content))
 
         return None
 
-    def fix_construction_block(self, filepath: Path) -> bool:
-        """Исправляет блок Construction в файле"""
+    def fix_construction_block(self, filepath: Path, dry_run: bool = False,
+                               stream: bool = False) -> bool:
+        """Исправляет блок Construction в файле.
+           С dry_run только печатает план исправления, файл не изменяется;
+           stream=True исправляет построчно, не читая весь сейв в память
+        """
+        if dry_run:
+            from construction_health import plan_fix, print_plan
+
+            plan = plan_fix(filepath)
+            print_plan(filepath, plan)
+            return plan is not None
+
+        with metrics.track('fix', filepath) as op:
+            if stream:
+                fixed = self._stream_fix_construction_block(filepath)
+            else:
+                fixed = self._fix_construction_block(filepath)
+            op['result'] = 'ok' if fixed else 'failed'
+        return fixed
+
+    def _fix_construction_block(self, filepath: Path) -> bool:
         try:
-            with open(filepath, 'rb') as f:
-                raw_data = f.read()
+            with profiling.stage('read') as st:
+                with open(filepath, 'rb') as f:
+                    raw_data = f.read()
+                st.bytes = len(raw_data)
 
-            try:
-                content = raw_data.decode('utf-8')
-                self.encoding = 'utf-8'
-            except UnicodeDecodeError:
+            with profiling.stage('decode', len(raw_data)):
                 try:
-                    content = raw_data.decode('cp1251')
-                    self.encoding = 'cp1251'
+                    content = raw_data.decode('utf-8')
+                    encoding = 'utf-8'
                 except UnicodeDecodeError:
-                    print(
-                        f"{Color.RED}✗ Не удалось определить кодировку файла{Color.END}")
-                    return False
-
-            block_pos = self.find_construction_block(content)
+                    try:
+                        content = raw_data.decode('cp1251')
+                        encoding = 'cp1251'
+                    except UnicodeDecodeError:
+                        print(
+                            f"{Color.RED}✗ Не удалось определить кодировку файла{Color.END}")
+                        return False
+
+            with profiling.stage('find_construction_block', len(raw_data)):
+                block_pos = self.find_construction_block(content)
             if not block_pos:
                 print(
                     f"{Color.RED}✗ Блок 'Construction' не найден в файле!{Color.END}")
                 return False
 
             start_pos, end_pos = block_pos
-
-            fixed_block = (
-                "\nBEGIN Construction\n"
-                "BEGIN Jobs Size 0 END\n"
-                "BEGIN PlanningJobs Size 16000 END\n"
-                "BEGIN BlockedAreas END\n"
-                "END\n"
-            )
+            header_end = content.find('\n', start_pos)
+            newline = '\r\n' if content[header_end - 1:header_end] == '\r' else '\n'
+            fixed_block = fixed_construction(newline)
 
             new_content = content[:start_pos] + fixed_block + content[end_pos:]
+            profiling.count('construction_chars_removed', end_pos - start_pos)
 
             if not self.create_backup(filepath):
                 return False
 
-            with open(filepath, 'wb') as f:
-                f.write(new_content.encode(self.encoding))
+            with profiling.stage('encode') as st:
+                # Кодировка только в локальной переменной: один fixer могут использовать несколько потоков
+                new_data = new_content.encode(encoding)
+                st.bytes = len(new_data)
 
-            print(f"{Color.GREEN}Файл успешно исправлен:{Color.END} {filepath.name}")
-            return True
+            with profiling.stage('write', len(new_data)):
+                with open(filepath, 'wb') as f:
+                    f.write(new_data)
 
         except Exception as e:
             print(f"{Color.RED}Ошибка при обработке файла: {e}{Color.END}")
@@ -218,25 +287,103 @@ class PrisonSaveFixer:
             traceback.print_exc()
             return False
 
-    def transfer_save(self, source_file: Path) -> bool:
-        """Переносит сейв и скриншот в папку сохранений игры"""
+        # Файл уже записан: сброс кэшей — вне try, он не может «провалить» исправление
+        self.context.invalidate(filepath)
+        print(f"{Color.GREEN}Файл успешно исправлен:{Color.END} {filepath.name}")
+        return True
+
+    def _stream_fix_construction_block(self, filepath: Path) -> bool:
+        """Исправление через временный файл рядом с сейвом: память не зависит от размера"""
+        import tempfile
+
+        fd, tmp_name = tempfile.mkstemp(prefix=f".{filepath.stem}-", suffix='.tmp',
+                                        dir=filepath.parent)
+        tmp_path = Path(tmp_name)
+        try:
+            with profiling.stage('stream_fix', filepath.stat().st_size):
+                with open(filepath, 'rb', buffering=1024 * 1024) as src, \
+                        os.fdopen(fd, 'wb', buffering=1024 * 1024) as dst:
+                    fixed = stream_fix_construction(src, dst)
+            if not fixed:
+                print(
+                    f"{Color.RED}✗ Блок 'Construction' не найден в файле!{Color.END}")
+                return False
+
+            if not self.create_backup(filepath):
+                return False
+            os.replace(tmp_path, filepath)
+
+        except Exception as e:
+            print(f"{Color.RED}Ошибка при обработке файла: {e}{Color.END}")
+            return False
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+        self.context.invalidate(filepath)
+        print(f"{Color.GREEN}Файл успешно исправлен:{Color.END} {filepath.name}")
+        return True
+
+    def transfer_save(self, source_file: Path, fix: bool = False) -> bool:
+        """Переносит сейв и скриншот в папку сохранений игры.
+           Архив (.zip, .tar*, .7z) переносится потоково без распаковки на диск,
+           fix=True исправляет сейвы из архива на лету
+        """
+        from archive_import import is_archive
+
+        if is_archive(source_file):
+            return self._transfer_archive(source_file, fix)
+
+        with metrics.track('transfer', source_file) as op:
+            transferred = self._transfer_save(source_file)
+            op['result'] = 'ok' if transferred else 'failed'
+        return transferred
+
+    def _transfer_archive(self, archive: Path, fix: bool) -> bool:
+        from archive_import import import_archive, print_summary
+
         if not self.saves_path:
             print(f"{Color.RED}✗ Не найдена папка сохранений игры{Color.END}")
             return False
 
+        print(f"\n{Color.BLUE}Перенос из архива:{Color.END} {archive.name}")
+        try:
+            summary = import_archive(archive, self.saves_path, fix)
+        except Exception as e:
+            print(f"{Color.RED}Ошибка чтения архива: {e}{Color.END}")
+            return False
+        finally:
+            self.context.invalidate()
+
+        if not summary['saves']:
+            print(f"{Color.RED}✗ В архиве не найдено файлов .prison{Color.END}")
+            return False
+        print_summary(archive, summary, fix)
+        return True
+
+    def _transfer_save(self, source_file: Path) -> bool:
+        if not self.saves_path:
+            print(f"{Color.RED}✗ Не найдена папка сохранений игры{Color.END}")
+            return False
+
+        import shutil
+
         try:
             dest_file = self.saves_path / source_file.name
             screenshot_src = source_file.with_suffix('.png')
             screenshot_dest = self.saves_path / screenshot_src.name
 
             print(f"\n{Color.BLUE}Копирование файла:{Color.END} {source_file.name}")
-            shutil.copy2(source_file, dest_file)
+            with profiling.stage('transfer_copy', source_file.stat().st_size):
+                shutil.copy2(source_file, dest_file)
             print(f"{Color.GREEN}Сейв скопирован:{Color.END} {dest_file}")
+            self.context.invalidate(dest_file)
 
             if screenshot_src.exists():
                 print(
                     f"{Color.BLUE}Копирование скриншота:{Color.END} {screenshot_src.name}")
-                shutil.copy2(screenshot_src, screenshot_dest)
+                with profiling.stage('transfer_copy', screenshot_src.stat().st_size):
+                    shutil.copy2(screenshot_src, screenshot_dest)
                 print(
                     f"{Color.GREEN}Скриншот скопирован:{Color.END} {screenshot_dest}")
             else:
@@ -251,4 +398,5 @@ class PrisonSaveFixer:
     def load_plugins(self):
         """Загружает плагины из внешней папки plugins (рядом с .exe или скриптом)"""
         from plugin_loader import load_plugins as loader
-        self.plugins = loader()
+        with profiling.stage('load_plugins'):
+            self.plugins = loader()
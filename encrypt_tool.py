@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 import sys
 import os
+import json
 from pathlib import Path
 
 
@@ -12,16 +13,28 @@ def encrypt_plugin(input_path: str, output_path: str):
         print("Ошибка: установите pycryptodome → pip install pycryptodome")
         sys.exit(1)
 
-    # ДОЛЖЕН СОВПАДАТЬ С КЛЮЧОМ В plugin_loader.py
-    SECRET_KEY = b'PrisonToolkitKey1234567890ABCDEF'
+    # Ключ и формат заголовка берутся из загрузчика, чтобы не разойтись с ним
+    from plugin_loader import DECRYPTION_KEY, ENC_MAGIC, read_plugin_info
 
     with open(input_path, 'rb') as f:
         source_code = f.read()
 
-    cipher = AES.new(SECRET_KEY, AES.MODE_GCM)
+    # Метаданные (PLUGIN_INFO) пишутся открыто, чтобы меню строилось без расшифровки
+    info = read_plugin_info(source_code)
+    if info is None:
+        print("Внимание: в плагине нет PLUGIN_INFO — он будет расшифровываться при каждом запуске")
+
+    cipher = AES.new(DECRYPTION_KEY, AES.MODE_GCM)
+    if info is not None:
+        meta = json.dumps(info, ensure_ascii=False).encode('utf-8')
+        cipher.update(meta)
     ciphertext, tag = cipher.encrypt_and_digest(source_code)
 
     with open(output_path, 'wb') as f:
+        if info is not None:
+            f.write(ENC_MAGIC)
+            f.write(len(meta).to_bytes(2, 'big'))
+            f.write(meta)
         f.write(cipher.nonce)
         f.write(tag)
         f.write(ciphertext)
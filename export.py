@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+Колоночная выгрузка содержимого сейвов для аналитики по библиотеке:
+записи секций Objects, Rooms и Zones — по строке на сущность (тип, id,
+координаты и ключевые поля). CSV доступен всегда, Arrow и Parquet — если
+установлен pyarrow.
+
+Сейв читается одним потоковым проходом (pipeline.SavePipeline), строки
+копятся пачками по batch_size и сбрасываются в файл, поэтому память не
+зависит от размера сейва. Сейвы обрабатываются параллельно в процессах,
+каждый сейв пишет свою часть таблицы:
+
+    OUT/objects/<сейв>.csv    OUT/rooms/<сейв>.csv    OUT/zones/<сейв>.csv
+
+Такой набор частей читают pandas, DuckDB и pyarrow.dataset
+"""
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+FORMATS = ('csv', 'parquet', 'arrow')
+EXTENSIONS = {'csv': '.csv', 'parquet': '.parquet', 'arrow': '.arrow'}
+DEFAULT_BATCH = 50_000
+
+# Таблица → (секция, [(столбец, поле записи, тип)]).
+# Перед ними всегда идут save (имя части: имя сейва, одноимённые сейвы
+# из разных папок с номером) и row (номер записи в секции)
+TABLES = {
+    'objects': ('Objects', [
+        ('id', 'Id.i', int),
+        ('uid', 'Id.u', int),
+        ('type', 'Type', str),
+        ('x', 'Pos.x', float),
+        ('y', 'Pos.y', float),
+        ('category', 'Category', str),
+    ]),
+    'rooms': ('Rooms', [
+        ('id', 'Id.i', int),
+        ('uid', 'Id.u', int),
+        ('room_type', 'RoomType', str),
+    ]),
+    'zones': ('Zones', [
+        ('zone', 'Zone', str),
+    ]),
+}
+
+
+def table_columns(table: str) -> List[str]:
+    return ['save', 'row'] + [column for column, _, _ in TABLES[table][1]]
+
+
+def has_pyarrow() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _convert(value: Optional[str], kind):
+    if value is None or kind is str:
+        return value
+    try:
+        return kind(value)
+    except ValueError:
+        try:
+            return kind(float(value))
+        except ValueError:
+            return None
+
+
+# ЗАПИСЬ ЧАСТЕЙ
+
+class _CsvPart:
+    def __init__(self, path: Path, table: str):
+        self._file = open(path, 'w', encoding='utf-8', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(table_columns(table))
+
+    def write(self, columns: Dict[str, list]) -> None:
+        self._writer.writerows(zip(*columns.values()))
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class _ArrowPart:
+    """Parquet (группа строк на пачку) или Arrow IPC (пачка записей на пачку)"""
+
+    ARROW_TYPES = {int: 'int64', float: 'float64', str: 'string'}
+
+    def __init__(self, path: Path, table: str, fmt: str):
+        import pyarrow as pa
+
+        fields = [('save', pa.string()), ('row', pa.int64())]
+        fields += [(column, getattr(pa, self.ARROW_TYPES[kind])())
+                   for column, _, kind in TABLES[table][1]]
+        self._pa = pa
+        self._schema = pa.schema(fields)
+        if fmt == 'parquet':
+            import pyarrow.parquet as pq
+            self._sink = None
+            self._writer = pq.ParquetWriter(str(path), self._schema)
+        else:
+            self._sink = pa.OSFile(str(path), 'wb')
+            self._writer = pa.ipc.new_file(self._sink, self._schema)
+
+    def write(self, columns: Dict[str, list]) -> None:
+        self._writer.write_table(self._pa.Table.from_pydict(columns, schema=self._schema))
+
+    def close(self) -> None:
+        self._writer.close()
+        if self._sink is not None:
+            self._sink.close()
+
+
+class _TableBuffer:
+    """Пачка строк одной таблицы по столбцам; часть файла создаётся при первом сбросе"""
+
+    def __init__(self, table: str, save: str, path: Path, fmt: str, batch_size: int):
+        self.table = table
+        self.save = save
+        self.path = path
+        self.fmt = fmt
+        self.batch_size = batch_size
+        self.fields = TABLES[table][1]
+        self.rows = 0
+        self._part = None
+        self._columns = self._empty()
+
+    def _empty(self) -> Dict[str, list]:
+        return {column: [] for column in table_columns(self.table)}
+
+    def add(self, entry: dict) -> None:
+        columns = self._columns
+        columns['save'].append(self.save)
+        columns['row'].append(self.rows)
+        for column, field, kind in self.fields:
+            columns[column].append(_convert(entry.get(field), kind))
+        self.rows += 1
+        if len(columns['row']) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._columns['row']:
+            return
+        if self._part is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._part = _CsvPart(self.path, self.table) if self.fmt == 'csv' \
+                else _ArrowPart(self.path, self.table, self.fmt)
+        self._part.write(self._columns)
+        self._columns = self._empty()
+
+    def close(self) -> None:
+        self.flush()
+        if self._part is not None:
+            self._part.close()
+
+
+def export_save(path: Path, out_dir: Path, part: str, fmt: str = 'csv',
+                batch_size: int = DEFAULT_BATCH, tables: Optional[List[str]] = None) -> dict:
+    """Выгружает один сейв: части таблиц OUT/<таблица>/<part>.<формат>.
+       Части от прошлой выгрузки удаляются заранее: таблица без строк не
+       оставляет старых данных. Возвращает число строк по таблицам
+    """
+    from pipeline import SavePipeline
+
+    pipeline = SavePipeline()
+    buffers = []
+    for table in tables or list(TABLES):
+        target = Path(out_dir) / table / f"{part}{EXTENSIONS[fmt]}"
+        target.unlink(missing_ok=True)
+        buffer = _TableBuffer(table, part, target, fmt, batch_size)
+        pipeline.on_entry(TABLES[table][0], buffer.add)
+        buffers.append(buffer)
+
+    try:
+        pipeline.run(Path(path))
+    finally:
+        for buffer in buffers:
+            buffer.close()
+    return {buffer.table: buffer.rows for buffer in buffers}
+
+
+def _part_names(paths: List[Path]) -> List[str]:
+    """Имена частей по именам сейвов; одинаковые имена из разных папок нумеруются"""
+    names, seen = [], {}
+    for path in paths:
+        stem = Path(path).stem
+        seen[stem] = seen.get(stem, 0) + 1
+        names.append(stem if seen[stem] == 1 else f"{stem}-{seen[stem]}")
+    return names
+
+
+def export_library(paths: List[Path], out_dir: Path, fmt: str = 'csv',
+                   batch_size: int = DEFAULT_BATCH, workers: Optional[int] = None,
+                   tables: Optional[List[str]] = None) -> dict:
+    """Выгружает сейвы параллельно. Возвращает
+       {'saves': N, 'rows': {таблица: N}, 'errors': [...], 'seconds': ...}
+    """
+    started = time.perf_counter()
+    workers = workers or min(os.cpu_count() or 1, 8)
+    jobs = list(zip(paths, _part_names(paths)))
+    results = []
+
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            futures = [(path, pool.submit(export_save, path, out_dir, part, fmt, batch_size, tables))
+                       for path, part in jobs]
+            for path, future in futures:
+                try:
+                    results.append((path, future.result(), None))
+                except Exception as e:
+                    results.append((path, None, e))
+    else:
+        for path, part in jobs:
+            try:
+                results.append((path, export_save(path, out_dir, part, fmt, batch_size, tables), None))
+            except Exception as e:
+                results.append((path, None, e))
+
+    summary = {'saves': 0, 'rows': {table: 0 for table in tables or TABLES},
+               'errors': [], 'seconds': 0.0}
+    for path, rows, error in results:
+        if error is not None:
+            summary['errors'].append(f"{Path(path).name}: {error}")
+            continue
+        summary['saves'] += 1
+        for table, count in rows.items():
+            summary['rows'][table] += count
+    summary['seconds'] = time.perf_counter() - started
+    return summary
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Гистограмма типов сейва: за один проход считается каждое значение
+Type, RoomType и Zone с разбивкой по секциям верхнего уровня.
+Ключи интернируются в номера ячеек, счётчики лежат в массиве, поэтому
+новым отчётам не нужны отдельные проходы по файлу и ручные списки типов
+"""
+import re
+from array import array
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import profiling
+
+FIELDS = ('Type', 'RoomType', 'Zone')
+
+# Ключ как отдельное слово и его значение (слово или строка в кавычках).
+# Регистр ключа не важен (type Cctv), в счётчики попадает имя из FIELDS
+FIELD_RE = re.compile(rb'(?<!\S)(Type|RoomType|Zone)[ \t]+("[^"\n]*"|\S+)', re.IGNORECASE)
+_FIELD_NAMES = {field.lower().encode('ascii'): field for field in FIELDS}
+
+Key = Tuple[str, str, str]
+
+
+class Histogram:
+    """Счётчики (секция, поле, значение) → число.
+       Значения сравниваются без учёта регистра, как в старых отчётах по регулярным выражениям
+    """
+    __slots__ = ('_slots', '_keys', '_counts', '_lowered')
+
+    def __init__(self):
+        self._slots: Dict[Key, int] = {}
+        self._keys: List[Key] = []
+        self._counts = array('q')
+        self._lowered: Optional[Dict[Tuple[str, str], List[int]]] = None
+
+    def add(self, section: str, field: str, value: str, n: int = 1) -> None:
+        key = (section, field, value)
+        slot = self._slots.get(key)
+        if slot is None:
+            self._slots[key] = len(self._keys)
+            self._keys.append(key)
+            self._counts.append(n)
+            self._lowered = None
+        else:
+            self._counts[slot] += n
+
+    def _add_matches(self, section: str, matches: Iterable[Tuple[bytes, bytes]]) -> None:
+        """Добавляет пары (поле, значение) в байтах; декодируется только новый ключ"""
+        slots = self._slots
+        counts = self._counts
+        raw_slots: Dict[Tuple[bytes, bytes], int] = {}
+        for match in matches:
+            slot = raw_slots.get(match)
+            if slot is None:
+                field, value = match
+                key = (section, _FIELD_NAMES[field.lower()],
+                       value.strip(b'"').decode('utf-8', 'replace'))
+                slot = slots.get(key)
+                if slot is None:
+                    slot = slots[key] = len(self._keys)
+                    self._keys.append(key)
+                    counts.append(0)
+                raw_slots[match] = slot
+            counts[slot] += 1
+        self._lowered = None
+
+    def merge(self, other: 'Histogram') -> None:
+        for key, count in other.items():
+            self.add(*key, n=count)
+
+    def items(self) -> Iterator[Tuple[Key, int]]:
+        return zip(self._keys, self._counts)
+
+    def sections(self) -> List[str]:
+        return list(dict.fromkeys(section for section, _, _ in self._keys))
+
+    def _select(self, field: str, section: Optional[str]) -> Iterator[Tuple[Key, int]]:
+        field = field.lower()
+        section = section.lower() if section else None
+        for key, count in self.items():
+            if key[1].lower() == field and (section is None or key[0].lower() == section):
+                yield key, count
+
+    def count(self, field: str, value: str, section: Optional[str] = None) -> int:
+        """Число вхождений значения поля (во всём сейве или в секции)"""
+        if self._lowered is None:
+            lowered: Dict[Tuple[str, str], List[int]] = {}
+            for slot, (_, key_field, key_value) in enumerate(self._keys):
+                lowered.setdefault((key_field.lower(), key_value.lower()), []).append(slot)
+            self._lowered = lowered
+        slots = self._lowered.get((field.lower(), value.lower()), ())
+        section = section.lower() if section else None
+        return sum(self._counts[slot] for slot in slots
+                   if section is None or self._keys[slot][0].lower() == section)
+
+    def distribution(self, field: str, section: Optional[str] = None) -> Dict[str, int]:
+        """Все значения поля с числом вхождений, от частых к редким"""
+        totals: Dict[str, int] = {}
+        for (_, _, value), count in self._select(field, section):
+            totals[value] = totals.get(value, 0) + count
+        return dict(sorted(totals.items(), key=lambda item: (-item[1], item[0])))
+
+    def total(self, field: str, section: Optional[str] = None,
+              where: Optional[Callable[[str], bool]] = None) -> int:
+        """Сумма по полю; where(value) отбирает значения (например, все двери)"""
+        return sum(count for (_, _, value), count in self._select(field, section)
+                   if where is None or where(value))
+
+    def as_dict(self) -> Dict[str, Dict[str, Dict[str, int]]]:
+        """{секция: {поле: {значение: число}}} — для JSON"""
+        result: Dict[str, Dict[str, Dict[str, int]]] = {}
+        for (section, field, value), count in self.items():
+            result.setdefault(section, {}).setdefault(field, {})[value] = count
+        return result
+
+
+def build_histogram(buf, sections: Dict[str, List[Tuple[int, int]]]) -> Histogram:
+    """Гистограмма по байтам сейва и индексу секций верхнего уровня (save_format.index_sections).
+       Секции не пересекаются, поэтому весь файл просматривается один раз
+    """
+    histogram = Histogram()
+    with profiling.stage('histogram', len(buf)):
+        for name, spans in sections.items():
+            for start, end in spans:
+                histogram._add_matches(name, FIELD_RE.findall(buf, start, end))
+    return histogram
+
+
+def print_histogram(histogram: Histogram, fields: Iterable[str] = FIELDS,
+                    section: Optional[str] = None, top: Optional[int] = None) -> None:
+    from ui import Color
+
+    for field in fields:
+        distribution = histogram.distribution(field, section)
+        if not distribution:
+            continue
+        print(f"\n{Color.BOLD}{Color.BLUE}{field}{f' ({section})' if section else ''}:"
+              f"{Color.END} {sum(distribution.values())}, различных: {len(distribution)}")
+        items = list(distribution.items())
+        for value, count in items[:top] if top else items:
+            print(f"  {value:<32} {count:>8}")
+        if top and len(items) > top:
+            print(f"  … ещё {len(items) - top}")
@@ -4,12 +4,10 @@ Prison Architect Toolkit — главное приложение
 """
 from ui import Color
 from core import PrisonSaveFixer
-from pathlib import Path
-import sys
 import os
-import warnings
-warnings.filterwarnings('ignore', category=UserWarning, module='pkg_resources')
-warnings.filterwarnings('ignore', message='pkg_resources is deprecated')
+import sys
+from pathlib import Path
+from typing import Optional
 
 
 def auto_scan_mode(fixer: PrisonSaveFixer):
@@ -112,8 +110,10 @@ def transfer_mode(fixer: PrisonSaveFixer):
     print(f"\n{Color.BLUE}Папка сохранений игры:{Color.END} {fixer.saves_path}")
     print(f"\n{Color.YELLOW}Введите путь к файлу .prison или папке:{Color.END}")
     print("  • Полный путь к файлу: C:\\Users\\Имя\\Downloads\\101.prison")
+    print("  • Архив:               C:\\Users\\Имя\\Downloads\\prisons.zip")
     print("  • Путь к папке:        C:\\Users\\Имя\\Downloads")
     print("  • Ключевые слова:      Загрузки, Документы")
+    print("  • Маска (все сразу):   C:\\Users\\Имя\\Downloads\\*.prison")
     print(f"\n{Color.YELLOW}Путь (или 0 для отмены):{Color.END}")
 
     try:
@@ -121,6 +121,12 @@ def transfer_mode(fixer: PrisonSaveFixer):
         if user_input == '0':
             return
 
+        if '*' in user_input or '?' in user_input:
+            bulk_transfer(fixer, user_input)
+            input(
+                f"\n{Color.YELLOW}Нажмите Enter для возврата в меню...{Color.END}")
+            return
+
         path = fixer.resolve_transfer_path(user_input)
         if not path:
             print(f"{Color.RED}Путь не найден: {user_input}{Color.END}")
@@ -128,6 +134,19 @@ def transfer_mode(fixer: PrisonSaveFixer):
                 f"\n{Color.YELLOW}Нажмите Enter для возврата в меню...{Color.END}")
             return
 
+        from archive_import import is_archive
+
+        if is_archive(path):
+            fix_choice = input(
+                f"{Color.YELLOW}Исправить зависшие задачи в сейвах из архива на лету? (да/нет): {Color.END}").strip().lower()
+            if fixer.transfer_save(path, fix=fix_choice in ('да', 'д', 'yes', 'y')):
+                print(f"\n{Color.GREEN}Перенос завершён успешно!{Color.END}")
+            else:
+                print(f"\n{Color.RED}Не удалось перенести сейвы из архива{Color.END}")
+            input(
+                f"\n{Color.YELLOW}Нажмите Enter для возврата в меню...{Color.END}")
+            return
+
         if path.is_file() and path.suffix.lower() == '.prison':
             source_file = path
         elif path.is_dir():
@@ -148,9 +167,15 @@ def transfer_mode(fixer: PrisonSaveFixer):
                 print(f"  {idx:2d}. {save.name:<30} [{dt}] ({size_mb:.1f} МБ)")
 
             print(
-                f"\n{Color.YELLOW}Выберите номер сейва (или 0 для отмены):{Color.END}")
+                f"\n{Color.YELLOW}Выберите номер сейва (* — перенести все, 0 для отмены):{Color.END}")
             try:
-                choice = int(input(f"{Color.CYAN}> {Color.END}").strip())
+                answer = input(f"{Color.CYAN}> {Color.END}").strip()
+                if answer == '*':
+                    bulk_transfer(fixer, str(path))
+                    input(
+                        f"\n{Color.YELLOW}Нажмите Enter для возврата в меню...{Color.END}")
+                    return
+                choice = int(answer)
                 if choice == 0:
                     return
                 if 1 <= choice <= len(saves):
@@ -167,7 +192,7 @@ def transfer_mode(fixer: PrisonSaveFixer):
                 return
         else:
             print(
-                f"{Color.RED}Указанный путь не является файлом .prison или папкой{Color.END}")
+                f"{Color.RED}Указанный путь не является файлом .prison, архивом или папкой{Color.END}")
             input(
                 f"\n{Color.YELLOW}Нажмите Enter для повторной попытки...{Color.END}")
             return
@@ -195,6 +220,52 @@ def transfer_mode(fixer: PrisonSaveFixer):
     input(f"\n{Color.YELLOW}Нажмите Enter для возврата в меню...{Color.END}")
 
 
+def bulk_transfer(fixer: PrisonSaveFixer, spec: str):
+    """Перенос всех сейвов из папки или по маске с вопросом об исправлении"""
+    from bulk_import import bulk_import
+
+    fix_choice = input(
+        f"{Color.YELLOW}Сразу исправить зависшие задачи в перенесённых сейвах? (да/нет): {Color.END}").strip().lower()
+    bulk_import(fixer, spec, fix=fix_choice in ('да', 'д', 'yes', 'y'))
+
+
+def pipeline_mode(fixer: PrisonSaveFixer):
+    """Все анализы плагинов за один проход по выбранному сейву"""
+    from pipeline import run_pipeline
+
+    plugins = [p for p in fixer.plugins if p.supports_pipeline]
+    saves = fixer.find_save_files()
+    if not saves:
+        print(f"{Color.RED}В папке не найдено ни одного файла .prison{Color.END}\n")
+        return
+
+    print(f"\n{Color.GREEN}Найдено {len(saves)} сейвов:{Color.END}\n")
+    for idx, save in enumerate(saves, 1):
+        print(f"  {idx:2d}. {save.name}")
+
+    print(f"\n{Color.YELLOW}Введите номер сейва для анализа (или 0 для возврата в меню):{Color.END}")
+    try:
+        choice = int(input(f"{Color.CYAN}> {Color.END}").strip())
+        if choice == 0:
+            return
+        if not 1 <= choice <= len(saves):
+            print(f"{Color.RED}Неверный номер сейва.{Color.END}\n")
+        else:
+            target = saves[choice - 1]
+            print(f"\n{Color.BLUE}Анализов за один проход:{Color.END} {len(plugins)}")
+            results = run_pipeline(target, plugins)
+            for plugin in plugins:
+                if plugin.menu_text in results:
+                    plugin.show_result(target, results[plugin.menu_text])
+    except ValueError:
+        print(f"{Color.RED}Пожалуйста, введите число.{Color.END}\n")
+    except KeyboardInterrupt:
+        print("\n\nПрервано пользователем.")
+        return
+
+    input(f"\n{Color.YELLOW}Нажмите Enter для возврата в меню...{Color.END}")
+
+
 def show_menu(fixer: PrisonSaveFixer):
     """Главное меню с поддержкой плагинов"""
     print(
@@ -220,7 +291,11 @@ def show_menu(fixer: PrisonSaveFixer):
     # Добавление плагинов
     for idx, plugin in enumerate(fixer.plugins, start=len(options) + 1):
         options.append((str(idx), plugin.menu_text, lambda f=fixer,
-                       p=plugin: p.execute(f.saves_path)))
+                       p=plugin: p.run(f.context)))
+
+    if any(plugin.supports_pipeline for plugin in fixer.plugins):
+        options.append((str(len(options) + 1),
+                       "Все анализы за один проход по сейву", pipeline_mode))
 
     options.append(("0", "Выход", None))
 
@@ -258,8 +333,676 @@ def show_menu(fixer: PrisonSaveFixer):
     return False
 
 
+def parse_args(argv):
+    """Разбор аргументов командной строки (без аргументов — интерактивное меню)"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Prison Architect Save Editor")
+    parser.add_argument('--profile', action='store_true',
+                        help="показать время, объём и скорость по этапам (или PRISON_PROFILE=1)")
+    parser.add_argument('--profile-out', metavar='FILE',
+                        help="сохранить профиль cProfile в файл .pstats")
+    parser.add_argument('--metrics-jsonl', metavar='FILE',
+                        help="дописывать метрики операций в JSON lines (или PRISON_METRICS_JSONL)")
+    parser.add_argument('--metrics-prom', metavar='FILE',
+                        help="textfile для node_exporter, например prison.prom (или PRISON_METRICS_PROM)")
+
+    commands = parser.add_subparsers(dest='command')
+    fix = commands.add_parser('fix', help="исправить блок Construction в сейвах")
+    fix.add_argument('files', nargs='+',
+                     help="имена сейвов в папке игры или пути к файлам")
+    fix.add_argument('--dry-run', action='store_true',
+                     help="не изменять сейвы, а показать, сколько байт и задач уйдёт и сколько займёт запись")
+    fix.add_argument('--write-speed', metavar='SIZE',
+                     help="скорость записи диска в секунду для --dry-run (200M, 1G); "
+                          "без неё берутся замеры прошлых исправлений")
+    transfer = commands.add_parser(
+        'import', help="перенести все сейвы из папки или по маске в папку игры")
+    transfer.add_argument('sources', nargs='+',
+                          help="папки, файлы .prison, архивы (.zip, .tar*, .7z) или маски")
+    transfer.add_argument('--fix', action='store_true',
+                          help="сразу исправить блок Construction в перенесённых сейвах")
+    transfer.add_argument('--workers', type=int, default=4,
+                          help="число потоков копирования (по умолчанию 4)")
+    analyze = commands.add_parser(
+        'analyze', help="анализ сейвов всеми плагинами за один проход")
+    analyze.add_argument('files', nargs='+',
+                         help="имена сейвов в папке игры или пути к файлам")
+    histogram = commands.add_parser(
+        'histogram', help="распределение всех Type, RoomType и Zone в сейвах")
+    histogram.add_argument('files', nargs='+',
+                           help="имена сейвов в папке игры или пути к файлам")
+    histogram.add_argument('--field', action='append', choices=('Type', 'RoomType', 'Zone'),
+                           help="показать только это поле (можно несколько раз)")
+    histogram.add_argument('--section', help="только секция верхнего уровня, например Objects")
+    histogram.add_argument('--top', type=int, help="показать N самых частых значений")
+    histogram.add_argument('--json', action='store_true',
+                           help="вывести полную гистограмму в JSON")
+    roster = commands.add_parser(
+        'roster', help="заключённые и персонал: сводка или выборка по категории и типу")
+    roster.add_argument('file', help="имя сейва в папке игры или путь к файлу")
+    roster.add_argument('--category', help="категория заключённых: MinSec, Normal, MaxSec, SuperMax…")
+    roster.add_argument('--type', help="тип объекта: Prisoner, Guard, Doctor…")
+    roster.add_argument('--id', type=int, help="один человек по Id")
+    roster.add_argument('--json', action='store_true', help="вывести выборку в JSON")
+    routes = commands.add_parser(
+        'routes', help="граф комнат и кратчайший путь побега в обход камер и охраны")
+    routes.add_argument('file', help="имя сейва в папке игры или путь к файлу")
+    routes.add_argument('--camera-radius', type=float, default=6,
+                        help="радиус обзора камеры в клетках (по умолчанию 6)")
+    routes.add_argument('--guard-radius', type=float, default=4,
+                        help="радиус обзора охранника в клетках (по умолчанию 4)")
+    routes.add_argument('--json', action='store_true', help="вывести результат в JSON")
+    check = commands.add_parser(
+        'check', help="проверить очередь задач строительства, не изменяя сейвы")
+    check.add_argument('files', nargs='*',
+                       help="имена сейвов в папке игры или пути (по умолчанию все сейвы)")
+    check.add_argument('--json', action='store_true', help="вывести отчёты в JSON")
+    check.add_argument('--fix', action='store_true',
+                       help="сразу исправить сейвы, для которых рекомендуется исправление")
+    trend = commands.add_parser(
+        'trend', help="временной ряд показателей по серии сейвов (автосохранения)")
+    trend.add_argument('files', nargs='*',
+                       help="сейвы, папки или маски (по умолчанию все сейвы в папке игры)")
+    trend.add_argument('--format', choices=('csv', 'json'), default='csv',
+                       help="формат вывода (по умолчанию csv)")
+    trend.add_argument('--output', '-o', metavar='FILE',
+                       help="записать ряд в файл вместо вывода на экран")
+    trend.add_argument('--workers', type=int,
+                       help="число процессов разбора (по умолчанию по числу ядер, не больше 8)")
+    library = commands.add_parser(
+        'library', help="поиск по индексу библиотеки сейвов (индекс обновляется по mtime)")
+    library.add_argument('filters', nargs='*',
+                         help="условия: Prisoner>500, room:DeathRow>=1, zone:StaffOnly>0, size<50000000")
+    library.add_argument('--sort', metavar='KEY',
+                         help="столбец или тип для сортировки, '-' в начале — по убыванию (--sort=-Prisoner)")
+    library.add_argument('--limit', type=int, help="показать не больше N сейвов")
+    library.add_argument('--rebuild', action='store_true',
+                         help="пересобрать индекс с нуля")
+    library.add_argument('--no-refresh', action='store_true',
+                         help="искать по индексу как есть, без проверки файлов")
+    library.add_argument('--index', metavar='FILE', help="путь к файлу индекса SQLite")
+    extract = commands.add_parser(
+        'extract', help="выгрузить секцию сейва как есть (без декодирования) в файл или stdout")
+    extract.add_argument('file', help="имя сейва в папке игры или путь к файлу")
+    extract.add_argument('section', nargs='?',
+                         help="секция: Objects, Rooms или вложенная Construction/Jobs")
+    extract.add_argument('--output', '-o', metavar='FILE',
+                         help="записать секцию в файл вместо stdout")
+    extract.add_argument('--list', action='store_true',
+                         help="показать секции (верхнего уровня или внутри указанной) и их размеры")
+    merge = commands.add_parser(
+        'merge', help="собрать новый сейв: основной сейв с секциями из другого")
+    merge.add_argument('base', help="основной сейв (имя в папке игры или путь)")
+    merge.add_argument('donor', help="сейв, из которого берутся секции")
+    merge.add_argument('--take', action='append', required=True, metavar='SECTION',
+                       help="секция донора: Objects, Construction/Jobs (можно несколько раз)")
+    merge.add_argument('--output', '-o', required=True, metavar='FILE',
+                       help="новый сейв (имя в папке игры или путь)")
+    merge.add_argument('--force', action='store_true',
+                       help="разрешить сейвы с разным размером карты")
+    export = commands.add_parser(
+        'export', help="выгрузить Objects, Rooms и Zones в CSV, Parquet или Arrow для аналитики")
+    export.add_argument('files', nargs='*',
+                        help="сейвы, папки или маски (по умолчанию все сейвы в папке игры)")
+    export.add_argument('--output', '-o', required=True, metavar='DIR',
+                        help="папка набора: DIR/objects, DIR/rooms, DIR/zones")
+    export.add_argument('--format', choices=('csv', 'parquet', 'arrow'), default='csv',
+                        help="формат частей (parquet и arrow требуют pyarrow)")
+    export.add_argument('--tables', default='objects,rooms,zones',
+                        help="таблицы через запятую (по умолчанию objects,rooms,zones)")
+    export.add_argument('--batch-size', type=int, default=50_000,
+                        help="строк в пачке: столько держится в памяти на таблицу (по умолчанию 50000)")
+    export.add_argument('--workers', type=int,
+                        help="число процессов (по умолчанию по числу ядер, не больше 8)")
+    batch = commands.add_parser(
+        'batch', help="пакетное исправление или анализ в нескольких процессах с бюджетом памяти")
+    batch.add_argument('operation', choices=('fix', 'analyze'))
+    batch.add_argument('files', nargs='*',
+                       help="сейвы, папки или маски (по умолчанию все сейвы в папке игры)")
+    batch.add_argument('--memory', metavar='SIZE',
+                       help="бюджет памяти на все процессы: 512M, 4G (по умолчанию половина ОЗУ)")
+    batch.add_argument('--cores', type=int, help="число процессов (по умолчанию по числу ядер)")
+    batch.add_argument('--order', choices=('largest', 'sjf', 'fifo'), default='largest',
+                       help="largest — сначала крупные (меньше общее время), "
+                            "sjf — сначала мелкие, fifo — как переданы")
+    batch.add_argument('--engine', choices=('auto', 'memory', 'stream'), default='auto',
+                       help="исправление в памяти или построчное; auto — построчное, "
+                            "если сейв не помещается в бюджет")
+    serve = commands.add_parser(
+        'serve', help="локальный HTTP-сервис: очередь заданий fix / analyze / transfer")
+    serve.add_argument('--host', default='127.0.0.1', help="адрес (по умолчанию 127.0.0.1)")
+    serve.add_argument('--port', type=int, default=8765, help="порт (по умолчанию 8765)")
+    serve.add_argument('--workers', type=int, default=4,
+                       help="число рабочих потоков (по умолчанию 4)")
+    serve.add_argument('--queue', type=int, default=32,
+                       help="размер очереди; сверх неё запросы получают 503 (по умолчанию 32)")
+    serve.add_argument('--upload-dir', action='append', default=[], metavar='DIR',
+                       help="папка загрузок, из которой разрешён transfer "
+                            "(можно несколько раз); остальные пути вне папки сохранений отклоняются")
+    return parser.parse_args(argv)
+
+
+def fix_command(fixer: PrisonSaveFixer, args) -> int:
+    """Пакетное исправление: без вопросов, код выхода 1 при любой ошибке"""
+    if args.dry_run:
+        return fix_plan_command(fixer, args)
+
+    failed = 0
+    for name in args.files:
+        filepath = fixer.resolve_filepath(name)
+        if not filepath:
+            print(f"{Color.RED}✗ Файл не найден:{Color.END} {name}")
+            failed += 1
+            continue
+        if not fixer.fix_construction_block(filepath):
+            failed += 1
+    return 1 if failed else 0
+
+
+def fix_plan_command(fixer: PrisonSaveFixer, args) -> int:
+    """fix --dry-run: план исправления по каждому сейву и итог для всей пачки"""
+    from construction_health import plan_fix, print_plan
+    from scheduler import parse_size
+
+    try:
+        write_speed = parse_size(args.write_speed) if args.write_speed else None
+    except ValueError as e:
+        print(f"{Color.RED}✗ {e}{Color.END}", file=sys.stderr)
+        return 1
+
+    failed = 0
+    plans = []
+    for name in args.files:
+        filepath = fixer.resolve_filepath(name)
+        if not filepath:
+            print(f"{Color.RED}✗ Файл не найден:{Color.END} {name}")
+            failed += 1
+            continue
+        try:
+            plan = plan_fix(filepath, write_speed)
+        except OSError as e:
+            print(f"{Color.RED}✗ Ошибка чтения {filepath.name}: {e}{Color.END}")
+            failed += 1
+            continue
+        print_plan(filepath, plan)
+        if plan is None:
+            failed += 1
+        else:
+            plans.append(plan)
+
+    if len(plans) > 1:
+        megabyte = 1024 * 1024
+        print(f"\n{Color.BOLD}Итого сейвов: {len(plans)}{Color.END}")
+        print(f"  • Удаляемые задачи: {sum(p['jobs_dropped'] for p in plans)}")
+        print(f"  • Освобождается: {sum(p['bytes_removed'] for p in plans) / megabyte:.2f} МБ")
+        written = sum(p['bytes_written'] for p in plans) / megabyte
+        if all(p['write_seconds'] is not None for p in plans):
+            print(f"  • Запись: {written:.1f} МБ, ≈{sum(p['write_seconds'] for p in plans):.1f} с")
+        else:
+            print(f"  • Запись: {written:.1f} МБ, время не оценить (нет замеров записи)")
+    return 1 if failed else 0
+
+
+def analyze_command(fixer: PrisonSaveFixer, args) -> int:
+    """Пакетный анализ всеми плагинами, поддерживающими конвейер"""
+    from pipeline import run_pipeline
+
+    fixer.load_plugins()
+    plugins = [p for p in fixer.plugins if p.supports_pipeline]
+    if not plugins:
+        print(f"{Color.RED}Нет плагинов с поддержкой конвейера{Color.END}")
+        return 1
+
+    failed = 0
+    for name in args.files:
+        filepath = fixer.resolve_filepath(name)
+        if not filepath:
+            print(f"{Color.RED}✗ Файл не найден:{Color.END} {name}")
+            failed += 1
+            continue
+        try:
+            results = run_pipeline(filepath, plugins)
+        except Exception as e:
+            print(f"{Color.RED}✗ Ошибка анализа {filepath.name}: {e}{Color.END}")
+            failed += 1
+            continue
+        for plugin in plugins:
+            if plugin.menu_text in results:
+                plugin.show_result(filepath, results[plugin.menu_text])
+    return 1 if failed else 0
+
+
+def import_command(fixer: PrisonSaveFixer, args) -> int:
+    """Пакетный перенос без вопросов"""
+    from bulk_import import bulk_import
+
+    failed = 0
+    for spec in args.sources:
+        summary = bulk_import(fixer, spec, fix=args.fix, workers=args.workers)
+        if summary is None or summary['failed'] or summary['screenshots_failed']:
+            failed += 1
+    return 1 if failed else 0
+
+
+def histogram_command(fixer: PrisonSaveFixer, args) -> int:
+    """Гистограмма типов по каждому сейву: таблицей или в JSON"""
+    from histogram import FIELDS, print_histogram
+
+    failed = 0
+    result = {}
+    for name in args.files:
+        filepath = fixer.resolve_filepath(name)
+        if not filepath:
+            print(f"{Color.RED}✗ Файл не найден:{Color.END} {name}", file=sys.stderr)
+            failed += 1
+            continue
+        histogram = fixer.context.document(filepath).histogram
+        if args.json:
+            result[str(filepath)] = {
+                section: fields for section, fields in histogram.as_dict().items()
+                if not args.section or section.lower() == args.section.lower()}
+            continue
+        print(f"\n{Color.CYAN}Гистограмма типов: {filepath.name}{Color.END}")
+        print_histogram(histogram, args.field or FIELDS, args.section, args.top)
+
+    if args.json:
+        import json
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 1 if failed else 0
+
+
+def roster_command(fixer: PrisonSaveFixer, args) -> int:
+    """Список людей: без условий — сводка, с условиями — выборка по индексам"""
+    filepath = fixer.resolve_filepath(args.file)
+    if not filepath:
+        print(f"{Color.RED}✗ Файл не найден:{Color.END} {args.file}", file=sys.stderr)
+        return 1
+    roster = fixer.context.document(filepath).roster
+
+    if args.id is not None:
+        people = [roster.get(args.id)] if roster.get(args.id) else []
+    elif args.category or args.type:
+        people = list(roster.select(category=args.category, type=args.type))
+    else:
+        people = None
+
+    if args.json:
+        import json
+        print(json.dumps(people if people is not None else roster.summary(),
+                         ensure_ascii=False, indent=2))
+        return 0
+
+    if people is None:
+        summary = roster.summary()
+        print(f"\n{Color.CYAN}Люди: {filepath.name}{Color.END}")
+        print(f"  • Заключённые: {sum(summary['prisoners'].values())} — " + ", ".join(
+            f"{name} {count}" for name, count in sorted(summary['prisoners'].items())))
+        print(f"  • Персонал: {sum(summary['staff'].values())} — " + ", ".join(
+            f"{name} {count}" for name, count in sorted(summary['staff'].items(), key=lambda i: -i[1])))
+        return 0
+
+    for person in people:
+        print(f"  {person['id']:>8}  {person['type']:<14} {person['category']:<10} "
+              f"({person['x']:.1f}, {person['y']:.1f})")
+    print(f"{Color.BLUE}Найдено:{Color.END} {len(people)}")
+    return 0
+
+
+def routes_command(fixer: PrisonSaveFixer, args) -> int:
+    """Связность комнат и путь побега. Код выхода 2 — путь побега найден"""
+    from room_graph import analyze_routes
+
+    filepath = fixer.resolve_filepath(args.file)
+    if not filepath:
+        print(f"{Color.RED}✗ Файл не найден:{Color.END} {args.file}", file=sys.stderr)
+        return 1
+    result = analyze_routes(fixer.context.document(filepath), args.camera_radius, args.guard_radius)
+    if result is None:
+        print(f"{Color.RED}✗ В заголовке сейва нет размера карты (NumCellsX/NumCellsY){Color.END}",
+              file=sys.stderr)
+        return 1
+
+    for key in ('grid', 'graph', 'coverage'):
+        del result[key]
+    if args.json:
+        import json
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return 2 if result['escape'] else 0
+
+    print(f"\n{Color.CYAN}Маршруты: {filepath.name}{Color.END} ({result['width']}×{result['height']})")
+    print(f"  • Комнат: {result['rooms']}, связей между ними: {result['connections']}, "
+          f"клеток с дверями: {result['door_cells']}")
+    print(f"  • Под наблюдением: {result['covered_share'] * 100:.1f}% карты")
+    if result['rooms_to_outside'] is not None and result['rooms_to_outside'] >= 0:
+        print(f"  • От камер до улицы: {result['rooms_to_outside']} переход(а) между комнатами")
+    if not result['cell_rooms']:
+        print(f"  {Color.YELLOW}Камер заключённых нет — путь побега не ищется{Color.END}")
+        return 0
+    if not result['escape']:
+        print(f"  {Color.GREEN}✓ Незамеченного пути из камер за пределы карты нет{Color.END}")
+        return 0
+
+    (x0, y0), (x1, y1) = result['path'][0], result['path'][-1]
+    print(f"  {Color.RED}⚠ Путь побега: {len(result['path']) - 1} клеток "
+          f"от ({x0}, {y0}) до края карты ({x1}, {y1}){Color.END}")
+    print(f"    {' → '.join(result['route_rooms'])}")
+    return 2
+
+
+def check_command(fixer: PrisonSaveFixer, args) -> int:
+    """Диагностика очереди строительства. Код выхода: 0 — всё в норме,
+       2 — есть сейвы, которым нужно исправление (без --fix), 1 — ошибки
+    """
+    from construction_health import check_construction, print_report
+
+    paths = []
+    for name in args.files:
+        filepath = fixer.resolve_filepath(name)
+        if not filepath:
+            print(f"{Color.RED}✗ Файл не найден:{Color.END} {name}", file=sys.stderr)
+            return 1
+        paths.append(filepath)
+    if not args.files:
+        paths = fixer.find_save_files()
+
+    reports = {}
+    failed = needs_fix = 0
+    for filepath in paths:
+        try:
+            report = check_construction(filepath)
+        except OSError as e:
+            print(f"{Color.RED}✗ Ошибка чтения {filepath.name}: {e}{Color.END}", file=sys.stderr)
+            failed += 1
+            continue
+        reports[str(filepath)] = report
+        if not args.json:
+            print_report(filepath, report)
+        if report and report['verdict'] == 'fix':
+            if args.fix:
+                if not fixer.fix_construction_block(filepath):
+                    failed += 1
+            else:
+                needs_fix += 1
+
+    if args.json:
+        import json
+        print(json.dumps(reports, ensure_ascii=False, indent=2))
+    if failed:
+        return 1
+    return 2 if needs_fix else 0
+
+
+def collect_save_paths(fixer: PrisonSaveFixer, specs) -> Optional[list]:
+    """Сейвы по именам, путям, папкам и маскам; без specs — все сейвы в папке игры.
+       None — какой-то файл не найден или сейвов нет (сообщение уже напечатано)
+    """
+    import glob
+
+    paths = []
+    for spec in specs:
+        if glob.has_magic(spec):
+            paths += [Path(p) for p in sorted(glob.glob(spec)) if p.lower().endswith('.prison')]
+        elif Path(spec).is_dir():
+            paths += sorted(Path(spec).glob("*.prison"))
+        else:
+            filepath = fixer.resolve_filepath(spec)
+            if not filepath:
+                print(f"{Color.RED}✗ Файл не найден:{Color.END} {spec}", file=sys.stderr)
+                return None
+            paths.append(filepath)
+    if not specs:
+        paths = fixer.find_save_files()
+    if not paths:
+        print(f"{Color.RED}✗ Нет сейвов для анализа{Color.END}", file=sys.stderr)
+        return None
+    return paths
+
+
+def trend_command(fixer: PrisonSaveFixer, args) -> int:
+    """Тренды по серии сейвов: CSV или JSON в stdout или файл"""
+    from trend import collect_trend, write_trend
+
+    paths = collect_save_paths(fixer, args.files)
+    if paths is None:
+        return 1
+
+    result = collect_trend(paths, args.workers)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8', newline='') as out:
+            write_trend(result['rows'], out, args.format)
+    else:
+        write_trend(result['rows'], sys.stdout, args.format)
+
+    print(f"{Color.BLUE}Сейвов в ряду:{Color.END} {len(result['rows'])} "
+          f"(из кэша {result['cached']}, разобрано {result['computed']}) "
+          f"за {result['seconds']:.2f} с", file=sys.stderr)
+    rows = result['rows']
+    if len(rows) > 1:
+        first = rows[0]['jobs'] + rows[0]['planning_jobs']
+        last = rows[-1]['jobs'] + rows[-1]['planning_jobs']
+        color = Color.RED if last > first else Color.GREEN
+        print(f"{color}Задачи строительства:{Color.END} {first} → {last} "
+              f"({last - first:+d})", file=sys.stderr)
+    for error in result['errors']:
+        print(f"  {Color.RED}✗ {error}{Color.END}", file=sys.stderr)
+    return 1 if result['errors'] else 0
+
+
+def library_command(fixer: PrisonSaveFixer, args) -> int:
+    """Обновление индекса библиотеки и поиск по нему"""
+    import time
+    from save_index import SaveIndex, print_refresh, print_table
+
+    with SaveIndex(args.index) as index:
+        if args.rebuild:
+            index.clear()
+        if not args.no_refresh:
+            print_refresh(index.refresh(fixer.find_save_files()))
+        started = time.perf_counter()
+        try:
+            headers, rows = index.query(args.filters, args.sort, args.limit)
+        except ValueError as e:
+            print(f"{Color.RED}✗ {e}{Color.END}")
+            return 1
+        print_table(headers, rows, time.perf_counter() - started)
+    return 0
+
+
+def extract_command(fixer: PrisonSaveFixer, args) -> int:
+    """Секция сейва байт в байт: в stdout или файл; сообщения — в stderr"""
+    from sections import extract_section, list_sections, mapped
+
+    filepath = fixer.resolve_filepath(args.file)
+    if not filepath:
+        print(f"{Color.RED}✗ Файл не найден:{Color.END} {args.file}", file=sys.stderr)
+        return 1
+
+    if args.list or not args.section:
+        with mapped(filepath) as buf:
+            sections = list_sections(buf, args.section)
+        if not sections:
+            print(f"{Color.RED}✗ Секции не найдены{Color.END}", file=sys.stderr)
+            return 1
+        for name, spans in sections.items():
+            size = sum(end - start for start, end in spans)
+            count = f" ×{len(spans)}" if len(spans) > 1 else ""
+            print(f"  {name:<24} {size / 1024:>10.1f} КБ{count}")
+        return 0
+
+    try:
+        if args.output:
+            with open(args.output, 'wb') as out:
+                written = extract_section(filepath, args.section, out)
+        else:
+            written = extract_section(filepath, args.section, sys.stdout.buffer)
+            sys.stdout.buffer.flush()
+    except BrokenPipeError:
+        # Вывод оборвали (например, | head) — это не ошибка
+        sys.stderr.close()
+        return 0
+
+    if written is None:
+        print(f"{Color.RED}✗ Секция не найдена:{Color.END} {args.section} "
+              f"(список: main.py extract {args.file} --list)", file=sys.stderr)
+        if args.output:
+            Path(args.output).unlink()
+        return 1
+    print(f"{Color.GREEN}✓ {args.section}:{Color.END} {written} байт", file=sys.stderr)
+    return 0
+
+
+def merge_command(fixer: PrisonSaveFixer, args) -> int:
+    """Пересадка секций: новый сейв из байтовых диапазонов двух исходных"""
+    from sections import merge_saves
+
+    sources = []
+    for name in (args.base, args.donor):
+        filepath = fixer.resolve_filepath(name)
+        if not filepath:
+            print(f"{Color.RED}✗ Файл не найден:{Color.END} {name}")
+            return 1
+        sources.append(filepath)
+
+    output = Path(args.output)
+    if not output.is_absolute() and output.parent == Path('.') and fixer.saves_path:
+        output = fixer.saves_path / fixer.normalize_filename(args.output)
+    if output.exists():
+        print(f"{Color.RED}✗ Файл уже существует:{Color.END} {output}")
+        return 1
+
+    try:
+        summary = merge_saves(sources[0], sources[1], args.take, output, args.force)
+    except (ValueError, OSError) as e:
+        print(f"{Color.RED}✗ {e}{Color.END}")
+        return 1
+
+    megabyte = 1024 * 1024
+    print(f"{Color.GREEN}✓ Новый сейв:{Color.END} {output}")
+    print(f"  • Из {sources[0].name}: {summary['base_bytes'] / megabyte:.2f} МБ")
+    print(f"  • Из {sources[1].name} ({', '.join(args.take)}): "
+          f"{summary['donor_bytes'] / megabyte:.2f} МБ")
+    print(f"  • Копирование: {'copy_file_range' if summary['kernel_copy'] else 'буферами'}")
+    fixer.context.invalidate()
+    return 0
+
+
+def export_command(fixer: PrisonSaveFixer, args) -> int:
+    """Колоночная выгрузка библиотеки сейвов"""
+    from export import TABLES, export_library, has_pyarrow
+
+    tables = [table.strip().lower() for table in args.tables.split(',') if table.strip()]
+    unknown = [table for table in tables if table not in TABLES]
+    if unknown or not tables:
+        print(f"{Color.RED}✗ Неизвестные таблицы:{Color.END} {', '.join(unknown)} "
+              f"(есть: {', '.join(TABLES)})")
+        return 1
+    if args.format != 'csv' and not has_pyarrow():
+        print(f"{Color.RED}✗ Для {args.format} нужен pyarrow:{Color.END} pip install pyarrow")
+        return 1
+    paths = collect_save_paths(fixer, args.files)
+    if paths is None:
+        return 1
+
+    summary = export_library(paths, Path(args.output), args.format,
+                             max(1, args.batch_size), args.workers, tables)
+    print(f"{Color.GREEN}✓ Выгружено сейвов:{Color.END} {summary['saves']} "
+          f"за {summary['seconds']:.2f} с → {args.output}")
+    for table, rows in summary['rows'].items():
+        print(f"  • {table}: {rows} строк")
+    for error in summary['errors']:
+        print(f"  {Color.RED}✗ {error}{Color.END}")
+    return 1 if summary['errors'] else 0
+
+
+def batch_command(fixer: PrisonSaveFixer, args) -> int:
+    """Пакетная обработка в нескольких процессах с бюджетом памяти"""
+    from scheduler import (default_memory_budget, parse_size, plan_tasks,
+                           print_plan, print_summary, run_batch)
+
+    try:
+        budget = parse_size(args.memory) if args.memory else default_memory_budget()
+    except ValueError as e:
+        print(f"{Color.RED}✗ {e}{Color.END}", file=sys.stderr)
+        return 1
+    paths = collect_save_paths(fixer, args.files)
+    if paths is None:
+        return 1
+
+    plugins = {}
+    if args.operation == 'analyze':
+        fixer.load_plugins()
+        plugins = {p.menu_text: p for p in fixer.plugins if p.supports_pipeline}
+        if not plugins:
+            print(f"{Color.RED}Нет плагинов с поддержкой конвейера{Color.END}")
+            return 1
+
+    cores = args.cores or os.cpu_count() or 1
+    tasks = plan_tasks(paths, args.operation, args.engine, budget, args.order)
+    print_plan(tasks, budget, cores)
+
+    def on_done(task, outcome):
+        mark = f"{Color.GREEN}✓{Color.END}" if outcome['ok'] else f"{Color.RED}✗{Color.END}"
+        print(f"{mark} {task.path.name} ({task.size / 1024 / 1024:.1f} МБ, {task.engine}, "
+              f"{outcome['seconds']:.2f} с)")
+        if not outcome['ok']:
+            print(outcome['output'].rstrip())
+        for name, result in (outcome['result'] or {}).items():
+            if name in plugins:
+                plugins[name].show_result(task.path, result)
+
+    summary = run_batch(tasks, args.operation, budget, cores, on_done)
+    fixer.context.invalidate()
+    print_summary(summary)
+    return 1 if summary['failed'] else 0
+
+
+def serve_command(fixer: PrisonSaveFixer, args) -> int:
+    """Долгоживущий сервис: плагины и кэши сейвов остаются в памяти между запросами"""
+    from service import serve
+
+    try:
+        serve(fixer, args.host, args.port, args.workers, args.queue,
+              [Path(folder) for folder in args.upload_dir])
+    except OSError as e:
+        print(f"{Color.RED}✗ Не удалось запустить сервис: {e}{Color.END}", file=sys.stderr)
+        return 1
+    return 0
+
+
+COMMANDS = {
+    'fix': fix_command,
+    'import': import_command,
+    'analyze': analyze_command,
+    'histogram': histogram_command,
+    'roster': roster_command,
+    'routes': routes_command,
+    'check': check_command,
+    'trend': trend_command,
+    'library': library_command,
+    'extract': extract_command,
+    'merge': merge_command,
+    'export': export_command,
+    'batch': batch_command,
+    'serve': serve_command,
+}
+
+
 def main():
     """Точка входа в программу"""
+    import profiling
+
+    if getattr(sys, 'frozen', False):
+        # Дочерние процессы пула (trend) в собранном .exe стартуют через main:
+        # их нужно перехватить до разбора аргументов
+        import multiprocessing
+        multiprocessing.freeze_support()
+
+    args = parse_args(sys.argv[1:]) if len(sys.argv) > 1 else None
+    if profiling.is_enabled() or (args and (args.profile or args.profile_out)):
+        profiling.enable(args.profile_out if args else None)
+
     if sys.platform == 'win32':
         try:
             import ctypes
@@ -268,12 +1011,35 @@ def main():
         except:
             pass
 
+    if getattr(sys, 'frozen', False):
+        # Предупреждения pkg_resources возникают только в собранном .exe
+        import warnings
+        warnings.filterwarnings(
+            'ignore', category=UserWarning, module='pkg_resources')
+        warnings.filterwarnings(
+            'ignore', message='pkg_resources is deprecated')
+
+    # Без флагов приёмник всё равно может быть задан переменными окружения
+    import metrics
+    metrics.configure(args.metrics_jsonl if args else None,
+                      args.metrics_prom if args else None)
+
     fixer = PrisonSaveFixer()
+
+    if args and args.command:
+        try:
+            sys.exit(COMMANDS[args.command](fixer, args))
+        finally:
+            profiling.report()
+
     fixer.load_plugins()
 
-    while True:
-        if show_menu(fixer):
-            break
+    try:
+        while True:
+            if show_menu(fixer):
+                break
+    finally:
+        profiling.report()
 
     print("\nДо свидания!")
 
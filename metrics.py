@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""
+Экспорт метрик операций для мониторинга пакетных запусков.
+Каждая операция (исправление, анализ, перенос) записывается строкой JSON
+в журнал и, при необходимости, сводится в textfile для node_exporter (Prometheus).
+Включается --metrics-jsonl / --metrics-prom или переменными окружения
+PRISON_METRICS_JSONL / PRISON_METRICS_PROM
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import profiling
+
+PROM_PREFIX = 'prison_toolkit'
+
+
+def _label(value: str) -> str:
+    """Значение метки в формате экспозиции Prometheus: \\, " и перевод строки экранируются"""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsSink:
+    """Приёмник метрик: журнал JSON lines и/или textfile Prometheus"""
+
+    def __init__(self, jsonl_path: Optional[Path] = None, prom_path: Optional[Path] = None):
+        self.jsonl_path = Path(jsonl_path) if jsonl_path else None
+        self.prom_path = Path(prom_path) if prom_path else None
+        self._lock = threading.Lock()
+        # (операция, результат) → число; операция → [секунд, байт]
+        self._operations: Dict[Tuple[str, str], int] = {}
+        self._totals: Dict[str, list] = {}
+        self._stages: Dict[str, list] = {}
+        self._save_metrics: Dict[Tuple[str, str], float] = {}
+
+    def record(self, operation: str, file: Optional[Path], result: str,
+               seconds: float, size: int = 0, stages: Optional[dict] = None,
+               metrics: Optional[dict] = None) -> dict:
+        """Записывает одну операцию; возвращает записанную запись"""
+        entry = {
+            'ts': round(time.time(), 3),
+            'operation': operation,
+            'file': str(file) if file else None,
+            'size': size,
+            'result': result,
+            'seconds': round(seconds, 6),
+            'stages': stages or {},
+        }
+        if metrics:
+            entry['metrics'] = metrics
+
+        with self._lock:
+            if self.jsonl_path:
+                self.jsonl_path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.jsonl_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+            key = (operation, result)
+            self._operations[key] = self._operations.get(key, 0) + 1
+            totals = self._totals.setdefault(operation, [0.0, 0])
+            totals[0] += seconds
+            totals[1] += size
+            for name, stage in (stages or {}).items():
+                stage_totals = self._stages.setdefault(name, [0.0, 0])
+                stage_totals[0] += stage['seconds']
+                stage_totals[1] += stage['bytes']
+            if file and metrics:
+                # Полный путь: одноимённые сейвы из разных папок не затирают друг друга
+                save = str(Path(file).resolve())
+                for name, value in metrics.items():
+                    if isinstance(value, (int, float)) and not isinstance(value, bool):
+                        self._save_metrics[(save, name)] = value
+
+            if self.prom_path:
+                self._write_prom()
+
+        return entry
+
+    def _write_prom(self) -> None:
+        """Перезаписывает textfile целиком (атомарно через временный файл)"""
+        lines = [
+            f"# HELP {PROM_PREFIX}_operations_total Operations by type and result.",
+            f"# TYPE {PROM_PREFIX}_operations_total counter",
+        ]
+        for (operation, result), value in sorted(self._operations.items()):
+            lines.append(f'{PROM_PREFIX}_operations_total{{operation="{operation}",result="{result}"}} {value}')
+
+        lines += [
+            f"# HELP {PROM_PREFIX}_operation_seconds_total Wall time spent per operation type.",
+            f"# TYPE {PROM_PREFIX}_operation_seconds_total counter",
+        ]
+        for operation, (seconds, _) in sorted(self._totals.items()):
+            lines.append(f'{PROM_PREFIX}_operation_seconds_total{{operation="{operation}"}} {seconds:.6f}')
+
+        lines += [
+            f"# HELP {PROM_PREFIX}_bytes_total Save bytes processed per operation type.",
+            f"# TYPE {PROM_PREFIX}_bytes_total counter",
+        ]
+        for operation, (_, size) in sorted(self._totals.items()):
+            lines.append(f'{PROM_PREFIX}_bytes_total{{operation="{operation}"}} {size}')
+
+        if self._stages:
+            lines += [
+                f"# HELP {PROM_PREFIX}_stage_seconds_total Wall time per processing stage.",
+                f"# TYPE {PROM_PREFIX}_stage_seconds_total counter",
+            ]
+            for name, (seconds, _) in sorted(self._stages.items()):
+                lines.append(f'{PROM_PREFIX}_stage_seconds_total{{stage="{name}"}} {seconds:.6f}')
+
+        if self._save_metrics:
+            lines += [
+                f"# HELP {PROM_PREFIX}_save_metric Last analysed value per save.",
+                f"# TYPE {PROM_PREFIX}_save_metric gauge",
+            ]
+            for (file, name), value in sorted(self._save_metrics.items()):
+                lines.append(f'{PROM_PREFIX}_save_metric{{file="{_label(file)}",name="{_label(name)}"}} {value}')
+
+        lines += [
+            f"# HELP {PROM_PREFIX}_last_run_timestamp_seconds Time of the last recorded operation.",
+            f"# TYPE {PROM_PREFIX}_last_run_timestamp_seconds gauge",
+            f"{PROM_PREFIX}_last_run_timestamp_seconds {time.time():.3f}",
+        ]
+
+        self.prom_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.prom_path.with_name(self.prom_path.name + '.tmp')
+        tmp_path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+        tmp_path.replace(self.prom_path)
+
+
+class WorkerSink:
+    """Приёмник рабочего процесса пакетной обработки: записи только копятся
+       в памяти и возвращаются родителю, файлы метрик пишет один родитель
+    """
+
+    def __init__(self):
+        self.records = []
+
+    def record(self, operation: str, file: Optional[Path], result: str,
+               seconds: float, size: int = 0, stages: Optional[dict] = None,
+               metrics: Optional[dict] = None) -> dict:
+        entry = {'operation': operation, 'file': str(file) if file else None,
+                 'result': result, 'seconds': seconds, 'size': size,
+                 'stages': stages or {}, 'metrics': metrics}
+        self.records.append(entry)
+        return entry
+
+
+_sink = None
+
+
+def configure(jsonl_path=None, prom_path=None) -> Optional[MetricsSink]:
+    """Создаёт глобальный приёмник из аргументов или переменных окружения"""
+    global _sink
+    jsonl_path = jsonl_path or os.environ.get('PRISON_METRICS_JSONL')
+    prom_path = prom_path or os.environ.get('PRISON_METRICS_PROM')
+    if jsonl_path or prom_path:
+        _sink = MetricsSink(jsonl_path, prom_path)
+        # Время по этапам берётся из profiling — собираем его без вывода отчёта
+        profiling.enable(report=False)
+    return _sink
+
+
+def get_sink() -> Optional[MetricsSink]:
+    return _sink
+
+
+def start_worker(enabled: bool) -> None:
+    """В рабочем процессе: унаследованный от родителя приёмник не используется,
+       записи копятся в памяти (enabled) или не ведутся вовсе
+    """
+    global _sink
+    _sink = WorkerSink() if enabled else None
+    if enabled:
+        profiling.enable(report=False)
+
+
+def take_records() -> list:
+    """Записи рабочего процесса с прошлого вызова"""
+    if not isinstance(_sink, WorkerSink):
+        return []
+    records, _sink.records = _sink.records, []
+    return records
+
+
+def replay(records: list) -> None:
+    """Пишет в приёмник родителя записи, полученные от рабочего процесса"""
+    if _sink is None:
+        return
+    for entry in records:
+        try:
+            _sink.record(entry['operation'], entry['file'], entry['result'], entry['seconds'],
+                         entry['size'], entry['stages'], entry['metrics'])
+        except OSError as e:
+            _warn(e)
+
+
+def _warn(error: OSError) -> None:
+    import sys
+    print(f"Не удалось записать метрики: {error}", file=sys.stderr)
+
+
+@contextmanager
+def track(operation: str, file: Optional[Path] = None):
+    """Замеряет операцию и пишет её в приёмник, если он настроен.
+       Внутри блока можно заполнить op['result'] и op['metrics'].
+       Этапы собираются по потоку, так что операции в параллельных потоках
+       (сервис, массовый перенос) не смешиваются
+    """
+    op = {'result': 'ok', 'metrics': None}
+    if _sink is None:
+        yield op
+        return
+
+    size = 0
+    if file is not None:
+        try:
+            size = Path(file).stat().st_size
+        except OSError:
+            pass
+
+    started = time.perf_counter()
+    stages = {}
+    try:
+        with profiling.collect() as stages:
+            yield op
+    except BaseException:
+        op['result'] = 'error'
+        raise
+    finally:
+        # Сбой записи метрик не должен менять результат самой операции
+        try:
+            _sink.record(operation, file, op['result'], time.perf_counter() - started, size,
+                         {name: {'seconds': round(stage['seconds'], 6), 'bytes': stage['bytes']}
+                          for name, stage in stages.items()},
+                         op['metrics'])
+        except OSError as e:
+            _warn(e)
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+Покрытие карты патрулями. Секция Patrols разбирается в маршруты —
+последовательности точек (ссылки на объекты PatrolPoint по Id). Каждый
+участок маршрута растеризуется вместе с радиусом обзора охранника
+(room_graph.stamp_segment: по срезу на строку карты), и клетки маршрутов
+объединяются с клетками камер и охраны в одну карту покрытия сейва.
+Карты из байтов 0 и 1 объединяются и пересекаются как длинные целые
+(одно «или» / «и» на полосу строк маршрута), без обхода клеток в Python
+"""
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import profiling
+from room_graph import CAMERA_RADIUS, CAMERA_TYPES, GUARD_RADIUS, GUARD_TYPES, stamp_disc, stamp_segment
+
+PATROL_RADIUS = GUARD_RADIUS
+
+# Маршрут, который почти целиком видят камеры и охрана, ничего не добавляет
+REDUNDANT_SHARE = 0.9
+
+
+def _number(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class PatrolCoverage:
+    """Камеры, охрана и маршруты патрулей сейва; compute() строит карту покрытия"""
+
+    def __init__(self):
+        self.header: Dict[str, str] = {}
+        self.routes: List[Tuple[str, list]] = []        # (Id патруля, точки по порядку)
+        self._watchers: List[Tuple[float, float, bool]] = []   # (x, y, камера ли)
+        self._ids = array('q')
+        self._x = array('d')
+        self._y = array('d')
+        self._row_of: Dict[int, int] = {}
+
+    def add_object(self, entry: dict) -> None:
+        """Запись секции Objects: позиция для ссылок из патрулей, камеры и охрана"""
+        x, y = _number(entry.get('Pos.x')), _number(entry.get('Pos.y'))
+        if x is None or y is None:
+            return
+        object_id = _number(entry.get('Id.i', entry.get('Id')))
+        if object_id is not None:
+            self._row_of[int(object_id)] = len(self._ids)
+            self._ids.append(int(object_id))
+            self._x.append(x)
+            self._y.append(y)
+        object_type = entry.get('Type', '').lower()
+        if object_type in CAMERA_TYPES or object_type in GUARD_TYPES:
+            self._watchers.append((x, y, object_type in CAMERA_TYPES))
+
+    def add_patrol(self, entry: dict) -> None:
+        """Запись секции Patrols, разобранная вместе с вложенной секцией Points"""
+        points = entry.get('Points')
+        if not isinstance(points, dict):
+            points = {}
+        waypoints = [value for key, value in points.items() if key != 'Size']
+        self.routes.append((entry.get('Id', str(len(self.routes))), waypoints))
+
+    def waypoint(self, value) -> Optional[Tuple[float, float]]:
+        """Точка маршрута: Id объекта или вложенная запись с координатами"""
+        if isinstance(value, dict):
+            x = _number(value.get('Pos.x', value.get('x')))
+            y = _number(value.get('Pos.y', value.get('y')))
+            return (x, y) if x is not None and y is not None else None
+        object_id = _number(value)
+        row = self._row_of.get(int(object_id)) if object_id is not None else None
+        return (self._x[row], self._y[row]) if row is not None else None
+
+    def map_size(self) -> Tuple[int, int]:
+        return int(self.header.get('NumCellsX') or 0), int(self.header.get('NumCellsY') or 0)
+
+    def compute(self, camera_radius: float = CAMERA_RADIUS, guard_radius: float = GUARD_RADIUS,
+                sight_radius: float = PATROL_RADIUS) -> Optional[dict]:
+        """Карта покрытия и показатели по маршрутам; None — в заголовке нет размера карты"""
+        width, height = self.map_size()
+        if not width or not height:
+            return None
+
+        with profiling.stage('patrol_coverage', width * height):
+            static = bytearray(width * height)
+            for x, y, camera in self._watchers:
+                stamp_disc(static, width, x, y, camera_radius if camera else guard_radius)
+            static_tiles = static.count(1)
+
+            coverage = bytearray(static)
+            routes = []
+            for patrol_id, waypoints in self.routes:
+                points = [self.waypoint(value) for value in waypoints]
+                resolved = [point for point in points if point is not None]
+                tiles = bytearray(width * height)
+                for (x0, y0), (x1, y1) in zip(resolved, resolved[1:]):
+                    stamp_segment(tiles, width, x0, y0, x1, y1, sight_radius)
+                if len(resolved) == 1:
+                    stamp_disc(tiles, width, *resolved[0], sight_radius)
+
+                # Дальше работаем только с полосой строк, которые задевает маршрут
+                # (в пределах карты: точки могут лежать и за её краем)
+                rows = [int(y) for _, y in resolved] or [0]
+                start = max(0, min(rows) - int(sight_radius)) * width
+                end = min(height, max(rows) + int(sight_radius) + 1) * width
+                route = {
+                    'id': patrol_id,
+                    'points': len(points),
+                    'unresolved': len(points) - len(resolved),
+                    'length': sum(((x1 - x0) ** 2 + (y1 - y0) ** 2) ** 0.5
+                                  for (x0, y0), (x1, y1) in zip(resolved, resolved[1:])),
+                    'tiles': 0,
+                    'watched_tiles': 0,
+                    'new_tiles': 0,
+                }
+                routes.append(route)
+                if end <= start:
+                    continue
+                band = end - start
+                tiles_bits = int.from_bytes(tiles[start:end], 'little')
+                before = coverage[start:end]
+                merged = (int.from_bytes(before, 'little') | tiles_bits).to_bytes(band, 'little')
+                coverage[start:end] = merged
+                watched = tiles_bits & int.from_bytes(static[start:end], 'little')
+                route['tiles'] = tiles.count(1)
+                # Клетки маршрута, которые и так видят камеры и охрана
+                route['watched_tiles'] = watched.to_bytes(band, 'little').count(1)
+                route['new_tiles'] = merged.count(1) - before.count(1)
+
+        covered = coverage.count(1)
+        return {
+            'width': width,
+            'height': height,
+            'static_tiles': static_tiles,
+            'patrol_tiles': covered - static_tiles,
+            'covered_tiles': covered,
+            'covered_share': covered / (width * height),
+            'routes': routes,
+            'coverage': coverage,
+        }
+
+
+def attach(pipeline) -> PatrolCoverage:
+    """Подписывает сбор патрулей на общий проход конвейера"""
+    patrols = PatrolCoverage()
+    patrols.header = pipeline.header
+    pipeline.on_entry('Objects', patrols.add_object)
+    pipeline.on_entry('Patrols', patrols.add_patrol, nested=True)
+    return patrols
+
+
+def from_document(document) -> PatrolCoverage:
+    """То же по уже разобранному сейву (save_context.SaveDocument)"""
+    from save_format import iter_entries, map_size
+
+    patrols = PatrolCoverage()
+    width, height = map_size(document.raw, document.sections)
+    patrols.header = {'NumCellsX': str(width), 'NumCellsY': str(height)}
+    for entry in document.objects:
+        patrols.add_object(entry)
+    span = document.section('Patrols')
+    if span:
+        for entry in iter_entries(document.raw, span, document.encoding, nested=True):
+            patrols.add_patrol(entry)
+    return patrols
+
+
+def build_coverage(path: Path, **radii) -> Optional[dict]:
+    """Покрытие одним потоковым проходом по сейву"""
+    from pipeline import SavePipeline
+
+    pipeline = SavePipeline()
+    patrols = attach(pipeline)
+    pipeline.run(Path(path))
+    return patrols.compute(**radii)
+
+
+def coverage_metrics(report: Optional[dict]) -> dict:
+    """Числовые показатели покрытия для отчёта и метрик (без самой карты)"""
+    if report is None:
+        return {'covered_share': None, 'patrol_tiles': None, 'patrol_routes': 0,
+                'redundant_patrols': 0, 'empty_patrols': 0, 'unresolved_waypoints': 0}
+    routes = report['routes']
+    return {
+        'covered_share': round(report['covered_share'], 4),
+        'patrol_tiles': report['patrol_tiles'],
+        'patrol_routes': len(routes),
+        'redundant_patrols': sum(1 for route in routes
+                                 if route['tiles'] and route['watched_tiles'] >= route['tiles'] * REDUNDANT_SHARE),
+        'empty_patrols': sum(1 for route in routes if not route['tiles']),
+        'unresolved_waypoints': sum(route['unresolved'] for route in routes),
+    }
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+Конвейер анализа: один потоковый проход по сейву, события которого
+раздаются всем подписанным плагинам. Сколько бы анализов ни было
+подключено, файл читается один раз
+"""
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import profiling
+from save_format import ITEM_RE, TOKEN_RE
+
+READ_BUFFER = 1024 * 1024
+
+
+class _Frame:
+    """Открытая секция в стеке прохода"""
+    __slots__ = ('name', 'key', 'fields', 'collect')
+
+    def __init__(self, name: str, collect: bool):
+        self.name = name
+        self.key = None
+        self.fields = {} if collect else None
+        self.collect = collect
+
+
+class SavePipeline:
+    """Потоковый проход по сейву с подписками на события:
+       - on_entry(section, handler)  — запись секции верхнего уровня (объект в Objects),
+                                       handler(fields: dict); с nested=True вложенные
+                                       секции записи приходят словарями под своими именами
+       - on_line(key, handler)       — пара «ключ значение» на любой глубине (Zone, Type),
+                                       handler(value: str, section: str)
+       - on_section(name, handler)   — конец секции верхнего уровня,
+                                       handler(fields: dict) с её собственными ключами (Size)
+       Ключи заголовка вне секций (NumCellsX, NumCellsY) после прохода лежат в header
+    """
+
+    def __init__(self, encoding: Optional[str] = None):
+        self.encoding = encoding
+        self._entry_handlers: Dict[str, List[Callable]] = {}
+        self._line_handlers: Dict[str, List[Callable]] = {}
+        self._section_handlers: Dict[str, List[Callable]] = {}
+        self._nested_entries = set()
+        self.header: Dict[str, str] = {}
+        self.stats = {}
+
+    def on_entry(self, section: str, handler: Callable[[dict], None], nested: bool = False) -> None:
+        self._entry_handlers.setdefault(section.lower(), []).append(handler)
+        if nested:
+            self._nested_entries.add(section.lower())
+
+    def on_line(self, key: str, handler: Callable[[str, str], None]) -> None:
+        self._line_handlers.setdefault(key.lower(), []).append(handler)
+
+    def on_section(self, name: str, handler: Callable[[dict], None]) -> None:
+        self._section_handlers.setdefault(name.lower(), []).append(handler)
+
+    def run(self, path: Path) -> dict:
+        """Выполняет проход по файлу и возвращает статистику (байты, строки, время)"""
+        started = time.perf_counter()
+        encoding = self.encoding or 'utf-8'
+        # Строки без BEGIN/END интересны, только если в них есть нужный ключ
+        line_keys = [key.encode('ascii') for key in self._line_handlers]
+        stack: List[_Frame] = []
+        expect_name = False
+        header_key = None
+        size = 0
+        lines = 0
+
+        with open(path, 'rb', buffering=READ_BUFFER) as f:
+            for line in f:
+                size += len(line)
+                lines += 1
+
+                # Вне секций строк мало (заголовок), они разбираются всегда
+                collecting = not stack or stack[-1].collect
+                if not collecting and not TOKEN_RE.search(line):
+                    lowered = line.lower()
+                    if not any(key in lowered for key in line_keys):
+                        continue
+
+                tokens = ITEM_RE.findall(line) if b'"' in line else line.split()
+                for token in tokens:
+                    keyword = token.upper()
+
+                    if keyword == b'BEGIN':
+                        expect_name = True
+                        continue
+
+                    if expect_name:
+                        expect_name = False
+                        name = token.strip(b'"').decode('ascii', 'replace')
+                        if len(stack) == 0:
+                            collect = (name.lower() in self._section_handlers)
+                        elif len(stack) == 1:
+                            collect = stack[0].name.lower() in self._entry_handlers
+                        else:
+                            collect = stack[-1].collect and stack[0].name.lower() in self._nested_entries
+                        stack.append(_Frame(name, collect))
+                        continue
+
+                    if keyword == b'END' and stack:
+                        frame = stack.pop()
+                        if frame.collect:
+                            if not stack:
+                                handlers = self._section_handlers.get(frame.name.lower(), ())
+                            elif len(stack) == 1:
+                                handlers = self._entry_handlers.get(stack[0].name.lower(), ())
+                            else:
+                                stack[-1].fields[frame.name] = frame.fields
+                                handlers = ()
+                            for handler in handlers:
+                                handler(frame.fields)
+                        continue
+
+                    if not stack:
+                        if header_key is None:
+                            header_key = token.decode('ascii', 'replace')
+                        else:
+                            self.header[header_key] = token.strip(b'"').decode(encoding, 'replace')
+                            header_key = None
+                        continue
+                    frame = stack[-1]
+                    if frame.key is None:
+                        frame.key = token
+                        continue
+
+                    key, frame.key = frame.key, None
+                    key_text = key.decode('ascii', 'replace')
+                    value = None
+                    if frame.collect:
+                        value = token.strip(b'"').decode(encoding, 'replace')
+                        frame.fields[key_text] = value
+                    handlers = self._line_handlers.get(key_text.lower())
+                    if handlers:
+                        if value is None:
+                            value = token.strip(b'"').decode(encoding, 'replace')
+                        section = stack[0].name
+                        for handler in handlers:
+                            handler(value, section)
+
+                # Пара «ключ значение» не переносится через строку
+                if stack:
+                    stack[-1].key = None
+                header_key = None
+
+        self.stats = {
+            'bytes': size,
+            'lines': lines,
+            'seconds': time.perf_counter() - started,
+        }
+        profiling.record('pipeline_pass', self.stats['seconds'], size)
+        return self.stats
+
+
+def run_pipeline(path: Path, plugins) -> Dict[str, dict]:
+    """Один проход по сейву для всех плагинов, поддерживающих конвейер.
+       Возвращает {menu_text: результат finish()}
+    """
+    pipeline = SavePipeline()
+    finishers = []
+    for plugin in plugins:
+        finish = plugin.register_visitors(pipeline)
+        if finish is not None:
+            finishers.append((plugin, finish))
+
+    if not finishers:
+        return {}
+
+    import metrics
+
+    with metrics.track('analyze', path) as op:
+        pipeline.run(path)
+        results = {plugin.menu_text: finish() for plugin, finish in finishers}
+        op['metrics'] = {key: value for result in results.values()
+                         for key, value in result.items()}
+    return results
@@ -2,18 +2,60 @@
 """Интерфейс для плагинов"""
 from abc import ABC, abstractmethod
 from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from pipeline import SavePipeline
+    from save_context import SaveContext
+
+# Текущая версия API плагинов:
+#   1 — execute(saves_path)
+#   2 — run(context): общий SaveContext с кэшем списка сейвов и разобранных файлов
+PLUGIN_API_VERSION = 2
 
 
 class Plugin(ABC):
     """Базовый класс для всех плагинов"""
 
+    # Плагины API v2 переопределяют run(), плагины v1 — execute()
+    api_version = 1
+
     @property
     @abstractmethod
     def menu_text(self) -> str:
         """Текст пункта меню (например: '4. Анализ мёртвых зон')"""
         pass
 
-    @abstractmethod
+    @property
+    def version(self) -> str:
+        """Версия плагина (необязательно)"""
+        return ""
+
     def execute(self, saves_path: Path) -> None:
-        """Основная логика плагина"""
-        pass
+        """Основная логика плагина (API v1)"""
+        from save_context import SaveContext
+        self.run(SaveContext(saves_path))
+
+    def run(self, context: 'SaveContext') -> None:
+        """Основная логика плагина (API v2). По умолчанию вызывает execute()"""
+        if type(self).execute is Plugin.execute:
+            raise NotImplementedError(
+                f"{type(self).__name__} должен переопределить run() или execute()")
+        self.execute(context.saves_path)
+
+    @property
+    def supports_pipeline(self) -> bool:
+        """Умеет ли плагин работать в режиме конвейера (register_visitors)"""
+        return type(self).register_visitors is not Plugin.register_visitors
+
+    def register_visitors(self, pipeline: 'SavePipeline'):
+        """Режим конвейера (необязательно): подписывается на события общего
+           прохода по сейву и возвращает finish() → dict с результатами
+        """
+        return None
+
+    def show_result(self, path: Path, result: dict) -> None:
+        """Выводит результат конвейера; по умолчанию — списком «ключ: значение»"""
+        print(f"\n{path.name} — {self.menu_text}:")
+        for key, value in result.items():
+            print(f"  • {key}: {value}")
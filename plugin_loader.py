@@ -2,6 +2,100 @@ import sys
 from pathlib import Path
 from plugin_interface import Plugin
 from ui import Color
+import profiling
+
+# 32 байта = AES-256 (ДЛЯ ПРИМЕРА)
+DECRYPTION_KEY = b'PrisonToolkitKey1234567890ABCDEF'
+
+# Заголовок .enc нового формата: метаданные лежат открыто перед шифротекстом
+# и проверяются AES-GCM как associated data при расшифровке
+ENC_MAGIC = b'PAPLUG2\n'
+
+# Сколько секунд ждать загрузки одного плагина (переопределяется PRISON_PLUGIN_TIMEOUT)
+DEFAULT_LOAD_TIMEOUT = 10.0
+MAX_LOAD_WORKERS = 8
+
+
+class LazyPlugin(Plugin):
+    """Плагин, найденный по статическим метаданным: код загружается при первом вызове"""
+
+    def __init__(self, path: Path, info: dict, loader):
+        self.path = path
+        self.info = info
+        self._loader = loader
+        self._plugin = None
+
+    @property
+    def menu_text(self) -> str:
+        return self.info['menu_text']
+
+    @property
+    def version(self) -> str:
+        return self.info.get('version', '')
+
+    def load(self):
+        """Импортирует (и при необходимости расшифровывает) настоящий плагин"""
+        if self._plugin is None:
+            self._plugin = self._loader(self.path)
+        return self._plugin
+
+    def _require(self):
+        plugin = self.load()
+        if plugin is None:
+            print(f"{Color.RED}✗ Плагин недоступен:{Color.END} {self.path.name}")
+            input(f"\n{Color.YELLOW}Нажмите Enter для возврата в меню...{Color.END}")
+        return plugin
+
+    def execute(self, saves_path: Path) -> None:
+        plugin = self._require()
+        if plugin is not None:
+            plugin.execute(saves_path)
+
+    def run(self, context) -> None:
+        plugin = self._require()
+        if plugin is not None:
+            plugin.run(context)
+
+    @property
+    def supports_pipeline(self) -> bool:
+        # Объявляется в PLUGIN_INFO, чтобы не загружать плагин ради пункта меню
+        return bool(self.info.get('pipeline'))
+
+    def register_visitors(self, pipeline):
+        if not self.supports_pipeline:
+            return None
+        plugin = self.load()
+        return plugin.register_visitors(pipeline) if plugin is not None else None
+
+    def show_result(self, path: Path, result: dict) -> None:
+        plugin = self.load()
+        if plugin is not None:
+            plugin.show_result(path, result)
+
+
+def read_plugin_info(source: bytes):
+    """Читает PLUGIN_INFO из исходника без выполнения кода плагина.
+       Возвращает dict с 'menu_text' (и необязательно 'version') или None
+    """
+    import ast
+
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return None
+
+    for node in tree.body:
+        if (isinstance(node, ast.Assign) and len(node.targets) == 1
+                and isinstance(node.targets[0], ast.Name)
+                and node.targets[0].id == 'PLUGIN_INFO'):
+            try:
+                info = ast.literal_eval(node.value)
+            except ValueError:
+                return None
+            if isinstance(info, dict) and isinstance(info.get('menu_text'), str):
+                return info
+            return None
+    return None
 
 
 def get_plugins_dir() -> Path:
@@ -16,10 +110,12 @@ def get_plugins_dir() -> Path:
     return base_dir / "plugins"
 
 
-def load_plugins():
+def load_plugins(timeout=None):
     """Загружает плагины в зависимости от режима запуска:
        - .exe → только .enc файлы (без .py!)
        - python main.py → только .py файлы (для разработки)
+       Файлы загружаются параллельно; плагин, не уложившийся в timeout
+       секунд, пропускается
     """
     plugin_dir = get_plugins_dir()
     is_frozen = getattr(sys, 'frozen', False)
@@ -40,82 +136,327 @@ def load_plugins():
         # Режим .exe - только .enc
         enc_files = list(plugin_dir.glob("*.enc"))
         if enc_files:
-            plugins.extend(_load_encrypted_plugins(enc_files))
+            plugins.extend(_load_encrypted_plugins(enc_files, timeout))
         # Без предупреждения - просто пропуск
     else:
         # Режим разработки - только .py файлы
         py_files = [f for f in plugin_dir.glob(
             "*.py") if not f.name.startswith("__")]
         if py_files:
-            plugins.extend(_load_plain_plugins(py_files))
+            plugins.extend(_load_plain_plugins(py_files, timeout))
         # Без предупреждения также
 
     return plugins
 
 
-def _load_encrypted_plugins(enc_files):
-    """Загружает зашифрованные плагины через AES (только для .exe)"""
-    plugins = []
-    # 32 байта = AES-256 (ДЛЯ ПРИМЕРА)
-    DECRYPTION_KEY = b'PrisonToolkitKey1234567890ABCDEF'
+def _find_plugin_class(candidates):
+    """Возвращает первый класс-наследник Plugin среди объектов модуля"""
+    for obj in candidates:
+        if isinstance(obj, type) and issubclass(obj, Plugin) and obj is not Plugin:
+            return obj
+    return None
+
+
+def _print_loaded(plugin: Plugin, elapsed: float):
+    version = f" v{plugin.version}" if plugin.version else ""
+    print(f"{Color.GREEN}✓ Загружен плагин:{Color.END} {plugin.menu_text}{version} "
+          f"({elapsed * 1000:.1f} мс)")
+
+
+def get_load_timeout() -> float:
+    """Таймаут загрузки одного плагина в секундах (PRISON_PLUGIN_TIMEOUT)"""
+    import os
 
     try:
-        from Crypto.Cipher import AES
+        return float(os.environ.get('PRISON_PLUGIN_TIMEOUT', DEFAULT_LOAD_TIMEOUT))
+    except ValueError:
+        return DEFAULT_LOAD_TIMEOUT
+
+
+def _load_parallel(files, discover, timeout=None):
+    """Выполняет discover(file) для всех файлов в пуле потоков.
+       Плагин, который грузится дольше timeout секунд, пропускается,
+       а его поток заменяется новым; порядок файлов сохраняется
+    """
+    import os
+    import queue
+    import threading
+    import time
 
-        for enc_file in enc_files:
+    if timeout is None:
+        timeout = get_load_timeout()
+
+    files = sorted(files)
+    tasks = queue.Queue()
+    for index in range(len(files)):
+        tasks.put(index)
+    starts = [None] * len(files)
+    results = [None] * len(files)
+    wakeup = threading.Semaphore(0)
+
+    def worker():
+        while True:
+            try:
+                index = tasks.get_nowait()
+            except queue.Empty:
+                return
+            starts[index] = time.perf_counter()
             try:
-                with open(enc_file, 'rb') as f:
-                    nonce = f.read(16)
-                    tag = f.read(16)
-                    ciphertext = f.read()
-
-                cipher = AES.new(DECRYPTION_KEY, AES.MODE_GCM, nonce=nonce)
-                source_code = cipher.decrypt_and_verify(ciphertext, tag)
-
-                plugin_namespace = {}
-                exec(source_code, plugin_namespace)
-
-                for obj in plugin_namespace.values():
-                    if isinstance(obj, type) and issubclass(obj, Plugin) and obj is not Plugin:
-                        plugins.append(obj())
-                        print(
-                            f"{Color.GREEN}✓ Загружен плагин:{Color.END} {obj().menu_text}")
-                        break
+                plugin = discover(files[index])
             except Exception as e:
                 print(
-                    f"{Color.RED}✗ Ошибка загрузки {enc_file.name}: {type(e).__name__}{Color.END}")
-                continue
-    except ImportError:
+                    f"{Color.RED}✗ Ошибка загрузки {files[index].name}: {e}{Color.END}")
+                plugin = None
+            results[index] = (plugin, time.perf_counter() - starts[index])
+            wakeup.release()
+
+    def spawn():
+        # Потоки-демоны: зависший плагин не помешает выходу из программы
+        threading.Thread(target=worker, daemon=True).start()
+
+    started = time.perf_counter()
+    for _ in range(min(len(files), MAX_LOAD_WORKERS, (os.cpu_count() or 1) + 4)):
+        spawn()
+
+    skipped = set()
+    while True:
+        now = time.perf_counter()
+        for index, start in enumerate(starts):
+            if (start is not None and results[index] is None
+                    and index not in skipped and now - start > timeout):
+                skipped.add(index)
+                spawn()
+        if all(result is not None or index in skipped
+               for index, result in enumerate(results)):
+            break
+        wakeup.acquire(timeout=0.05)
+
+    plugins = []
+    for index, plugin_file in enumerate(files):
+        if index in skipped:
+            print(f"{Color.YELLOW}⚠ Плагин {plugin_file.name} не загрузился за "
+                  f"{timeout:g} с — пропущен{Color.END}")
+            continue
+        plugin, elapsed = results[index]
+        if plugin is not None:
+            plugins.append(plugin)
+            _print_loaded(plugin, elapsed)
+
+    if plugins:
+        print(f"{Color.BLUE}Плагинов загружено: {len(plugins)} за "
+              f"{(time.perf_counter() - started) * 1000:.1f} мс{Color.END}")
+    return plugins
+
+
+def _parse_encrypted(data: bytes):
+    """Разбирает содержимое .enc: (метаданные или None, aad, nonce, tag, ciphertext)"""
+    import json
+
+    if data.startswith(ENC_MAGIC):
+        pos = len(ENC_MAGIC)
+        meta_len = int.from_bytes(data[pos:pos + 2], 'big')
+        aad = data[pos + 2:pos + 2 + meta_len]
+        pos += 2 + meta_len
+        info = json.loads(aad.decode('utf-8'))
+        return info, aad, data[pos:pos + 16], data[pos + 16:pos + 32], data[pos + 32:]
+
+    # Старый формат: nonce | tag | ciphertext, метаданных нет
+    return None, b'', data[:16], data[16:32], data[32:]
+
+
+def _read_encrypted_info(enc_file: Path):
+    """Читает только заголовок .enc с метаданными (None для старого формата)"""
+    import json
+
+    with open(enc_file, 'rb') as f:
+        if f.read(len(ENC_MAGIC)) != ENC_MAGIC:
+            return None
+        meta_len = int.from_bytes(f.read(2), 'big')
+        return json.loads(f.read(meta_len).decode('utf-8'))
+
+
+def get_cache_dir() -> Path:
+    """Папка кэша скомпилированных плагинов (в профиле пользователя, не рядом с .exe)"""
+    import os
+
+    if sys.platform == 'win32' and os.environ.get('LOCALAPPDATA'):
+        base = Path(os.environ['LOCALAPPDATA'])
+    elif sys.platform == 'darwin':
+        base = Path.home() / "Library" / "Caches"
+    else:
+        base = Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / ".cache")
+    return base / "PrisonToolkit" / "plugin_cache"
+
+
+def _cache_signature(enc_hash: bytes, payload: bytes) -> bytes:
+    import hashlib
+    import hmac
+
+    return hmac.new(DECRYPTION_KEY, enc_hash + payload, hashlib.sha256).digest()
+
+
+def _load_cached_code(cache_file: Path, enc_hash: bytes):
+    """Возвращает code object из кэша или None, если кэша нет или он не прошёл проверку"""
+    import hmac
+    import importlib.util
+    import marshal
+
+    try:
+        data = cache_file.read_bytes()
+    except OSError:
+        return None
+
+    magic = importlib.util.MAGIC_NUMBER
+    header_len = len(magic) + 32
+    if len(data) < header_len or not data.startswith(magic):
+        return None
+
+    signature, payload = data[len(magic):header_len], data[header_len:]
+    if not hmac.compare_digest(signature, _cache_signature(enc_hash, payload)):
+        return None
+
+    try:
+        return marshal.loads(payload)
+    except (EOFError, ValueError, TypeError):
+        return None
+
+
+def _store_cached_code(cache_file: Path, enc_hash: bytes, code) -> None:
+    """Сохраняет code object в кэш; старые версии того же плагина удаляются"""
+    import importlib.util
+    import marshal
+
+    payload = marshal.dumps(code)
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        stem = cache_file.stem.rsplit('-', 1)[0]
+        for stale in cache_file.parent.glob(f"{stem}-*.bin"):
+            if stale != cache_file and stale.stem.rsplit('-', 1)[0] == stem:
+                stale.unlink(missing_ok=True)
+
+        tmp_file = cache_file.with_suffix('.tmp')
+        tmp_file.write_bytes(importlib.util.MAGIC_NUMBER +
+                             _cache_signature(enc_hash, payload) + payload)
+        tmp_file.replace(cache_file)
+    except OSError:
+        # Кэш — только ускорение, без него плагин всё равно работает
+        pass
+
+
+def _decrypt_source(data: bytes) -> bytes:
+    from Crypto.Cipher import AES
+
+    _, aad, nonce, tag, ciphertext = _parse_encrypted(data)
+
+    cipher = AES.new(DECRYPTION_KEY, AES.MODE_GCM, nonce=nonce)
+    if aad:
+        cipher.update(aad)
+    return cipher.decrypt_and_verify(ciphertext, tag)
+
+
+def _import_encrypted_plugin(enc_file: Path):
+    """Выполняет один .enc плагин, возвращает его экземпляр.
+       Скомпилированный код берётся из кэша по SHA-256 файла; при промахе
+       файл расшифровывается, компилируется и кладётся в кэш
+    """
+    import hashlib
+
+    try:
+        data = enc_file.read_bytes()
+        enc_hash = hashlib.sha256(data).digest()
+        cache_file = get_cache_dir() / f"{enc_file.stem}-{enc_hash.hex()[:16]}.bin"
+
+        with profiling.stage('plugin_cache_lookup', len(data)):
+            code = _load_cached_code(cache_file, enc_hash)
+        profiling.count('plugin_cache_hits' if code is not None else 'plugin_cache_misses')
+        if code is None:
+            try:
+                with profiling.stage('plugin_decrypt', len(data)):
+                    source_code = _decrypt_source(data)
+            except ImportError:
+                print(
+                    f"{Color.RED}✗ Критическая ошибка: pycryptodome не найден в .exe{Color.END}")
+                print(
+                    f"{Color.YELLOW}Пересоберите .exe с 'pip install pycryptodome' перед сборкой{Color.END}")
+                return None
+
+            with profiling.stage('plugin_compile', len(source_code)):
+                code = compile(source_code, enc_file.name, 'exec')
+            _store_cached_code(cache_file, enc_hash, code)
+
+        plugin_namespace = {}
+        with profiling.stage('plugin_exec'):
+            exec(code, plugin_namespace)
+
+        plugin_class = _find_plugin_class(plugin_namespace.values())
+        return plugin_class() if plugin_class else None
+    except Exception as e:
         print(
-            f"{Color.RED}✗ Критическая ошибка: pycryptodome не найден в .exe{Color.END}")
+            f"{Color.RED}✗ Ошибка загрузки {enc_file.name}: {type(e).__name__}{Color.END}")
+        return None
+
+
+def _discover_encrypted_plugin(enc_file: Path):
+    """Находит один зашифрованный плагин.
+       Файлы нового формата не расшифровываются до выбора плагина в меню
+    """
+    try:
+        with profiling.stage('plugin_discover'):
+            info = _read_encrypted_info(enc_file)
+    except Exception as e:
         print(
-            f"{Color.YELLOW}Пересоберите .exe с 'pip install pycryptodome' перед сборкой{Color.END}")
+            f"{Color.RED}✗ Ошибка загрузки {enc_file.name}: {type(e).__name__}{Color.END}")
+        return None
 
-    return plugins
+    if info and isinstance(info.get('menu_text'), str):
+        return LazyPlugin(enc_file, info, _import_encrypted_plugin)
+    # Старый формат без метаданных — расшифровка сразу
+    return _import_encrypted_plugin(enc_file)
 
 
-def _load_plain_plugins(py_files):
-    """Загружает обычные .py плагины (только для разработки)"""
-    plugins = []
+def _load_encrypted_plugins(enc_files, timeout=None):
+    """Загружает зашифрованные плагины (только для .exe)"""
+    return _load_parallel(enc_files, _discover_encrypted_plugin, timeout)
+
+
+def _import_plain_plugin(plugin_file: Path):
+    """Импортирует один .py плагин, возвращает его экземпляр"""
     import importlib.util
 
-    for plugin_file in py_files:
-        try:
-            module_name = plugin_file.stem
-            spec = importlib.util.spec_from_file_location(
-                module_name, plugin_file)
-            module = importlib.util.module_from_spec(spec)
+    try:
+        module_name = plugin_file.stem
+        spec = importlib.util.spec_from_file_location(
+            module_name, plugin_file)
+        module = importlib.util.module_from_spec(spec)
+        with profiling.stage('plugin_exec'):
             spec.loader.exec_module(module)
 
-            for attr_name in dir(module):
-                attr = getattr(module, attr_name)
-                if isinstance(attr, type) and issubclass(attr, Plugin) and attr is not Plugin:
-                    plugin_instance = attr()
-                    plugins.append(plugin_instance)
-                    print(
-                        f"{Color.GREEN}✓ Загружен плагин:{Color.END} {plugin_instance.menu_text}")
-                    break
-        except Exception as e:
-            print(f"{Color.RED}✗ Ошибка загрузки {plugin_file.name}: {e}{Color.END}")
+        plugin_class = _find_plugin_class(
+            getattr(module, attr_name) for attr_name in dir(module))
+        return plugin_class() if plugin_class else None
+    except Exception as e:
+        print(f"{Color.RED}✗ Ошибка загрузки {plugin_file.name}: {e}{Color.END}")
+        return None
 
-    return plugins
+
+def _discover_plain_plugin(plugin_file: Path):
+    """Находит один .py плагин.
+       Плагины с PLUGIN_INFO импортируются только при выборе в меню
+    """
+    try:
+        with profiling.stage('plugin_discover') as st:
+            source = plugin_file.read_bytes()
+            st.bytes = len(source)
+            info = read_plugin_info(source)
+    except OSError as e:
+        print(f"{Color.RED}✗ Ошибка загрузки {plugin_file.name}: {e}{Color.END}")
+        return None
+
+    if info:
+        return LazyPlugin(plugin_file, info, _import_plain_plugin)
+    return _import_plain_plugin(plugin_file)
+
+
+def _load_plain_plugins(py_files, timeout=None):
+    """Загружает обычные .py плагины (только для разработки)"""
+    return _load_parallel(py_files, _discover_plain_plugin, timeout)
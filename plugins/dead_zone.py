@@ -3,22 +3,52 @@
 import re
 from plugin_interface import Plugin
 from pathlib import Path
+from room_graph import is_door_type
 from ui import Color
 
+# Статические метаданные: читаются загрузчиком без выполнения кода плагина
+PLUGIN_INFO = {
+    "menu_text": "Анализ мёртвых зон камер и охраны",
+    "version": "1.3",
+    "pipeline": True,
+}
+
+PATROLS_SIZE_RE = re.compile(rb'BEGIN\s+Patrols\s+Size\s+(\d+)', re.IGNORECASE)
+
+
+def summarize(histogram, patrols: int) -> dict:
+    """Показатели безопасности из гистограммы типов сейва"""
+    return {
+        'cameras': histogram.count('Type', 'Cctv', 'Objects'),
+        'monitors': histogram.count('Type', 'CctvMonitor', 'Objects'),
+        'patrols': patrols,
+        'patrol_points': histogram.count('Type', 'PatrolPoint', 'Objects'),
+        'guards': histogram.count('Type', 'Guard', 'Objects'),
+        'cells': histogram.count('RoomType', 'Cell'),
+        'doors': histogram.total('Type', 'Objects', where=is_door_type),
+        'staff_zones': histogram.count('Zone', 'StaffOnly'),
+        'minsec_zones': histogram.count('Zone', 'MinSecOnly'),
+        'maxsec_zones': histogram.count('Zone', 'MaxSecOnly'),
+        'deathrow_zones': histogram.count('Zone', 'DeathRow'),
+    }
+
 
 class DeadZoneDetector(Plugin):
     @property
     def menu_text(self) -> str:
-        return "Анализ мёртвых зон камер и охраны"
+        return PLUGIN_INFO["menu_text"]
+
+    @property
+    def version(self) -> str:
+        return PLUGIN_INFO["version"]
+
+    # API v2: получает общий SaveContext вместо пути к папке
+    api_version = 2
 
-    def execute(self, saves_path: Path) -> None:
+    def run(self, context) -> None:
         print(f"\n{Color.BLUE}Запуск анализа мёртвых зон...{Color.END}")
 
-        saves = sorted(
-            [f for f in saves_path.glob("*.prison") if f.is_file()],
-            key=lambda x: x.stat().st_mtime,
-            reverse=True
-        )
+        saves = context.list_saves()
 
         if not saves:
             print(f"{Color.RED}Не найдено сейвов для анализа{Color.END}")
@@ -36,7 +66,7 @@ class DeadZoneDetector(Plugin):
                 return
             if 1 <= choice <= len(saves):
                 target = saves[choice - 1]
-                self._analyze_save(target)
+                self._analyze_save(context, target)
             else:
                 print(f"{Color.RED}Неверный номер{Color.END}")
         except ValueError:
@@ -44,63 +74,79 @@ class DeadZoneDetector(Plugin):
 
         input(f"\n{Color.YELLOW}Нажмите Enter для возврата в меню...{Color.END}")
 
-    def _analyze_save(self, filepath: Path):
+    def collect_metrics(self, document) -> dict:
+        """Подсчёт показателей безопасности по разобранному сейву"""
+        from patrols import coverage_metrics, from_document
+
+        patrols = 0
+        section = document.section_bytes('Patrols')
+        if section:
+            match = PATROLS_SIZE_RE.match(section)
+            if match:
+                patrols = int(match.group(1))
+        metrics = summarize(document.histogram, patrols)
+        metrics.update(coverage_metrics(from_document(document).compute()))
+        return metrics
+
+    def _analyze_save(self, context, filepath: Path):
         """Анализ конкретного сейва с корректным парсингом структуры"""
-        # Чтение файла в бинарном режиме (определеине кодировки)
-        try:
-            with open(filepath, 'rb') as f:
-                raw_data = f.read()
+        import metrics as metrics_sink
 
+        with metrics_sink.track('analyze', filepath) as op:
             try:
-                content = raw_data.decode('cp1251')
-            except UnicodeDecodeError:
-                content = raw_data.decode('utf-8')
-        except Exception as e:
-            print(f"{Color.RED}Ошибка чтения файла: {e}{Color.END}")
-            return
+                metrics = context.metric(
+                    filepath, 'dead_zone', self.collect_metrics)
+            except Exception as e:
+                op['result'] = 'error'
+                print(f"{Color.RED}Ошибка чтения файла: {e}{Color.END}")
+                return
+            op['metrics'] = metrics
 
-        # ПАРСИНГ СТРУКТУРЫ СЕЙВА
+        self.show_result(filepath, metrics)
 
-        # 1. Камеры наблюдения: в сейвах Prison Architect тип = "Cctv"
-        cameras = len(re.findall(r'^\s*Type\s+Cctv\s*$',
-                      content, re.MULTILINE | re.IGNORECASE))
+    def register_visitors(self, pipeline):
+        """Режим конвейера: те же показатели за общий проход по сейву"""
+        from histogram import Histogram
+        from patrols import attach, coverage_metrics
 
-        # 2. Мониторы для просмотра камер (опционально)
-        monitors = len(re.findall(r'^\s*Type\s+CctvMonitor\s*$',
-                       content, re.MULTILINE | re.IGNORECASE))
+        histogram = Histogram()
+        counts = {'patrols': 0}
+        coverage = attach(pipeline)
 
-        # 3. Патрули: парсинг секции Patrols (основной источник)
-        patrols = 0
-        patrol_match = re.search(
-            r'BEGIN\s+Patrols\s*\n\s*Size\s+(\d+)', content, re.IGNORECASE)
-        if patrol_match:
-            patrols = int(patrol_match.group(1))
-
-        # 4. Точки патрулирования (дополнительная проверка)
-        patrol_points = len(re.findall(
-            r'^\s*Type\s+PatrolPoint\s*$', content, re.MULTILINE | re.IGNORECASE))
-
-        # 5. Охранники
-        guards = len(re.findall(r'^\s*Type\s+Guard\s*$',
-                     content, re.MULTILINE | re.IGNORECASE))
-
-        # 6. Камеры заключения (комнаты типа "Cell")
-        cells = len(re.findall(r'^\s*RoomType\s+Cell\s*$',
-                    content, re.MULTILINE | re.IGNORECASE))
-
-        # 7. Двери всех типов
-        doors = len(re.findall(r'^\s*Type\s+(JailDoor|Door|StaffDoor|DoubleDoor|JailDoorLarge|DoubleStaffDoorBlue)\b',
-                    content, re.MULTILINE | re.IGNORECASE))
-
-        # 8. Зоны безопасности
-        staff_zones = len(re.findall(
-            r'Zone\s+StaffOnly', content, re.IGNORECASE))
-        minsec_zones = len(re.findall(
-            r'Zone\s+MinSecOnly', content, re.IGNORECASE))
-        maxsec_zones = len(re.findall(
-            r'Zone\s+MaxSecOnly', content, re.IGNORECASE))
-        deathrow_zones = len(re.findall(
-            r'Zone\s+DeathRow', content, re.IGNORECASE))
+        def on_field(field):
+            def handler(value, section):
+                histogram.add(section, field, value)
+            return handler
+
+        def on_patrols(fields):
+            if fields.get('Size', '').isdigit():
+                counts['patrols'] = int(fields['Size'])
+
+        for field in ('Type', 'RoomType', 'Zone'):
+            pipeline.on_line(field, on_field(field))
+        pipeline.on_section('Patrols', on_patrols)
+
+        def finish():
+            metrics = summarize(histogram, counts['patrols'])
+            metrics.update(coverage_metrics(coverage.compute()))
+            return metrics
+
+        return finish
+
+    def show_result(self, filepath: Path, metrics: dict) -> None:
+        """Вывод показателей и рекомендаций по сейву"""
+        cameras = metrics['cameras']
+        monitors = metrics['monitors']
+        patrols = metrics['patrols']
+        patrol_points = metrics['patrol_points']
+        guards = metrics['guards']
+        cells = metrics['cells']
+        doors = metrics['doors']
+        staff_zones = metrics['staff_zones']
+        minsec_zones = metrics['minsec_zones']
+        maxsec_zones = metrics['maxsec_zones']
+        deathrow_zones = metrics['deathrow_zones']
+        covered_share = metrics.get('covered_share')
 
         # ВЫВОД РЕЗУЛЬТАТОВ
         print(f"\n{Color.CYAN}Результаты анализа: {filepath.name}{Color.END}")
@@ -109,6 +155,9 @@ class DeadZoneDetector(Plugin):
             print(
                 f"  • Мониторы: {monitors} {'✓' if monitors >= cameras else '⚠️ недостаточно'}")
         print(f"  • Зоны патрулирования: {patrols}")
+        if covered_share is not None:
+            print(f"  • Под наблюдением: {covered_share * 100:.1f}% карты "
+                  f"(маршруты патрулей добавляют {metrics['patrol_tiles']} клеток)")
         if patrol_points > 0:
             print(f"  • Точки патрулирования: {patrol_points}")
         print(f"  • Охранники: {guards}")
@@ -147,8 +196,22 @@ class DeadZoneDetector(Plugin):
             recommendations.append(
                 "Добавьте мониторы — рекомендуется 1 монитор на 4 камеры")
 
-        # Проблема 3: патрули без охраны
-        if patrols > 0 and guards < patrols * 2:
+        # Проблема 3: маршруты патрулей, которые ничего не добавляют к покрытию
+        if patrols > 0 and covered_share is not None:
+            if metrics['empty_patrols']:
+                issues.append(
+                    f"Маршруты без точек на карте: {metrics['empty_patrols']} "
+                    f"(не найдено точек: {metrics['unresolved_waypoints']})")
+                recommendations.append(
+                    "Пересоздайте эти маршруты через меню 'Охрана → Патрули'")
+            if metrics['redundant_patrols']:
+                issues.append(
+                    f"{metrics['redundant_patrols']} из {metrics['patrol_routes']} маршрутов почти целиком "
+                    f"проходят там, где уже видят камеры и охрана")
+                recommendations.append(
+                    "Перенесите эти маршруты в слепые зоны камер — там патруль добавит покрытие")
+        # Без размера карты покрытие не посчитать — остаётся оценка по числу охранников
+        elif patrols > 0 and guards < patrols * 2:
             issues.append(
                 f"Недостаточно охраны для патрулей (патрулей: {patrols}, охранников: {guards}, нужно минимум {patrols * 2})")
             recommendations.append(
@@ -195,7 +258,7 @@ class DeadZoneDetector(Plugin):
             print(
                 "  • Камеры: размещайте на высоте 2-3 клетки, направляя вдоль коридоров")
             print("  • Перекрытие: ставьте камеры попарно для устранения слепых зон")
-            print("  • Патрули: создавайте маршруты длиной 15-25 клеток с 2+ охранниками")
+            print("  • Патрули: проводите маршруты через участки, которые не видят камеры")
             if deathrow_zones > 0:
                 print(
                     "  • Смертники: обязательно 2+ камеры на зону + постоянный патруль")
@@ -206,5 +269,7 @@ class DeadZoneDetector(Plugin):
             if patrols > 0:
                 print(
                     f"  • Настроены {patrols} патруль(ей) для {guards} охранников")
+            if covered_share is not None:
+                print(f"  • Под наблюдением {covered_share * 100:.1f}% карты")
             if monitors > 0:
                 print(f"  • Мониторы позволяют отслеживать все камеры")
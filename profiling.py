@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+Замеры по этапам: таймеры и счётчики вокруг чтения, декодирования, разбора,
+записи и загрузки плагинов. Включаются флагом --profile или переменной
+окружения PRISON_PROFILE=1; PRISON_PROFILE_OUT=файл.pstats (или --profile-out)
+дополнительно пишет полный профиль cProfile.
+Выключенные замеры почти ничего не стоят: stage() возвращает пустой контекст
+"""
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from ui import Color
+
+_enabled = os.environ.get('PRISON_PROFILE', '') not in ('', '0')
+_report = _enabled
+_lock = threading.Lock()
+_stages: Dict[str, List[float]] = {}
+_order: List[str] = []
+_counters: Dict[str, int] = {}
+_profiler = None
+_profile_out: Optional[str] = None
+# Сборщики этапов текущего потока (см. collect)
+_local = threading.local()
+
+
+class _Stage:
+    """Замер одного этапа; bytes можно заполнить внутри блока with"""
+    __slots__ = ('name', 'bytes', '_start')
+
+    def __init__(self, name: str, nbytes: int = 0):
+        self.name = name
+        self.bytes = nbytes
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self._start, self.bytes)
+        return False
+
+
+class _NullStage:
+    __slots__ = ('bytes',)
+
+    def __init__(self):
+        self.bytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+def enable(profile_out: Optional[str] = None, report: bool = True) -> None:
+    """Включает замеры; profile_out — путь для дампа cProfile/pstats.
+       report=False — только сбор (например, для экспорта метрик), без отчёта при выходе
+    """
+    global _enabled, _report, _profiler, _profile_out
+    _enabled = True
+    _report = _report or report
+    profile_out = profile_out or os.environ.get('PRISON_PROFILE_OUT')
+    if profile_out and _profiler is None:
+        import cProfile
+        _profile_out = profile_out
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def stage(name: str, nbytes: int = 0):
+    """Контекстный менеджер-таймер этапа: with stage('read') as st: st.bytes = ..."""
+    if not _enabled:
+        return _NULL_STAGE
+    return _Stage(name, nbytes)
+
+
+def record(name: str, seconds: float, nbytes: int = 0) -> None:
+    """Добавляет уже измеренное время этапа (когда with-блок неудобен)"""
+    if not _enabled:
+        return
+    with _lock:
+        entry = _stages.get(name)
+        if entry is None:
+            entry = _stages[name] = [0, 0.0, 0]
+            _order.append(name)
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] += nbytes
+    for stages in getattr(_local, 'collectors', ()):
+        entry = stages.setdefault(name, {'calls': 0, 'seconds': 0.0, 'bytes': 0})
+        entry['calls'] += 1
+        entry['seconds'] += seconds
+        entry['bytes'] += nbytes
+
+
+@contextmanager
+def collect():
+    """Этапы, записанные этим потоком внутри блока: {имя: {calls, seconds, bytes}}.
+       Замеры параллельных операций в других потоках сюда не попадают
+    """
+    stages: Dict[str, dict] = {}
+    collectors = getattr(_local, 'collectors', None)
+    if collectors is None:
+        collectors = _local.collectors = []
+    collectors.append(stages)
+    try:
+        yield stages
+    finally:
+        collectors.remove(stages)
+
+
+def count(name: str, n: int = 1) -> None:
+    """Увеличивает счётчик name на n"""
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def peak_rss() -> Optional[int]:
+    """Пиковое потребление памяти процессом в байтах (None, если неизвестно)"""
+    if sys.platform == 'win32':
+        try:
+            import ctypes
+            from ctypes import wintypes
+
+            class ProcessMemoryCounters(ctypes.Structure):
+                _fields_ = [('cb', wintypes.DWORD),
+                            ('PageFaultCount', wintypes.DWORD),
+                            ('PeakWorkingSetSize', ctypes.c_size_t),
+                            ('WorkingSetSize', ctypes.c_size_t),
+                            ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+                            ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                            ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                            ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                            ('PagefileUsage', ctypes.c_size_t),
+                            ('PeakPagefileUsage', ctypes.c_size_t)]
+
+            counters = ProcessMemoryCounters()
+            counters.cb = ctypes.sizeof(counters)
+            process = ctypes.windll.kernel32.GetCurrentProcess()
+            if ctypes.windll.psapi.GetProcessMemoryInfo(
+                    process, ctypes.byref(counters), counters.cb):
+                return counters.PeakWorkingSetSize
+        except Exception:
+            pass
+        return None
+
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS — байты
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def snapshot() -> dict:
+    """Текущие замеры: {'stages': {имя: {calls, seconds, bytes}}, 'counters': {...}}"""
+    with _lock:
+        return {
+            'stages': {name: {'calls': _stages[name][0],
+                              'seconds': _stages[name][1],
+                              'bytes': _stages[name][2]} for name in _order},
+            'counters': dict(_counters),
+        }
+
+
+def reset() -> None:
+    with _lock:
+        _stages.clear()
+        _order.clear()
+        _counters.clear()
+
+
+def report() -> None:
+    """Печатает разбивку по этапам и, если включён cProfile, сохраняет pstats"""
+    global _profiler
+    if not _report:
+        return
+
+    data = snapshot()
+    print(f"\n{Color.BOLD}{Color.BLUE}Профиль по этапам:{Color.END}")
+    print(f"  {'этап':<28} {'вызовов':>8} {'время, мс':>11} {'МБ':>9} {'МБ/с':>9}")
+    for name, entry in data['stages'].items():
+        megabytes = entry['bytes'] / 1024 / 1024
+        speed = f"{megabytes / entry['seconds']:9.1f}" if entry['bytes'] and entry['seconds'] else f"{'':>9}"
+        size = f"{megabytes:9.2f}" if entry['bytes'] else f"{'':>9}"
+        print(f"  {name:<28} {entry['calls']:>8} {entry['seconds'] * 1000:>11.1f} {size} {speed}")
+
+    for name, value in data['counters'].items():
+        print(f"  {Color.CYAN}{name}:{Color.END} {value}")
+
+    peak = peak_rss()
+    if peak is not None:
+        print(f"  {Color.CYAN}Пиковая память (RSS):{Color.END} {peak / 1024 / 1024:.1f} МБ")
+
+    if _profiler is not None:
+        _profiler.disable()
+        import pstats
+        _profiler.dump_stats(_profile_out)
+        print(f"\n{Color.GREEN}Профиль cProfile сохранён:{Color.END} {_profile_out}")
+        pstats.Stats(_profiler).sort_stats('cumulative').print_stats(15)
+        _profiler = None
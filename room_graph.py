@@ -0,0 +1,389 @@
+# -*- coding: utf-8 -*-
+"""
+Связность комнат и пути побега. Из секции Cells строится сетка карты
+(комната и стена для каждой клетки), из Objects — двери, камеры и охрана,
+из Patrols — маршруты патрулей (patrols.py). Граф смежности комнат
+хранится в виде CSR (смещения и соседи в двух массивах), поиск путей —
+обход в ширину по сетке. Всё строится за один проход по клеткам, поэтому
+время растёт линейно с площадью карты
+"""
+import math
+import re
+from array import array
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import profiling
+from save_format import map_size
+
+# Клетка — однострочная запись: BEGIN "x y" Mat ConcreteWall Room.i 3 ... END
+CELL_RE = re.compile(rb'BEGIN\s+"(\d+)\s+(\d+)"(.*?)(?<!\S)END(?!\S)', re.IGNORECASE | re.DOTALL)
+
+# Комнаты, из которых ищется путь побега
+CELL_ROOM_TYPES = frozenset({'cell', 'dormitory', 'holdingcell', 'solitary'})
+
+# Типы объектов в нижнем регистре: сравнение без учёта регистра, как в гистограмме
+CAMERA_TYPES = frozenset({'cctv'})
+GUARD_TYPES = frozenset({'guard', 'armedguard', 'doghandler', 'riotguard'})
+CAMERA_RADIUS = 6
+GUARD_RADIUS = 4
+
+OUTSIDE = 0  # узел графа для клеток вне комнат
+
+
+def is_door_type(value: str) -> bool:
+    """Двери узнаются по имени типа (Door, JailDoor, StaffDoor, JailDoorLarge, ...).
+       Типы, которые начинаются с Door (DoorTimer, DoorControlSystem), — не двери
+    """
+    value = value.lower()
+    return value == 'door' or ('door' in value and not value.startswith('door'))
+
+
+def is_wall(material: bytes) -> bool:
+    material = material.lower()
+    return material.endswith(b'wall') or material == b'fence'
+
+
+def _fill(bitmap: bytearray, row: int, width: int, left: float, right: float) -> None:
+    x0, x1 = max(0, math.ceil(left - 1e-9)), min(width, math.floor(right + 1e-9) + 1)
+    if x0 < x1:
+        bitmap[row * width + x0:row * width + x1] = b'\x01' * (x1 - x0)
+
+
+def stamp_disc(bitmap: bytearray, width: int, x: float, y: float, radius: float) -> None:
+    """Закрашивает в bitmap (клетки по строкам шириной width) круг радиуса
+       radius вокруг клетки точки — по строке за одно присваивание среза
+    """
+    height = len(bitmap) // width
+    cx, cy = int(x), int(y)
+    r2 = radius * radius
+    for row in range(max(0, cy - int(radius)), min(height, cy + int(radius) + 1)):
+        h = r2 - (row - cy) ** 2
+        if h >= 0:
+            span = math.sqrt(h)
+            _fill(bitmap, row, width, cx - span, cx + span)
+
+
+def stamp_segment(bitmap: bytearray, width: int, x0: float, y0: float,
+                  x1: float, y1: float, radius: float) -> None:
+    """Закрашивает клетки не дальше radius от отрезка между клетками двух точек.
+       Пересечение такой «капсулы» со строкой — один отрезок, его концы
+       считаются по формулам (два круга на концах и полоса вдоль отрезка),
+       так что на строку приходится одно присваивание среза, а не обход клеток
+    """
+    ax, ay, bx, by = int(x0), int(y0), int(x1), int(y1)
+    dx, dy = bx - ax, by - ay
+    length2 = dx * dx + dy * dy
+    if not length2:
+        stamp_disc(bitmap, width, ax, ay, radius)
+        return
+    height = len(bitmap) // width
+    r2 = radius * radius
+    band = radius * math.sqrt(length2)
+    inf, ceil, floor = math.inf, math.ceil, math.floor
+    ones = memoryview(b'\x01' * width)
+    # Полоса вдоль отрезка: проекция на отрезок в [0, length2] и расстояние
+    # до прямой не больше radius. Оба условия линейны по x: границы каждого
+    # сдвигаются на постоянный шаг от строки к строке
+    if dx:
+        along_step, along_width = -dy / dx, length2 / dx
+    if dy:
+        across_step, across_width = dx / dy, band / abs(dy)
+    for row in range(max(0, min(ay, by) - int(radius)), min(height, max(ay, by) + int(radius) + 1)):
+        t = row - ay
+        if dx:
+            lo = ax + t * along_step
+            hi = lo + along_width
+            if lo > hi:
+                lo, hi = hi, lo
+        elif 0 <= t * dy <= length2:
+            lo, hi = -inf, inf
+        else:
+            lo, hi = inf, -inf
+        if dy:
+            middle = ax + t * across_step
+            if middle - across_width > lo:
+                lo = middle - across_width
+            if middle + across_width < hi:
+                hi = middle + across_width
+        elif not -band <= t * dx <= band:
+            lo, hi = inf, -inf
+        if lo > hi:
+            lo, hi = inf, -inf
+        # Круги на концах отрезка
+        h = r2 - t * t
+        if h >= 0:
+            span = math.sqrt(h)
+            if ax - span < lo:
+                lo = ax - span
+            if ax + span > hi:
+                hi = ax + span
+        t = row - by
+        h = r2 - t * t
+        if h >= 0:
+            span = math.sqrt(h)
+            if bx - span < lo:
+                lo = bx - span
+            if bx + span > hi:
+                hi = bx + span
+        if lo <= hi:
+            first, last = max(0, ceil(lo - 1e-9)), min(width, floor(hi + 1e-9) + 1)
+            if first < last:
+                bitmap[row * width + first:row * width + last] = ones[:last - first]
+
+
+class RoomGrid:
+    """Сетка карты: номер узла комнаты, стены и двери по клеткам (индекс y * width + x)"""
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.room = array('i', bytes(4 * width * height))   # 0 — вне комнат
+        self.blocked = bytearray(width * height)
+        self.door = bytearray(width * height)
+        self.nodes: List[Tuple[Optional[int], str]] = [(None, 'Outside')]  # (Room.i, RoomType)
+        self._node_of: Dict[int, int] = {}
+
+    def node(self, room_id: int) -> int:
+        node = self._node_of.get(room_id)
+        if node is None:
+            node = self._node_of[room_id] = len(self.nodes)
+            self.nodes.append((room_id, '?'))
+        return node
+
+    def room_type(self, node: int) -> str:
+        return self.nodes[node][1]
+
+    def room_type_at(self, x: float, y: float) -> Optional[str]:
+        """Тип комнаты в точке карты (None — за пределами карты)"""
+        ix, iy = int(x), int(y)
+        if not (0 <= ix < self.width and 0 <= iy < self.height):
+            return None
+        return self.room_type(self.room[iy * self.width + ix])
+
+
+def load_grid(document) -> Optional[RoomGrid]:
+    """Сетка сейва (save_context.SaveDocument); None — в заголовке нет размера карты"""
+    raw = document.raw
+    width, height = map_size(raw, document.sections)
+    if not width or not height:
+        return None
+
+    grid = RoomGrid(width, height)
+    with profiling.stage('room_grid', len(raw)):
+        span = document.section('Cells')
+        if span:
+            for match in CELL_RE.finditer(raw, span[0] + 5, span[1] - 3):
+                x, y = int(match.group(1)), int(match.group(2))
+                if x >= width or y >= height:
+                    continue
+                index = y * width + x
+                words = match.group(3).split()
+                fields = dict(zip(words[::2], words[1::2]))
+                if is_wall(fields.get(b'Mat', b'')):
+                    grid.blocked[index] = 1
+                room = fields.get(b'Room.i')
+                if room is not None and room.lstrip(b'-').isdigit() and int(room) >= 0:
+                    grid.room[index] = grid.node(int(room))
+
+        for entry in _room_entries(document):
+            room_id = entry.get('Id.i', entry.get('Id'))
+            if room_id and room_id.lstrip('-').isdigit() and int(room_id) in grid._node_of:
+                node = grid._node_of[int(room_id)]
+                grid.nodes[node] = (int(room_id), entry.get('RoomType', '?'))
+
+        for entry in document.objects:
+            if is_door_type(entry.get('Type', '')):
+                x, y = _position(entry)
+                if x is not None and 0 <= x < width and 0 <= y < height:
+                    grid.door[int(y) * width + int(x)] = 1
+                    grid.blocked[int(y) * width + int(x)] = 0
+    return grid
+
+
+def _room_entries(document) -> Iterable[dict]:
+    from save_format import iter_entries
+
+    span = document.section('Rooms')
+    return iter_entries(document.raw, span, document.encoding) if span else ()
+
+
+def _position(entry: dict) -> Tuple[Optional[float], Optional[float]]:
+    try:
+        return float(entry['Pos.x']), float(entry['Pos.y'])
+    except (KeyError, ValueError):
+        return None, None
+
+
+class RoomGraph:
+    """Граф смежности комнат в формате CSR: соседи узла n —
+       targets[offsets[n]:offsets[n + 1]], doors — сколько переходов через двери
+    """
+
+    def __init__(self, nodes: int, edges: Dict[Tuple[int, int], List[int]]):
+        degree = array('i', bytes(4 * (nodes + 1)))
+        for a, b in edges:
+            degree[a + 1] += 1
+            degree[b + 1] += 1
+        for n in range(nodes):
+            degree[n + 1] += degree[n]
+        self.offsets = degree
+        self.targets = array('i', bytes(4 * degree[nodes]))
+        self.crossings = array('i', bytes(4 * degree[nodes]))
+        self.doors = array('i', bytes(4 * degree[nodes]))
+        fill = array('i', degree[:nodes])
+        for (a, b), (crossings, doors) in edges.items():
+            for source, target in ((a, b), (b, a)):
+                slot = fill[source]
+                self.targets[slot] = target
+                self.crossings[slot] = crossings
+                self.doors[slot] = doors
+                fill[source] += 1
+
+    @property
+    def nodes(self) -> int:
+        return len(self.offsets) - 1
+
+    def neighbours(self, node: int) -> array:
+        return self.targets[self.offsets[node]:self.offsets[node + 1]]
+
+    def edge_count(self) -> int:
+        return len(self.targets) // 2
+
+    def bfs(self, sources: Iterable[int]) -> Tuple[array, array]:
+        """Расстояния в переходах между комнатами от ближайшего источника и предки (-1 — нет)"""
+        distance = array('i', [-1]) * self.nodes
+        parent = array('i', [-1]) * self.nodes
+        queue = deque()
+        for node in sources:
+            if distance[node] < 0:
+                distance[node] = 0
+                queue.append(node)
+        offsets, targets = self.offsets, self.targets
+        while queue:
+            node = queue.popleft()
+            for slot in range(offsets[node], offsets[node + 1]):
+                target = targets[slot]
+                if distance[target] < 0:
+                    distance[target] = distance[node] + 1
+                    parent[target] = node
+                    queue.append(target)
+        return distance, parent
+
+
+def build_room_graph(grid: RoomGrid) -> RoomGraph:
+    """Рёбра между комнатами, у которых есть соседние проходимые клетки"""
+    width, height = grid.width, grid.height
+    room, blocked, door = grid.room, grid.blocked, grid.door
+    edges: Dict[Tuple[int, int], List[int]] = {}
+    with profiling.stage('room_graph'):
+        for y in range(height):
+            base = y * width
+            for x in range(width):
+                index = base + x
+                if blocked[index]:
+                    continue
+                here = room[index]
+                for other in ((index + 1) if x + 1 < width else -1,
+                              (index + width) if y + 1 < height else -1):
+                    if other < 0 or blocked[other] or room[other] == here:
+                        continue
+                    key = (here, room[other]) if here < room[other] else (room[other], here)
+                    edge = edges.get(key)
+                    if edge is None:
+                        edge = edges[key] = [0, 0]
+                    edge[0] += 1
+                    if door[index] or door[other]:
+                        edge[1] += 1
+    return RoomGraph(len(grid.nodes), edges)
+
+
+def find_escape_route(grid: RoomGrid, coverage: bytearray,
+                      room_types: Iterable[str] = CELL_ROOM_TYPES) -> dict:
+    """Обход в ширину по клеткам от всех клеток камер заключённых до края карты
+       в обход стен и наблюдаемых клеток (сами клетки камер можно покидать,
+       даже если они под наблюдением). Возвращает кратчайший путь или его отсутствие
+    """
+    width, height = grid.width, grid.height
+    wanted = {name.lower() for name in room_types}
+    source_nodes = {node for node, (_, room_type) in enumerate(grid.nodes)
+                    if node != OUTSIDE and room_type.lower() in wanted}
+
+    size = width * height
+    parent = array('i', [-1]) * size
+    seen = bytearray(size)
+    queue = deque()
+    room, blocked = grid.room, grid.blocked
+    for index in range(size):
+        if room[index] in source_nodes and not blocked[index]:
+            seen[index] = 1
+            queue.append(index)
+    sources = len(queue)
+
+    exit_index = -1
+    reached = 0
+    while queue:
+        index = queue.popleft()
+        reached += 1
+        x, y = index % width, index // width
+        if x == 0 or y == 0 or x == width - 1 or y == height - 1:
+            exit_index = index
+            break
+        for other in ((index - 1) if x else -1, (index + 1) if x + 1 < width else -1,
+                      (index - width) if y else -1, (index + width) if y + 1 < height else -1):
+            if other < 0 or seen[other] or blocked[other] or coverage[other]:
+                continue
+            seen[other] = 1
+            parent[other] = index
+            queue.append(other)
+
+    result = {'source_cells': sources, 'visited_cells': reached, 'escape': exit_index >= 0,
+              'path': [], 'route_rooms': []}
+    if exit_index >= 0:
+        path = []
+        index = exit_index
+        while index >= 0:
+            path.append((index % width, index // width))
+            index = parent[index]
+        path.reverse()
+        result['path'] = path
+        rooms = []
+        for x, y in path:
+            name = grid.room_type(room[y * width + x])
+            if not rooms or rooms[-1] != name:
+                rooms.append(name)
+        result['route_rooms'] = rooms
+    return result
+
+
+def analyze_routes(document, camera_radius: float = CAMERA_RADIUS,
+                   guard_radius: float = GUARD_RADIUS) -> Optional[dict]:
+    """Граф комнат, покрытие и путь побега для сейва; None — нет размера карты"""
+    grid = load_grid(document)
+    if grid is None:
+        return None
+    from patrols import from_document
+
+    graph = build_room_graph(grid)
+    # Камеры, охрана и маршруты патрулей (обзор патрульного — как у охранника)
+    coverage = from_document(document).compute(camera_radius, guard_radius, guard_radius)['coverage']
+    with profiling.stage('escape_bfs', grid.width * grid.height):
+        route = find_escape_route(grid, coverage)
+
+    cell_nodes = [node for node, (_, room_type) in enumerate(grid.nodes)
+                  if node != OUTSIDE and room_type.lower() in CELL_ROOM_TYPES]
+    distance, _ = graph.bfs(cell_nodes)
+    return {
+        'width': grid.width,
+        'height': grid.height,
+        'rooms': len(grid.nodes) - 1,
+        'connections': graph.edge_count(),
+        'door_cells': sum(grid.door),
+        'covered_share': sum(coverage) / len(coverage),
+        'cell_rooms': len(cell_nodes),
+        'rooms_to_outside': distance[OUTSIDE] if cell_nodes else None,
+        'grid': grid,
+        'graph': graph,
+        'coverage': coverage,
+        **route,
+    }
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+Список людей тюрьмы: заключённые и персонал из секции Objects.
+Записи хранятся по столбцам в массивах (id, координаты, коды типа и
+категории), по ним строятся хеш-индексы по id, типу и категории. После
+одного прохода по сейву вопросы вида «все MaxSec вне камер» — это выборка
+по готовому индексу и проверка координат, без повторного разбора
+"""
+from array import array
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+import profiling
+
+# Типы в нижнем регистре: тип записи сравнивается без учёта регистра
+PRISONER_TYPES = frozenset({'prisoner'})
+STAFF_TYPES = frozenset({
+    'guard', 'armedguard', 'doghandler', 'riotguard', 'sniper', 'chief', 'warden',
+    'workman', 'foreman', 'cook', 'janitor', 'gardener', 'doctor', 'paramedic',
+    'psychologist', 'accountant', 'lawyer', 'teacher', 'spiritualleader', 'paroleofficer',
+})
+
+# Необязательные поля, которые сохраняются, если есть в записи
+# (у кого их нет, не занимают места)
+DEFAULT_FIELDS = ('Damage', 'Energy', 'Misconduct', 'BoilingPoint', 'Shackled', 'Suppressed')
+
+PRISONER = 'prisoner'
+STAFF = 'staff'
+
+
+def _number(value: Optional[str]) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float('nan')
+
+
+def _integer(value: Optional[str]) -> int:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return -1
+
+
+class Roster:
+    """Заключённые и персонал по столбцам. Номер строки — порядковый номер человека"""
+
+    def __init__(self, fields: Iterable[str] = DEFAULT_FIELDS):
+        self.ids = array('q')
+        self.uids = array('q')
+        self.x = array('d')
+        self.y = array('d')
+        self._kinds = array('B')              # 0 — заключённый, 1 — сотрудник
+        self._types = array('H')
+        self._categories = array('H')
+        self._names: List[str] = []          # код → тип или категория
+        self._codes: Dict[str, int] = {}
+        self.fields: Dict[str, Dict[int, str]] = {name: {} for name in fields}
+        self.by_id: Dict[int, int] = {}
+        # Ключи типа и категории — в нижнем регистре
+        self.by_type: Dict[str, array] = {}
+        self.by_category: Dict[str, array] = {}
+        self.by_kind: Dict[str, array] = {PRISONER: array('I'), STAFF: array('I')}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _code(self, name: str) -> int:
+        code = self._codes.get(name)
+        if code is None:
+            code = self._codes[name] = len(self._names)
+            self._names.append(name)
+        return code
+
+    def add(self, entry: dict) -> bool:
+        """Добавляет запись секции Objects, если это заключённый или сотрудник"""
+        object_type = entry.get('Type') or ''
+        if object_type.lower() in PRISONER_TYPES:
+            kind = PRISONER
+        elif object_type.lower() in STAFF_TYPES:
+            kind = STAFF
+        else:
+            return False
+
+        row = len(self.ids)
+        object_id = _integer(entry.get('Id.i', entry.get('Id')))
+        self.ids.append(object_id)
+        self.uids.append(_integer(entry.get('Id.u')))
+        self.x.append(_number(entry.get('Pos.x')))
+        self.y.append(_number(entry.get('Pos.y')))
+        # У персонала категории нет: его категория — STAFF
+        category = entry.get('Category') or (STAFF if kind == STAFF else '')
+        self._kinds.append(kind == STAFF)
+        self._types.append(self._code(object_type))
+        self._categories.append(self._code(category))
+        for name, values in self.fields.items():
+            value = entry.get(name)
+            if value is not None:
+                values[row] = value
+
+        if object_id >= 0:
+            self.by_id[object_id] = row
+        self.by_type.setdefault(object_type.lower(), array('I')).append(row)
+        self.by_category.setdefault(category.lower(), array('I')).append(row)
+        self.by_kind[kind].append(row)
+        return True
+
+    def type_of(self, row: int) -> str:
+        return self._names[self._types[row]]
+
+    def category_of(self, row: int) -> str:
+        return self._names[self._categories[row]]
+
+    def person(self, row: int) -> dict:
+        """Строка списка как dict (для вывода и отчётов)"""
+        person = {
+            'id': self.ids[row], 'uid': self.uids[row],
+            'type': self.type_of(row), 'category': self.category_of(row),
+            'x': self.x[row], 'y': self.y[row],
+        }
+        for name, values in self.fields.items():
+            if row in values:
+                person[name] = values[row]
+        return person
+
+    def get(self, object_id: int) -> Optional[dict]:
+        row = self.by_id.get(object_id)
+        return self.person(row) if row is not None else None
+
+    def rows(self, category: Optional[str] = None, type: Optional[str] = None,
+             kind: Optional[str] = None, where: Optional[Callable[[int], bool]] = None) -> List[int]:
+        """Номера строк по условиям: перебирается самый короткий из подходящих
+           индексов, остальные условия проверяются по кодам в массивах.
+           Тип и категория — без учёта регистра. where(row) — дополнительное условие, например по координатам
+        """
+        indexes = []
+        if category is not None:
+            indexes.append(self.by_category.get(category.lower(), ()))
+        if type is not None:
+            indexes.append(self.by_type.get(type.lower(), ()))
+        if kind is not None:
+            indexes.append(self.by_kind.get(kind, ()))
+        if not indexes:
+            return [row for row in range(len(self.ids)) if where is None or where(row)]
+
+        lowered = category.lower() if category is not None else None
+        categories = {code for code, name in enumerate(self._names) if name.lower() == lowered}
+        lowered = type.lower() if type is not None else None
+        types = {code for code, name in enumerate(self._names) if name.lower() == lowered}
+        staff = kind == STAFF
+        result = []
+        for row in min(indexes, key=len):
+            if category is not None and self._categories[row] not in categories:
+                continue
+            if type is not None and self._types[row] not in types:
+                continue
+            if kind is not None and self._kinds[row] != staff:
+                continue
+            if where is not None and not where(row):
+                continue
+            result.append(row)
+        return result
+
+    def select(self, **conditions) -> Iterator[dict]:
+        """То же, что rows(), но сразу в виде dict"""
+        return (self.person(row) for row in self.rows(**conditions))
+
+    def summary(self) -> Dict[str, Dict[str, int]]:
+        """Сводка: заключённые по категориям и персонал по типам"""
+        prisoners: Dict[str, int] = {}
+        staff: Dict[str, int] = {}
+        for row in self.by_kind[PRISONER]:
+            category = self.category_of(row) or '?'
+            prisoners[category] = prisoners.get(category, 0) + 1
+        for row in self.by_kind[STAFF]:
+            staff[self.type_of(row)] = staff.get(self.type_of(row), 0) + 1
+        return {'prisoners': prisoners, 'staff': staff}
+
+
+def attach(pipeline, fields: Iterable[str] = DEFAULT_FIELDS) -> Roster:
+    """Подписывает список на записи Objects общего прохода конвейера"""
+    roster = Roster(fields)
+    pipeline.on_entry('Objects', roster.add)
+    return roster
+
+
+def roster_from_entries(entries: Iterable[dict], fields: Iterable[str] = DEFAULT_FIELDS) -> Roster:
+    roster = Roster(fields)
+    for entry in entries:
+        roster.add(entry)
+    return roster
+
+
+def build_roster(path: Path, fields: Iterable[str] = DEFAULT_FIELDS) -> Roster:
+    """Список людей одним потоковым проходом по сейву"""
+    from pipeline import SavePipeline
+
+    pipeline = SavePipeline()
+    roster = attach(pipeline, fields)
+    with profiling.stage('roster', Path(path).stat().st_size):
+        pipeline.run(Path(path))
+    return roster
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+Общий контекст сейвов для плагинов: кэш списка файлов, лениво разобранные
+документы, общая таблица объектов и кэш метрик. Несколько плагинов,
+работающих с одним сейвом, читают и разбирают его только один раз
+"""
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import profiling
+from save_format import Span, index_sections, iter_entries
+
+# Сколько разобранных документов держать в памяти: документ хранит байты,
+# текст и объекты сейва, а метрики кэшируются отдельно и остаются
+MAX_DOCUMENTS = 4
+
+
+def file_stamp(path: Path) -> Tuple[int, int]:
+    """Отпечаток файла для инвалидации кэшей: (размер, mtime в нс)"""
+    stat = path.stat()
+    return stat.st_size, stat.st_mtime_ns
+
+
+def decode_save(raw: bytes) -> Tuple[str, str]:
+    """Декодирует сейв: сначала utf-8, затем cp1251. Возвращает (текст, кодировка)"""
+    try:
+        return raw.decode('utf-8'), 'utf-8'
+    except UnicodeDecodeError:
+        return raw.decode('cp1251'), 'cp1251'
+
+
+class SaveDocument:
+    """Сейв, который читается, декодируется и индексируется по требованию.
+       Смещения секций — байтовые, относительно raw
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._raw: Optional[bytes] = None
+        self._text: Optional[str] = None
+        self._encoding: Optional[str] = None
+        self._sections: Optional[Dict[str, List[Span]]] = None
+        self._objects: Optional[List[dict]] = None
+        self._histogram = None
+        self._roster = None
+
+    @property
+    def raw(self) -> bytes:
+        if self._raw is None:
+            with profiling.stage('read') as st:
+                with open(self.path, 'rb') as f:
+                    self._raw = f.read()
+                st.bytes = len(self._raw)
+        return self._raw
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            raw = self.raw
+            with profiling.stage('decode', len(raw)):
+                self._text, self._encoding = decode_save(raw)
+        return self._text
+
+    @property
+    def encoding(self) -> str:
+        if self._encoding is None:
+            self.text
+        return self._encoding
+
+    @property
+    def sections(self) -> Dict[str, List[Span]]:
+        """Секции верхнего уровня: имя → список байтовых диапазонов"""
+        if self._sections is None:
+            raw = self.raw
+            with profiling.stage('index_sections', len(raw)):
+                self._sections = index_sections(raw)
+        return self._sections
+
+    def section(self, name: str) -> Optional[Span]:
+        """Диапазон первой секции верхнего уровня с таким именем (без учёта регистра)"""
+        spans = self.sections.get(name)
+        if spans is None:
+            for key, value in self.sections.items():
+                if key.lower() == name.lower():
+                    spans = value
+                    break
+        return spans[0] if spans else None
+
+    def section_bytes(self, name: str) -> Optional[bytes]:
+        span = self.section(name)
+        return self.raw[span[0]:span[1]] if span else None
+
+    @property
+    def histogram(self):
+        """Гистограмма Type / RoomType / Zone по секциям (histogram.Histogram)"""
+        if self._histogram is None:
+            from histogram import build_histogram
+            self._histogram = build_histogram(self.raw, self.sections)
+        return self._histogram
+
+    @property
+    def roster(self):
+        """Заключённые и персонал с индексами по id и категории (roster.Roster)"""
+        if self._roster is None:
+            from roster import roster_from_entries
+            span = self.section('Objects')
+            with profiling.stage('roster', span[1] - span[0] if span else 0):
+                entries = self._objects if self._objects is not None else (
+                    iter_entries(self.raw, span, self.encoding) if span else ())
+                self._roster = roster_from_entries(entries)
+        return self._roster
+
+    @property
+    def objects(self) -> List[dict]:
+        """Общая таблица объектов: записи секции Objects как dict ключ → значение"""
+        if self._objects is None:
+            span = self.section('Objects')
+            with profiling.stage('parse_objects', span[1] - span[0] if span else 0):
+                self._objects = list(iter_entries(
+                    self.raw, span, self.encoding)) if span else []
+        return self._objects
+
+
+class SaveContext:
+    """Общее состояние для всех плагинов в рамках одного запуска.
+       Кэши защищены одним замком: контекст общий у потоков сервиса
+    """
+
+    def __init__(self, saves_path: Optional[Path]):
+        self.saves_path = saves_path
+        self._lock = threading.RLock()
+        self.metrics: Dict[tuple, object] = {}
+        self._listing: Optional[List[Path]] = None
+        self._listing_stamp = None
+        self._documents: Dict[Path, Tuple[Tuple[int, int], SaveDocument]] = {}
+
+    def list_saves(self, refresh: bool = False) -> List[Path]:
+        """Сейвы .prison в папке сохранений, новые первыми (кэшируется по mtime папки)"""
+        if not self.saves_path or not self.saves_path.exists():
+            return []
+
+        stamp = self.saves_path.stat().st_mtime_ns
+        with self._lock:
+            if refresh or self._listing is None or stamp != self._listing_stamp:
+                self._listing = sorted(
+                    [f for f in self.saves_path.glob("*.prison") if f.is_file()],
+                    key=lambda x: x.stat().st_mtime,
+                    reverse=True
+                )
+                self._listing_stamp = stamp
+            return list(self._listing)
+
+    def document(self, path: Path) -> SaveDocument:
+        """Документ сейва; пересоздаётся, если файл изменился с прошлого раза.
+           В кэше остаются MAX_DOCUMENTS последних использованных документов
+        """
+        path = Path(path)
+        stamp = file_stamp(path)
+        with self._lock:
+            cached = self._documents.pop(path, None)
+            if cached is None or cached[0] != stamp:
+                cached = (stamp, SaveDocument(path))
+            # Словарь упорядочен по последнему обращению: старейший — первый
+            self._documents[path] = cached
+            while len(self._documents) > MAX_DOCUMENTS:
+                del self._documents[next(iter(self._documents))]
+            return cached[1]
+
+    def metric(self, path: Path, name: str, compute: Callable[[SaveDocument], object]):
+        """Значение метрики name для сейва; compute(document) вызывается один раз на версию файла.
+           Сам расчёт идёт без замка, чтобы разные сейвы анализировались параллельно
+        """
+        path = Path(path)
+        key = (path, file_stamp(path), name)
+        with self._lock:
+            if key in self.metrics:
+                return self.metrics[key]
+        value = compute(self.document(path))
+        with self._lock:
+            return self.metrics.setdefault(key, value)
+
+    def invalidate(self, path: Optional[Path] = None) -> None:
+        """Сбрасывает кэши после изменения файла (или все кэши, если path не указан)"""
+        with self._lock:
+            self._listing = None
+            if path is None:
+                self._documents.clear()
+                self.metrics.clear()
+                return
+            path = Path(path)
+            self._documents.pop(path, None)
+            for key in [key for key in self.metrics if key[0] == path]:
+                del self.metrics[key]
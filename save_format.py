@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+Структурный разбор формата сейвов Prison Architect: секции BEGIN ... END.
+Работает с байтами (bytes, bytearray, mmap) — ключевые слова ASCII одинаковы
+в utf-8 и cp1251, поэтому для поиска секций файл не нужно декодировать
+"""
+import re
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# BEGIN/END как отдельные слова: в начале строки, внутри однострочной секции или в конце.
+# Строки в кавычках совпадают целиком и пропускаются (группа 1 пустая), поэтому
+# Forname "Dead End Jim" не закрывает секцию — так же, как в ITEM_RE
+TOKEN_RE = re.compile(rb'(?<!\S)"[^"\n]*"|(?<!\S)(BEGIN|END)(?!\S)', re.IGNORECASE)
+
+# То же для уже декодированного текста
+TEXT_TOKEN_RE = re.compile(r'(?<!\S)"[^"\n]*"|(?<!\S)(BEGIN|END)(?!\S)', re.IGNORECASE)
+
+# Слово или строка в кавычках ("[i 0]")
+ITEM_RE = re.compile(rb'"[^"\n]*"|\S+')
+
+# Размер карты в заголовке сейва (до первой секции)
+HEADER_RE = re.compile(rb'^\s*(NumCellsX|NumCellsY)\s+(\d+)', re.MULTILINE)
+
+Span = Tuple[int, int]
+
+
+def section_name(buf, begin_pos: int) -> bytes:
+    """Имя секции, которая открывается словом BEGIN в позиции begin_pos"""
+    match = ITEM_RE.search(buf, begin_pos + 5)
+    if not match:
+        return b''
+    name = match.group()
+    return name.strip(b'"') if name.startswith(b'"') else name
+
+
+def iter_tokens(buf, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[int, bool]]:
+    """Перебирает слова BEGIN/END: (позиция, True для BEGIN)"""
+    if end is None:
+        end = len(buf)
+    for match in TOKEN_RE.finditer(buf, start, end):
+        keyword = match.group(1)
+        if keyword:
+            yield match.start(), len(keyword) == 5
+
+
+def index_sections(buf, start: int = 0, end: Optional[int] = None) -> Dict[str, List[Span]]:
+    """Индекс секций верхнего уровня: имя → список (начало BEGIN, конец END).
+       Однострочные секции (BEGIN Jobs Size 0 END) сбалансированы сами по себе
+    """
+    sections: Dict[str, List[Span]] = {}
+    depth = 0
+    open_pos = 0
+
+    for pos, is_begin in iter_tokens(buf, start, end):
+        if is_begin:
+            if depth == 0:
+                open_pos = pos
+            depth += 1
+        elif depth > 0:
+            depth -= 1
+            if depth == 0:
+                name = section_name(buf, open_pos).decode('ascii', 'replace')
+                sections.setdefault(name, []).append((open_pos, pos + 3))
+
+    return sections
+
+
+def map_size(buf, sections: Optional[Dict[str, List[Span]]] = None) -> Tuple[int, int]:
+    """Размер карты (NumCellsX, NumCellsY) из заголовка — текста до первой секции;
+       0, если значения нет. sections — уже построенный index_sections(buf)
+    """
+    if sections is None:
+        sections = index_sections(buf)
+    end = min((spans[0][0] for spans in sections.values()), default=len(buf))
+    size = {match.group(1): int(match.group(2)) for match in HEADER_RE.finditer(buf, 0, end)}
+    return size.get(b'NumCellsX', 0), size.get(b'NumCellsY', 0)
+
+
+def iter_entries(buf, span: Span, encoding: str = 'utf-8', nested: bool = False) -> Iterator[dict]:
+    """Перебирает дочерние секции секции span (например, объекты в Objects)
+       и возвращает их пары ключ-значение верхнего уровня в виде dict.
+       Вложенные секции записи пропускаются, а с nested=True попадают в dict
+       записи словарями под своими именами (BEGIN Points ... END → entry['Points'])
+    """
+    depth = 0
+    entry = None
+    key = None
+    expect_name = False
+    opened: List[dict] = []
+
+    for match in ITEM_RE.finditer(buf, span[0], span[1]):
+        token = match.group()
+        keyword = token.upper()
+
+        if keyword == b'BEGIN':
+            depth += 1
+            expect_name = True
+            if depth == 2:
+                entry = {}
+                key = None
+            continue
+
+        if expect_name:
+            expect_name = False
+            if nested and depth > 2 and entry is not None:
+                child = {}
+                (opened[-1] if opened else entry)[token.strip(b'"').decode(encoding, 'replace')] = child
+                opened.append(child)
+                key = None
+            continue
+
+        if keyword == b'END':
+            if depth == 2 and entry is not None:
+                yield entry
+                entry = None
+            elif opened:
+                opened.pop()
+                key = None
+            depth -= 1
+            if depth <= 0:
+                return
+            continue
+
+        if depth == 2 or opened:
+            if key is None:
+                key = token.decode('ascii', 'replace')
+            else:
+                (opened[-1] if opened else entry)[key] = token.strip(b'"').decode(encoding, 'replace')
+                key = None
@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+"""
+Индекс библиотеки сейвов в SQLite: по каждому сейву хранятся сводные
+показатели (объекты по Type, комнаты по RoomType, зоны, патрули, размер
+файла и карты). Запросы вида «камера смертников и больше 500 заключённых»
+выполняются по индексу за миллисекунды, без открытия сейвов.
+Индекс обновляется инкрементально: заново разбираются только файлы,
+у которых изменились размер или mtime
+"""
+import re
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import profiling
+from save_context import SaveDocument, file_stamp
+from save_format import map_size
+from ui import Color
+
+SCHEMA_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS saves (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    objects INTEGER NOT NULL,
+    rooms INTEGER NOT NULL,
+    zones INTEGER NOT NULL,
+    patrols INTEGER NOT NULL,
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS counts (
+    save_id INTEGER NOT NULL REFERENCES saves(id) ON DELETE CASCADE,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL COLLATE NOCASE,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (save_id, kind, name)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS counts_by_name ON counts (kind, name, count);
+CREATE INDEX IF NOT EXISTS saves_by_size ON saves (size);
+"""
+
+# Столбцы таблицы saves, по которым можно фильтровать и сортировать
+COLUMNS = ('size', 'width', 'height', 'objects', 'rooms', 'zones', 'patrols')
+KINDS = ('object', 'room', 'zone')
+
+
+FILTER_RE = re.compile(
+    r'^\s*(?:(object|room|zone):)?([\w.]+)\s*(>=|<=|!=|=|>|<)\s*(\d+)\s*$', re.IGNORECASE)
+
+
+def get_index_path() -> Path:
+    """Файл индекса рядом с кэшем плагинов, в профиле пользователя"""
+    from plugin_loader import get_cache_dir
+
+    return get_cache_dir().parent / "library.sqlite3"
+
+
+def summarize_save(path: Path) -> dict:
+    """Сводка по сейву для индекса: размеры, счётчики и гистограммы по типам"""
+    from save_format import iter_entries
+
+    document = SaveDocument(path)
+    raw = document.raw
+    histogram = document.histogram
+    with profiling.stage('summarize', len(raw)):
+        width, height = map_size(raw, document.sections)
+        patrols_span = document.section('Patrols')
+        patrols = sum(1 for _ in iter_entries(raw, patrols_span)) if patrols_span else 0
+
+    counts = {
+        'object': histogram.distribution('Type', 'Objects'),
+        'room': histogram.distribution('RoomType', 'Rooms'),
+        'zone': histogram.distribution('Zone', 'Zones'),
+    }
+    return {
+        'width': width or None,
+        'height': height or None,
+        'objects': sum(counts['object'].values()),
+        'rooms': sum(counts['room'].values()),
+        'zones': sum(counts['zone'].values()),
+        'patrols': patrols,
+        'counts': counts,
+    }
+
+
+class SaveIndex:
+    """Постоянный индекс библиотеки сейвов"""
+
+    def __init__(self, db_path: Optional[Path] = None):
+        self.db_path = Path(db_path) if db_path else get_index_path()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.db_path))
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self._ensure_schema()
+
+    def _ensure_schema(self) -> None:
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            # Индекс — производные данные: при смене схемы проще пересобрать
+            self.conn.executescript("DROP TABLE IF EXISTS counts; DROP TABLE IF EXISTS saves;")
+        self.conn.executescript(SCHEMA)
+        self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.conn.commit()
+
+    def clear(self) -> None:
+        with self.conn:
+            self.conn.execute("DELETE FROM saves")
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def refresh(self, paths: Iterable[Path], prune: bool = True) -> dict:
+        """Инкрементальное обновление: разбираются только новые и изменённые файлы.
+           prune=True удаляет из индекса сейвы, которых больше нет в paths.
+           Возвращает сводку: added, updated, removed, unchanged, failed, seconds
+        """
+        started = time.perf_counter()
+        known = {path: (row_id, (size, mtime_ns)) for row_id, path, size, mtime_ns
+                 in self.conn.execute("SELECT id, path, size, mtime_ns FROM saves")}
+        summary = {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 0,
+                   'failed': 0, 'errors': []}
+        seen = set()
+
+        for path in paths:
+            path = Path(path)
+            key = str(path.resolve())
+            seen.add(key)
+            try:
+                stamp = file_stamp(path)
+            except OSError as e:
+                summary['failed'] += 1
+                summary['errors'].append(f"{path.name}: {e}")
+                continue
+
+            row = known.get(key)
+            if row is not None and row[1] == stamp:
+                summary['unchanged'] += 1
+                continue
+
+            try:
+                stats = summarize_save(path)
+            except Exception as e:
+                summary['failed'] += 1
+                summary['errors'].append(f"{path.name}: {e}")
+                continue
+
+            with self.conn:
+                if row is not None:
+                    self.conn.execute("DELETE FROM saves WHERE id = ?", (row[0],))
+                self._insert(key, path.name, stamp, stats)
+            summary['updated' if row is not None else 'added'] += 1
+
+        if prune:
+            stale = [(row_id,) for key, (row_id, _) in known.items() if key not in seen]
+            if stale:
+                with self.conn:
+                    self.conn.executemany("DELETE FROM saves WHERE id = ?", stale)
+            summary['removed'] = len(stale)
+
+        summary['seconds'] = time.perf_counter() - started
+        return summary
+
+    def _insert(self, key: str, name: str, stamp: Tuple[int, int], stats: dict) -> None:
+        cursor = self.conn.execute(
+            "INSERT INTO saves (path, name, size, mtime_ns, width, height, objects, "
+            "rooms, zones, patrols, indexed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, name, stamp[0], stamp[1], stats['width'], stats['height'],
+             stats['objects'], stats['rooms'], stats['zones'], stats['patrols'], time.time()))
+        save_id = cursor.lastrowid
+        # Имена типов сравниваются без учёта регистра (COLLATE NOCASE), поэтому
+        # варианты написания одного типа складываются в одну строку
+        rows = {}
+        for kind, counter in stats['counts'].items():
+            for type_name, count in counter.items():
+                row = rows.setdefault((kind, type_name.lower()), [kind, type_name, 0])
+                row[2] += count
+        self.conn.executemany(
+            "INSERT INTO counts (save_id, kind, name, count) VALUES (?, ?, ?, ?)",
+            [(save_id, *row) for row in rows.values()])
+
+    def query(self, filters: Iterable[str] = (), sort: Optional[str] = None,
+              limit: Optional[int] = None) -> Tuple[List[str], List[tuple]]:
+        """Поиск по индексу.
+           filters — условия вида "Prisoner>500", "room:DeathRow>=1", "size<50000000";
+           без префикса имя — столбец (size, width, ...) или Type объекта.
+           sort — столбец или имя типа, с "-" в начале — по убыванию.
+           Возвращает (заголовки, строки)
+        """
+        where, params = [], []
+        extra: Dict[Tuple[str, str], str] = {}
+
+        def count_expr(kind: str, name: str) -> str:
+            alias = extra.get((kind, name))
+            if alias is None:
+                alias = extra[(kind, name)] = f"c{len(extra)}"
+            return alias
+
+        for text in filters:
+            column, op, value = self._parse_filter(text)
+            if isinstance(column, tuple):
+                column = count_expr(*column)
+            where.append(f"{column} {op} ?")
+            params.append(value)
+
+        order = "s.name"
+        if sort:
+            descending = sort.startswith('-')
+            column = self._parse_key(sort.lstrip('-+'))
+            if isinstance(column, tuple):
+                column = count_expr(*column)
+            order = f"{column} {'DESC' if descending else 'ASC'}, s.name"
+
+        joins, select_extra, join_params = [], [], []
+        for (kind, name), alias in extra.items():
+            joins.append(f"LEFT JOIN counts {alias}_t ON {alias}_t.save_id = s.id "
+                         f"AND {alias}_t.kind = ? AND {alias}_t.name = ?")
+            join_params += [kind, name]
+            select_extra.append(f"COALESCE({alias}_t.count, 0) AS {alias}")
+
+        headers = ['name', 'size', 'width', 'height', 'objects', 'rooms', 'zones', 'patrols']
+        headers += [name if kind == 'object' else f"{kind}:{name}" for kind, name in extra]
+        sql = (f"SELECT s.name, s.size, s.width, s.height, s.objects, s.rooms, s.zones, s.patrols"
+               f"{''.join(', ' + expr for expr in select_extra)} FROM saves s {' '.join(joins)}")
+        # Условия по счётчикам ссылаются на псевдонимы столбцов — оборачиваем подзапросом
+        sql = f"SELECT * FROM ({sql}) s"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {order}"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        with profiling.stage('library_query'):
+            rows = self.conn.execute(sql, join_params + params).fetchall()
+        return headers, rows
+
+    def _parse_key(self, text: str):
+        """Столбец saves или (kind, name) для счётчика по типу"""
+        kind, _, name = text.rpartition(':')
+        if kind:
+            if kind.lower() not in KINDS:
+                raise ValueError(f"неизвестная категория '{kind}' (ожидается {', '.join(KINDS)})")
+            return kind.lower(), name
+        if name.lower() in COLUMNS:
+            return f"s.{name.lower()}"
+        return 'object', name
+
+    def _parse_filter(self, text: str):
+        match = FILTER_RE.match(text)
+        if not match:
+            raise ValueError(f"не удалось разобрать условие '{text}' (пример: Prisoner>500)")
+        kind, name, op, value = match.groups()
+        column = self._parse_key(f"{kind}:{name}" if kind else name)
+        return column, '=' if op == '=' else op, int(value)
+
+
+def print_refresh(summary: dict) -> None:
+    print(f"{Color.BLUE}Индекс обновлён за {summary['seconds'] * 1000:.0f} мс:{Color.END} "
+          f"добавлено {summary['added']}, обновлено {summary['updated']}, "
+          f"удалено {summary['removed']}, без изменений {summary['unchanged']}")
+    for error in summary['errors']:
+        print(f"  {Color.RED}✗ {error}{Color.END}")
+
+
+def print_table(headers: List[str], rows: List[tuple], seconds: float) -> None:
+    if not rows:
+        print(f"{Color.YELLOW}Подходящих сейвов не найдено ({seconds * 1000:.1f} мс){Color.END}")
+        return
+
+    cells = [[str(value) if value is not None else '-' for value in row] for row in rows]
+    widths = [max(len(headers[i]), *(len(row[i]) for row in cells)) for i in range(len(headers))]
+    print(f"{Color.BOLD}" + "  ".join(h.ljust(w) if i == 0 else h.rjust(w)
+                                     for i, (h, w) in enumerate(zip(headers, widths))) + Color.END)
+    for row in cells:
+        print("  ".join(v.ljust(w) if i == 0 else v.rjust(w)
+                        for i, (v, w) in enumerate(zip(row, widths))))
+    print(f"{Color.GREEN}Найдено сейвов:{Color.END} {len(rows)} ({seconds * 1000:.1f} мс)")
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+Планировщик пакетной обработки больших сейвов: исправление и анализ в
+нескольких процессах с ограничением по памяти и числу ядер.
+Пиковая память каждого задания оценивается по размеру файла и движку;
+задание запускается, только если сумма оценок запущенных укладывается в
+бюджет. Очередь упорядочивается: сначала крупные (меньше общее время
+пачки) или сначала короткие (раньше готовы первые результаты)
+"""
+import os
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, List, Optional
+
+OPERATIONS = ('fix', 'analyze')
+ORDERS = ('largest', 'sjf', 'fifo')
+FIX_ENGINES = ('auto', 'memory', 'stream')
+
+MEGABYTE = 1024 * 1024
+
+# Оценка пиковой памяти: множитель к размеру файла и постоянная часть.
+# Исправление в памяти держит сырые байты, текст, новый текст и новые байты;
+# текст cp1251 с кириллицей занимает 2 байта на символ, отсюда 7x (utf-8 — около 4x).
+# Построчные движки держат только буферы чтения и записи
+ENGINE_MEMORY = {
+    'memory': (7.0, 0),
+    'stream': (0.0, 4 * MEGABYTE),
+    'pipeline': (0.0, 4 * MEGABYTE),
+}
+# Интерпретатор и модули в каждом рабочем процессе
+WORKER_OVERHEAD = 32 * MEGABYTE
+
+SIZE_RE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)B?\s*$', re.IGNORECASE)
+
+
+def parse_size(text: str) -> int:
+    """'512M', '2G', '1.5GB', '1000000' → байты"""
+    match = SIZE_RE.match(text)
+    if not match:
+        raise ValueError(f"Непонятный размер: {text}")
+    power = 'KMGT'.find(match.group(2).upper()) + 1 if match.group(2) else 0
+    return int(float(match.group(1)) * 1024 ** power)
+
+
+def default_memory_budget() -> int:
+    """Половина физической памяти (2 ГБ, если её не удалось определить)"""
+    try:
+        total = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        total = 0
+    if not total and os.name == 'nt':
+        import ctypes
+
+        class _MemoryStatus(ctypes.Structure):
+            _fields_ = [('dwLength', ctypes.c_ulong), ('dwMemoryLoad', ctypes.c_ulong),
+                        ('ullTotalPhys', ctypes.c_ulonglong), ('ullAvailPhys', ctypes.c_ulonglong),
+                        ('ullTotalPageFile', ctypes.c_ulonglong), ('ullAvailPageFile', ctypes.c_ulonglong),
+                        ('ullTotalVirtual', ctypes.c_ulonglong), ('ullAvailVirtual', ctypes.c_ulonglong),
+                        ('ullAvailExtendedVirtual', ctypes.c_ulonglong)]
+
+        status = _MemoryStatus()
+        status.dwLength = ctypes.sizeof(status)
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            total = status.ullTotalPhys
+    return total // 2 if total else 2048 * MEGABYTE
+
+
+def estimate_memory(size: int, engine: str) -> int:
+    """Оценка пиковой памяти задания над файлом size байт"""
+    factor, constant = ENGINE_MEMORY[engine]
+    return int(size * factor) + constant + WORKER_OVERHEAD
+
+
+class BatchTask:
+    """Задание пачки: файл, движок и оценка памяти"""
+    __slots__ = ('path', 'size', 'engine', 'memory')
+
+    def __init__(self, path: Path, engine: str):
+        self.path = Path(path)
+        self.size = self.path.stat().st_size
+        self.engine = engine
+        self.memory = estimate_memory(self.size, engine)
+
+
+def plan_tasks(paths: List[Path], operation: str, engine: str, memory_budget: int,
+               order: str = 'largest') -> List[BatchTask]:
+    """Задания в порядке запуска. engine='auto' для исправления выбирает
+       движок в памяти, если задание укладывается в бюджет, иначе построчный
+    """
+    tasks = []
+    for path in paths:
+        if operation == 'analyze':
+            task_engine = 'pipeline'
+        elif engine == 'auto':
+            size = Path(path).stat().st_size
+            task_engine = 'memory' if estimate_memory(size, 'memory') <= memory_budget else 'stream'
+        else:
+            task_engine = engine
+        tasks.append(BatchTask(path, task_engine))
+
+    if order == 'largest':
+        # Сначала длинные задания: короткие потом заполняют простаивающие ядра (LPT)
+        tasks.sort(key=lambda task: -task.size)
+    elif order == 'sjf':
+        tasks.sort(key=lambda task: task.size)
+    return tasks
+
+
+# РАБОЧИЙ ПРОЦЕСС
+
+_worker_fixer = None
+
+
+def _run_task(operation: str, engine: str, path: str, collect_metrics: bool = False) -> dict:
+    """Выполняется в рабочем процессе; вывод задания и записи метрик
+       возвращаются вместе с результатом
+    """
+    import contextlib
+    import io
+
+    import metrics
+
+    global _worker_fixer
+    started = time.perf_counter()
+    output = io.StringIO()
+    result = None
+    with contextlib.redirect_stdout(output):
+        if _worker_fixer is None:
+            from core import PrisonSaveFixer
+            # Файлы метрик пишет только родитель: иначе процессы перезаписывают
+            # textfile Prometheus каждый своими счётчиками
+            metrics.start_worker(collect_metrics)
+            _worker_fixer = PrisonSaveFixer()
+            if operation == 'analyze':
+                _worker_fixer.load_plugins()
+
+        if operation == 'fix':
+            ok = _worker_fixer.fix_construction_block(Path(path), stream=engine == 'stream')
+        else:
+            from pipeline import run_pipeline
+            plugins = [p for p in _worker_fixer.plugins if p.supports_pipeline]
+            result = run_pipeline(Path(path), plugins)
+            ok = True
+
+    return {'ok': ok, 'result': result, 'output': output.getvalue(),
+            'seconds': time.perf_counter() - started, 'metrics': metrics.take_records()}
+
+
+def run_batch(tasks: List[BatchTask], operation: str, memory_budget: int, cores: int,
+              on_done: Optional[Callable[[BatchTask, dict], None]] = None) -> dict:
+    """Выполняет задания не более чем в cores процессах так, чтобы сумма оценок
+       памяти запущенных заданий не превышала memory_budget. Следующим запускается
+       первое по порядку задание, которое помещается; задание больше всего бюджета
+       идёт одно. Метрики заданий записываются в приёмник этого процесса.
+       Возвращает сводку пачки
+    """
+    import metrics
+
+    collect_metrics = metrics.get_sink() is not None
+    pending = list(tasks)
+    running = {}
+    in_use = 0
+    peak = 0
+    summary = {'tasks': len(tasks), 'ok': 0, 'failed': 0, 'oversized': 0,
+               'busy_seconds': 0.0, 'cores': cores, 'memory_budget': memory_budget}
+    started = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=max(1, min(cores, len(tasks) or 1))) as pool:
+        while pending or running:
+            while pending and len(running) < cores:
+                task = next((t for t in pending if in_use + t.memory <= memory_budget), None)
+                if task is None:
+                    if running:
+                        break
+                    task = pending[0]
+                    summary['oversized'] += 1
+                pending.remove(task)
+                future = pool.submit(_run_task, operation, task.engine, str(task.path), collect_metrics)
+                running[future] = task
+                in_use += task.memory
+                peak = max(peak, in_use)
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                task = running.pop(future)
+                in_use -= task.memory
+                try:
+                    outcome = future.result()
+                except Exception as e:
+                    outcome = {'ok': False, 'result': None, 'output': f"{e}\n", 'seconds': 0.0,
+                               'metrics': [{'operation': operation, 'file': str(task.path),
+                                            'result': 'error', 'seconds': 0.0, 'size': task.size,
+                                            'stages': {}, 'metrics': None}]}
+                metrics.replay(outcome['metrics'])
+                summary['ok' if outcome['ok'] else 'failed'] += 1
+                summary['busy_seconds'] += outcome['seconds']
+                if on_done is not None:
+                    on_done(task, outcome)
+
+    summary['seconds'] = time.perf_counter() - started
+    summary['peak_estimate'] = peak
+    return summary
+
+
+def print_plan(tasks: List[BatchTask], memory_budget: int, cores: int) -> None:
+    from ui import Color
+
+    print(f"{Color.BLUE}Заданий: {len(tasks)}, процессов: до {cores}, "
+          f"бюджет памяти: {memory_budget / MEGABYTE:.0f} МБ{Color.END}")
+    engines = {}
+    for task in tasks:
+        engines[task.engine] = engines.get(task.engine, 0) + 1
+    print("  Движки: " + ", ".join(f"{name} {count}" for name, count in engines.items()))
+    oversized = [task for task in tasks if task.memory > memory_budget]
+    if oversized:
+        print(f"  {Color.YELLOW}Больше бюджета (пойдут по одному): "
+              f"{', '.join(task.path.name for task in oversized)}{Color.END}")
+
+
+def print_summary(summary: dict) -> None:
+    from ui import Color
+
+    wall = summary['seconds']
+    utilisation = summary['busy_seconds'] / (wall * summary['cores']) if wall else 0.0
+    print(f"\n{Color.BOLD}Готово: {summary['ok']} из {summary['tasks']} за {wall:.2f} с{Color.END}")
+    print(f"  • Загрузка ядер: {utilisation * 100:.0f}%")
+    print(f"  • Пик оценки памяти: {summary['peak_estimate'] / MEGABYTE:.0f} МБ "
+          f"из {summary['memory_budget'] / MEGABYTE:.0f} МБ")
+    if summary['failed']:
+        print(f"  {Color.RED}Ошибок: {summary['failed']}{Color.END}")
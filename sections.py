@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""
+Секции сейва на уровне байтов: сейв отображается в память (mmap), секции
+находятся по индексу BEGIN/END (save_format.index_sections), а их байты
+пишутся в файл или поток кусками memoryview — без декодирования и без
+копирования в строки Python. Память не зависит от размера сейва: страницы
+файла подгружает и вытесняет ОС
+"""
+import mmap
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from save_format import Span, index_sections, iter_tokens, map_size, section_name
+
+WRITE_CHUNK = 8 * 1024 * 1024
+
+
+@contextmanager
+def mapped(path: Path) -> Iterator:
+    """Сейв, отображённый в память только для чтения (пустой файл — b'')"""
+    with open(path, 'rb') as f:
+        if f.seek(0, 2) == 0:
+            yield b''
+            return
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield mm
+        finally:
+            mm.close()
+
+
+def _lookup(sections: Dict[str, List[Span]], name: str) -> Optional[List[Span]]:
+    spans = sections.get(name)
+    if spans is None:
+        lowered = name.lower()
+        spans = next((value for key, value in sections.items() if key.lower() == lowered), None)
+    return spans
+
+
+def find_section(buf, section: str) -> Optional[Span]:
+    """Байтовый диапазон секции: 'Objects' или вложенная 'Construction/Jobs'
+       (имена без учёта регистра, берётся первая секция с таким именем)
+    """
+    span = (0, len(buf))
+    for depth, name in enumerate(section.strip('/').split('/')):
+        # Внутри родителя пропускаем его собственные BEGIN и END
+        start, end = (span[0] + 5, span[1] - 3) if depth else span
+        spans = _lookup(index_sections(buf, start, end), name)
+        if not spans:
+            return None
+        span = spans[0]
+    return span
+
+
+def list_sections(buf, parent: Optional[str] = None) -> Dict[str, List[Span]]:
+    """Секции верхнего уровня или дочерние секции parent"""
+    if not parent:
+        return index_sections(buf)
+    span = find_section(buf, parent)
+    return index_sections(buf, span[0] + 5, span[1] - 3) if span else {}
+
+
+def write_span(buf, span: Span, out) -> int:
+    """Пишет байты span из buf в бинарный поток out кусками memoryview"""
+    start, end = span
+    with memoryview(buf) as view:
+        for pos in range(start, end, WRITE_CHUNK):
+            with view[pos:min(pos + WRITE_CHUNK, end)] as part:
+                out.write(part)
+    return end - start
+
+
+def extract_section(path: Path, section: str, out) -> Optional[int]:
+    """Пишет секцию сейва в бинарный поток out ровно в том виде, как она
+       лежит в файле (от BEGIN до END). Возвращает число байт или None,
+       если секции нет
+    """
+    with mapped(path) as buf:
+        span = find_section(buf, section)
+        if span is None:
+            return None
+        return write_span(buf, span, out)
+
+
+# ПЕРЕСАДКА СЕКЦИЙ
+
+def splice_plan(base, donor, sections: List[str], force: bool = False) -> List[tuple]:
+    """Куски нового сейва по порядку: ('base' | 'donor', начало, конец) или
+       ('bytes', данные, None). Секции donor заменяют одноимённые секции base
+       (допускаются вложенные, например Construction/Jobs); секция верхнего
+       уровня, которой нет в base, дописывается в конец
+    """
+    if not force and map_size(base) != map_size(donor):
+        raise ValueError("Размер карты в сейвах различается (NumCellsX/NumCellsY); "
+                         "объекты могут оказаться за пределами карты")
+
+    replaced = []
+    appended = []
+    unique = {section.strip('/').lower(): section for section in sections}
+    for section in unique.values():
+        donor_span = find_section(donor, section)
+        if donor_span is None:
+            raise ValueError(f"Секции {section} нет в сейве-доноре")
+        if not _balanced(donor, donor_span):
+            raise ValueError(f"Секция {section} в сейве-доноре не сбалансирована (BEGIN/END)")
+        base_span = find_section(base, section)
+        if base_span is not None:
+            replaced.append((base_span, donor_span))
+        elif '/' not in section.strip('/'):
+            appended.append(donor_span)
+        else:
+            raise ValueError(f"Секции {section} нет в основном сейве")
+
+    replaced.sort()
+    for (_, end), (next_start, _) in zip(
+            [span for span, _ in replaced], [span for span, _ in replaced[1:]]):
+        if next_start < end:
+            raise ValueError("Пересаживаемые секции вложены одна в другую")
+
+    pieces = []
+    pos = 0
+    for (start, end), donor_span in replaced:
+        pieces.append(('base', pos, start))
+        pieces.append(('donor', *donor_span))
+        pos = end
+    pieces.append(('base', pos, len(base)))
+    for donor_span in appended:
+        if len(base) and base[-1:] != b'\n':
+            pieces.append(('bytes', b'\n', None))
+        pieces.append(('donor', *donor_span))
+        pieces.append(('bytes', b'\n', None))
+    return [piece for piece in pieces if piece[0] == 'bytes' or piece[2] > piece[1]]
+
+
+def _balanced(buf, span: Span) -> bool:
+    """span — ровно одна секция: вложенность не падает до нуля раньше
+       последнего END и не уходит в минус (слова в кавычках не считаются)
+    """
+    start, end = span
+    depth = 0
+    for pos, is_begin in iter_tokens(buf, start, end):
+        if depth == 0 and pos != start:
+            return False
+        depth += 1 if is_begin else -1
+        if depth < 0:
+            return False
+    return depth == 0 and bytes(buf[end - 3:end]).upper() == b'END'
+
+
+def _layout(buf) -> List[str]:
+    """Имена секций верхнего уровня в порядке их следования"""
+    spans = [(start, name) for name, items in index_sections(buf).items() for start, _ in items]
+    return [name for _, name in sorted(spans)]
+
+
+def _same_bytes(a, a_start: int, b, b_start: int, length: int) -> bool:
+    with memoryview(a) as left, memoryview(b) as right:
+        for pos in range(0, length, WRITE_CHUNK):
+            size = min(WRITE_CHUNK, length - pos)
+            if left[a_start + pos:a_start + pos + size] != right[b_start + pos:b_start + pos + size]:
+                return False
+    return True
+
+
+def _piece_name(donor, start: int) -> str:
+    return section_name(donor, start).decode('ascii', 'replace')
+
+
+def verify_splice(out, base, donor, pieces: List[tuple]) -> Optional[str]:
+    """Проверяет собранный сейв out: каждая пересаженная секция стоит на своём
+       месте байт в байт и сбалансирована, а секции верхнего уровня те же,
+       что в base (плюс дописанные). Возвращает описание ошибки или None
+    """
+    offset = 0
+    for kind, start, end in pieces:
+        if kind == 'bytes':
+            offset += len(start)
+            continue
+        length = end - start
+        if kind == 'donor' and (offset + length > len(out)
+                                or not _balanced(out, (offset, offset + length))
+                                or not _same_bytes(out, offset, donor, start, length)):
+            return f"секция {_piece_name(donor, start)} записана не полностью"
+        offset += length
+    if offset != len(out):
+        return f"размер {len(out)} байт вместо {offset}"
+
+    # Дописанные секции идут после последнего куска base
+    tail = max((i for i, piece in enumerate(pieces) if piece[0] == 'base'), default=-1)
+    expected = _layout(base)
+    known = {name.lower() for name in expected}
+    expected += [_piece_name(donor, start) for kind, start, _ in pieces[tail + 1:]
+                 if kind == 'donor' and _piece_name(donor, start).lower() not in known]
+    actual = _layout(out)
+    if [name.lower() for name in actual] != [name.lower() for name in expected]:
+        return f"секции верхнего уровня {', '.join(actual)} вместо {', '.join(expected)}"
+    return None
+
+
+def _write_all(fd: int, data) -> None:
+    with memoryview(data) as view:
+        pos = 0
+        while pos < len(view):
+            with view[pos:] as rest:
+                pos += os.write(fd, rest)
+
+
+def _copy_range(src_fd: int, buf, dst_fd: int, start: int, end: int) -> bool:
+    """Копирует [start, end) источника в dst. True — ядром (copy_file_range),
+       False — буферами из отображения в память
+    """
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while start < end:
+                copied = os.copy_file_range(src_fd, dst_fd, end - start, offset_src=start)
+                if not copied:
+                    break
+                start += copied
+            else:
+                return True
+        except OSError:
+            # Разные файловые системы или ядро без поддержки — докопируем буферами
+            pass
+    with memoryview(buf) as view:
+        for pos in range(start, end, WRITE_CHUNK):
+            with view[pos:min(pos + WRITE_CHUNK, end)] as part:
+                _write_all(dst_fd, part)
+    return False
+
+
+def merge_saves(base: Path, donor: Path, sections: List[str], output: Path,
+                force: bool = False) -> dict:
+    """Новый сейв output: base, в котором секции sections взяты из donor.
+       Ни один файл не читается в память целиком — байтовые диапазоны
+       копируются из источников напрямую. Возвращает сводку
+    """
+    import tempfile
+
+    base, donor, output = Path(base), Path(donor), Path(output)
+    if output.resolve() in (base.resolve(), donor.resolve()):
+        raise ValueError("Результат нужно записать в новый файл")
+
+    summary = {'base_bytes': 0, 'donor_bytes': 0, 'kernel_copy': True}
+    with open(base, 'rb') as base_file, open(donor, 'rb') as donor_file, \
+            mapped(base) as base_buf, mapped(donor) as donor_buf:
+        pieces = splice_plan(base_buf, donor_buf, sections, force)
+        sources = {'base': (base_file.fileno(), base_buf),
+                   'donor': (donor_file.fileno(), donor_buf)}
+
+        fd, tmp_name = tempfile.mkstemp(prefix=f".{output.stem}-", suffix='.tmp',
+                                        dir=output.parent)
+        try:
+            with os.fdopen(fd, 'wb', buffering=0) as dst:
+                for kind, start, end in pieces:
+                    if kind == 'bytes':
+                        _write_all(dst.fileno(), start)
+                        continue
+                    src_fd, buf = sources[kind]
+                    if not _copy_range(src_fd, buf, dst.fileno(), start, end):
+                        summary['kernel_copy'] = False
+                    summary[f'{kind}_bytes'] += end - start
+            # Перед заменой результат индексируется заново: если секции
+            # разъехались, файл не пишется вовсе
+            with mapped(Path(tmp_name)) as out_buf:
+                problem = verify_splice(out_buf, base_buf, donor_buf, pieces)
+            if problem:
+                raise ValueError(f"Результат склейки не прошёл проверку ({problem}); файл не записан")
+            os.replace(tmp_name, output)
+        finally:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+
+    summary['output_bytes'] = output.stat().st_size
+    return summary
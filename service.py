@@ -0,0 +1,346 @@
+# -*- coding: utf-8 -*-
+"""
+Локальный сервис обработки сейвов: HTTP API поверх PrisonSaveFixer с
+ограниченной очередью заданий и пулом рабочих потоков. Плагины загружаются
+один раз при старте, кэши SaveContext (документы, метрики, результаты
+анализа) живут между запросами.
+
+    POST /jobs   {"type": "fix", "file": "1.prison", "dry_run": false}
+                 {"type": "analyze", "file": "1.prison"}
+                 {"type": "transfer", "source": "/uploads/1.prison", "fix": true}
+    GET  /status
+
+Ответ на задание — поток JSON lines (chunked): queued, затем log по мере
+вывода задания и в конце done с результатом. Если очередь заполнена,
+сервис сразу отвечает 503 с Retry-After, не накапливая запросы.
+Задания работают только с файлами в папке сохранений и папках загрузки
+(--upload-dir)
+"""
+import itertools
+import json
+import queue
+import re
+import sys
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import List, Optional
+
+from ui import Color
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+JOB_TYPES = ('fix', 'analyze', 'transfer')
+
+ANSI_RE = re.compile(r'\x1b\[[0-9;]*m')
+
+
+class _ThreadOutput:
+    """Подмена sys.stdout: то, что печатает поток с заданием, уходит в это задание,
+       остальной вывод — в исходный stdout
+    """
+
+    def __init__(self, fallback):
+        self._fallback = fallback
+        self._local = threading.local()
+
+    def capture(self, job: Optional['Job']) -> None:
+        self._local.job = job
+
+    def write(self, text: str) -> int:
+        job = getattr(self._local, 'job', None)
+        if job is None:
+            return self._fallback.write(text)
+        job.log(text)
+        return len(text)
+
+    def flush(self) -> None:
+        if getattr(self._local, 'job', None) is None:
+            self._fallback.flush()
+
+    def __getattr__(self, name):
+        return getattr(self._fallback, name)
+
+
+class Job:
+    """Одно задание: параметры запроса и очередь событий для ответа"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, kind: str, params: dict):
+        self.id = next(self._ids)
+        self.kind = kind
+        self.params = params
+        self.events: queue.Queue = queue.Queue()
+        self.created = time.perf_counter()
+        self._partial = ''
+
+    def log(self, text: str) -> None:
+        self._partial += text
+        *lines, self._partial = self._partial.split('\n')
+        for line in lines:
+            line = ANSI_RE.sub('', line).rstrip()
+            if line.strip():
+                self.events.put({'event': 'log', 'line': line})
+
+    def finish(self, ok: bool, result=None, error: Optional[str] = None) -> None:
+        if self._partial:
+            self.log('\n')
+        self.events.put({'event': 'done', 'id': self.id, 'ok': ok, 'result': result,
+                         'error': error,
+                         'seconds': round(time.perf_counter() - self.created, 6)})
+
+
+class SaveService:
+    """Очередь заданий и пул потоков над одним PrisonSaveFixer"""
+
+    def __init__(self, fixer, workers: int = 4, queue_size: int = 32,
+                 upload_dirs: Optional[List[Path]] = None):
+        self.fixer = fixer
+        # Папки, с файлами в которых разрешено работать заданиям
+        self.roots = [Path(folder).resolve()
+                      for folder in [fixer.saves_path, *(upload_dirs or [])] if folder]
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.jobs: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        self.stats = {'accepted': 0, 'rejected': 0, 'running': 0, 'done': 0, 'failed': 0}
+        self.started = time.time()
+        self._stats_lock = threading.Lock()
+        self._file_locks = {}
+        self._threads = []
+        self._output = None
+
+    def start(self) -> None:
+        self.fixer.load_plugins()
+        self._output = _ThreadOutput(sys.stdout)
+        sys.stdout = self._output
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"save-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        for _ in self._threads:
+            self.jobs.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads.clear()
+        if sys.stdout is self._output:
+            sys.stdout = self._output._fallback
+
+    def submit(self, job: Job) -> bool:
+        """Ставит задание в очередь; False — очередь заполнена"""
+        try:
+            self.jobs.put_nowait(job)
+        except queue.Full:
+            self._count('rejected')
+            return False
+        self._count('accepted')
+        return True
+
+    def status(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats.update({
+            'workers': self.workers,
+            'queue_size': self.queue_size,
+            'queued': self.jobs.qsize(),
+            'plugins': len(self.fixer.plugins),
+            'cached_metrics': len(self.fixer.context.metrics),
+            'uptime': round(time.time() - self.started, 1),
+        })
+        return stats
+
+    def _count(self, key: str, delta: int = 1) -> None:
+        with self._stats_lock:
+            self.stats[key] += delta
+
+    @contextmanager
+    def _file_lock(self, *paths: Path):
+        """Задания над одним файлом выполняются по очереди. Замки нескольких
+           файлов берутся в одном порядке (без взаимной блокировки); замок файла
+           удаляется, когда его не держит и не ждёт ни одно задание
+        """
+        keys = sorted({str(path) for path in paths})
+        entries = []
+        with self._stats_lock:
+            for key in keys:
+                entry = self._file_locks.get(key)
+                if entry is None:
+                    entry = self._file_locks[key] = [threading.Lock(), 0]
+                entry[1] += 1
+                entries.append(entry)
+        try:
+            with ExitStack() as stack:
+                for entry in entries:
+                    stack.enter_context(entry[0])
+                yield
+        finally:
+            with self._stats_lock:
+                for key, entry in zip(keys, entries):
+                    entry[1] -= 1
+                    if not entry[1]:
+                        del self._file_locks[key]
+
+    def _allowed(self, path: Path) -> Path:
+        """Полный путь файла, если он лежит в папке сохранений или папке загрузки
+           (ссылки раскрываются); иначе PermissionError
+        """
+        resolved = Path(path).resolve()
+        for root in self.roots:
+            try:
+                resolved.relative_to(root)
+            except ValueError:
+                continue
+            return resolved
+        raise PermissionError(f"Путь вне папки сохранений и папок загрузки: {path}")
+
+    def _worker(self) -> None:
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            self._count('running')
+            self._output.capture(job)
+            try:
+                ok, result = self._run(job)
+            except Exception as e:
+                ok, result = False, None
+                job.finish(False, error=str(e))
+            else:
+                job.finish(ok, result)
+            finally:
+                self._output.capture(None)
+                self._count('running', -1)
+                self._count('done' if ok else 'failed')
+
+    def _run(self, job: Job):
+        if job.kind == 'transfer':
+            source = self._allowed(Path(job.params.get('source', '')))
+            if not source.is_file():
+                raise FileNotFoundError(f"Файл не найден: {source}")
+            # Перенос перезаписывает одноимённый сейв в папке сохранений:
+            # задания fix/analyze над ним должны ждать
+            destination = (self.fixer.saves_path / source.name).resolve()
+            with self._file_lock(source, destination):
+                ok = self.fixer.transfer_save(source, fix=bool(job.params.get('fix')))
+            return ok, None
+
+        name = str(job.params.get('file', ''))
+        filepath = self.fixer.resolve_filepath(name) if name else None
+        if not filepath:
+            raise FileNotFoundError(f"Файл не найден: {name}")
+        filepath = self._allowed(filepath)
+
+        with self._file_lock(filepath):
+            if job.kind == 'fix':
+                if job.params.get('dry_run'):
+                    from construction_health import plan_fix, print_plan
+
+                    plan = plan_fix(filepath)
+                    print_plan(filepath, plan)
+                    return plan is not None, plan
+                return self.fixer.fix_construction_block(filepath), None
+            return True, self._analyze(filepath)
+
+    def _analyze(self, filepath: Path) -> dict:
+        """Анализ всеми плагинами конвейера; результат кэшируется до изменения файла"""
+        from pipeline import run_pipeline
+
+        plugins = [p for p in self.fixer.plugins if p.supports_pipeline]
+        return self.fixer.context.metric(
+            filepath, 'service_analyze', lambda document: run_pipeline(document.path, plugins))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    @property
+    def service(self) -> SaveService:
+        return self.server.service
+
+    def do_GET(self):
+        if self.path.rstrip('/') != '/status':
+            return self._send_json(404, {'error': 'not found'})
+        self._send_json(200, self.service.status())
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/jobs':
+            return self._send_json(404, {'error': 'not found'})
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            params = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            return self._send_json(400, {'error': 'ожидается JSON'})
+        if not isinstance(params, dict) or params.get('type') not in JOB_TYPES:
+            return self._send_json(400, {'error': f"type: одно из {', '.join(JOB_TYPES)}"})
+
+        job = Job(params['type'], params)
+        if not self.service.submit(job):
+            return self._send_json(503, {'error': 'очередь заполнена'}, {'Retry-After': '1'})
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson; charset=utf-8')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            self._send_chunk({'event': 'queued', 'id': job.id, 'queued': self.service.jobs.qsize()})
+            while True:
+                event = job.events.get()
+                self._send_chunk(event)
+                if event['event'] == 'done':
+                    break
+            self.wfile.write(b'0\r\n\r\n')
+        except OSError:
+            # Клиент ушёл — задание всё равно доводится до конца
+            self.close_connection = True
+
+    def _send_chunk(self, event: dict) -> None:
+        data = json.dumps(event, ensure_ascii=False, default=str).encode('utf-8') + b'\n'
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+
+    def _send_json(self, code: int, body: dict, headers: Optional[dict] = None) -> None:
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # По умолчанию backlog 5: при десятках одновременных клиентов соединения сбрасываются
+    request_queue_size = 128
+
+
+def serve(fixer, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+          workers: int = 4, queue_size: int = 32,
+          upload_dirs: Optional[List[Path]] = None) -> None:
+    """Запускает сервис и обслуживает запросы до Ctrl+C"""
+    service = SaveService(fixer, workers, queue_size, upload_dirs)
+    server = _Server((host, port), _Handler)
+    server.service = service
+    service.start()
+
+    print(f"{Color.GREEN}Сервис запущен:{Color.END} http://{host}:{server.server_port} "
+          f"(потоков: {service.workers}, очередь: {service.queue_size}, "
+          f"плагинов: {len(fixer.plugins)})")
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.stop()
+        print(f"\n{Color.YELLOW}Сервис остановлен{Color.END}")
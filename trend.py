@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Тренды по серии сейвов (например, автосохранения одной тюрьмы):
+показатели каждого сейва (охрана, камеры, патрули, зоны, размер очереди
+задач строительства) извлекаются параллельно в отдельных процессах,
+кэшируются по размеру и mtime файла и выводятся временным рядом в CSV или JSON
+"""
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from save_context import file_stamp
+
+# Меняется при изменении набора или смысла показателей — старый кэш игнорируется
+TREND_VERSION = 1
+
+METRICS = ('guards', 'cameras', 'prisoners', 'patrols', 'zones',
+           'construction_bytes', 'jobs', 'planning_jobs')
+COLUMNS = ('name', 'mtime', 'size') + METRICS + ('backlog_growth',)
+
+
+def get_trend_cache_path() -> Path:
+    from plugin_loader import get_cache_dir
+
+    return get_cache_dir().parent / "trend_cache.json"
+
+
+def construction_backlog(buf, span) -> Dict[str, int]:
+    """Размер блока Construction и число записей в Jobs и PlanningJobs"""
+    from save_format import index_sections, iter_entries
+
+    result = {'construction_bytes': 0, 'jobs': 0, 'planning_jobs': 0}
+    if span is None:
+        return result
+    result['construction_bytes'] = span[1] - span[0]
+    # Дочерние секции: всё между словом BEGIN блока и его END
+    children = index_sections(buf, span[0] + 5, span[1] - 3)
+    for name, key in (('Jobs', 'jobs'), ('PlanningJobs', 'planning_jobs')):
+        for child in children.get(name, ()):
+            result[key] += sum(1 for _ in iter_entries(buf, child))
+    return result
+
+
+def extract_metrics(path: str) -> dict:
+    """Показатели одного сейва (выполняется в процессе пула)"""
+    from save_context import SaveDocument
+    from save_format import iter_entries
+
+    document = SaveDocument(Path(path))
+    histogram = document.histogram
+    patrols_span = document.section('Patrols')
+    result = {
+        'guards': histogram.count('Type', 'Guard', 'Objects'),
+        'cameras': histogram.count('Type', 'Cctv', 'Objects'),
+        'prisoners': histogram.count('Type', 'Prisoner', 'Objects'),
+        'patrols': sum(1 for _ in iter_entries(document.raw, patrols_span)) if patrols_span else 0,
+        'zones': histogram.total('Zone'),
+    }
+    result.update(construction_backlog(document.raw, document.section('Construction')))
+    return result
+
+
+def _load_cache(cache_path: Path) -> dict:
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def _store_cache(cache_path: Path, cache: dict) -> None:
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_name(cache_path.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, ensure_ascii=False)
+    tmp_path.replace(cache_path)
+
+
+def collect_trend(paths: List[Path], workers: Optional[int] = None,
+                  cache_path: Optional[Path] = None) -> dict:
+    """Временной ряд по сейвам, упорядоченный по mtime.
+       Возвращает {'rows': [...], 'cached': N, 'computed': N, 'errors': [...], 'seconds': ...}
+    """
+    started = time.perf_counter()
+    cache_path = cache_path or get_trend_cache_path()
+    cache = _load_cache(cache_path)
+    workers = workers or min(os.cpu_count() or 1, 8)
+
+    rows, pending, errors = {}, [], []
+    for path in paths:
+        key = str(Path(path).resolve())
+        try:
+            stamp = list(file_stamp(path))
+        except OSError as e:
+            errors.append(f"{Path(path).name}: {e}")
+            continue
+        entry = cache.get(key)
+        if entry and entry.get('version') == TREND_VERSION and entry.get('stamp') == stamp:
+            rows[key] = (Path(path), stamp, entry['metrics'])
+        else:
+            pending.append((key, Path(path), stamp))
+
+    cached = len(rows)
+    if pending:
+        if workers > 1 and len(pending) > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as pool:
+                futures = [(item, pool.submit(extract_metrics, item[0])) for item in pending]
+                results = []
+                for item, future in futures:
+                    try:
+                        results.append((item, future.result(), None))
+                    except Exception as e:
+                        results.append((item, None, e))
+        else:
+            results = []
+            for item in pending:
+                try:
+                    results.append((item, extract_metrics(item[0]), None))
+                except Exception as e:
+                    results.append((item, None, e))
+
+        for (key, path, stamp), values, error in results:
+            if error is not None:
+                errors.append(f"{path.name}: {error}")
+                continue
+            cache[key] = {'version': TREND_VERSION, 'stamp': stamp, 'metrics': values}
+            rows[key] = (path, stamp, values)
+        _store_cache(cache_path, cache)
+
+    series = []
+    previous = None
+    for path, stamp, values in sorted(rows.values(), key=lambda row: (row[1][1], row[0].name)):
+        backlog = values['jobs'] + values['planning_jobs']
+        row = {
+            'name': path.name,
+            'mtime': datetime.fromtimestamp(stamp[1] / 1e9).isoformat(timespec='seconds'),
+            'size': stamp[0],
+        }
+        row.update(values)
+        row['backlog_growth'] = backlog - previous if previous is not None else 0
+        previous = backlog
+        series.append(row)
+
+    return {
+        'rows': series,
+        'cached': cached,
+        'computed': len(pending),
+        'errors': errors,
+        'seconds': time.perf_counter() - started,
+    }
+
+
+def write_trend(rows: List[dict], out, fmt: str = 'csv') -> None:
+    """Пишет ряд в текстовый поток: CSV с заголовком или JSON-массив"""
+    if fmt == 'json':
+        json.dump(rows, out, ensure_ascii=False, indent=2)
+        out.write('\n')
+        return
+
+    import csv
+    writer = csv.DictWriter(out, fieldnames=COLUMNS, lineterminator='\n')
+    writer.writeheader()
+    writer.writerows(rows)